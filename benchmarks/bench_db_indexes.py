@@ -0,0 +1,169 @@
+"""
+Бенчмарк: стоимость типовых запросов bot.db с вторичными индексами и без них
+
+Создаёт две базы во временной директории — схема до v2 (без индексов) и полная
+схема — заполняет одинаковыми данными и замеряет горячие запросы DatabaseService.
+
+Запуск:
+    python -m benchmarks.bench_db_indexes
+    python -m benchmarks.bench_db_indexes --users 100000 --payments 1000000 --repeat 200
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import aiosqlite
+
+from parserhub.migrations import MIGRATIONS, run_migrations
+
+
+PLANS = [("day", 10000), ("week", 50000), ("month", 150000)]
+
+
+async def _build(path: Path, migrations, users: int, payments: int, seed: int):
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = OFF")
+        await run_migrations(db, migrations)
+        await db.commit()
+
+        def iso(days_back: float) -> str:
+            return (now - timedelta(days=days_back)).isoformat()
+
+        await db.executemany(
+            "INSERT INTO users (user_id, username, full_name, created_at, last_active, trial_until) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (uid, f"user{uid}", f"User {uid}", iso(rnd.uniform(0, 365)), iso(0),
+                 iso(rnd.uniform(-3, 365)))
+                for uid in range(1, users + 1)
+            ),
+        )
+        await db.executemany(
+            "INSERT INTO subscriptions (user_id, plan, active_until, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (uid, "week", iso(rnd.uniform(-30, 60)), iso(90), iso(90))
+                for uid in range(1, users + 1, 5)
+            ),
+        )
+        await db.executemany(
+            "INSERT INTO payments (user_id, plan, amount, currency, created_at) VALUES (?, ?, ?, 'RUB', ?)",
+            (
+                (rnd.randint(1, users), *rnd.choice(PLANS), iso(rnd.uniform(0, 730)))
+                for _ in range(payments)
+            ),
+        )
+        await db.executemany(
+            "INSERT INTO active_tasks (user_id, task_id, service, task_type, status, created_at) "
+            "VALUES (?, ?, ?, 'monitor', ?, ?)",
+            (
+                (rnd.randint(1, users), f"task-{i}", rnd.choice(("workers", "realty")),
+                 "running" if rnd.random() < 0.05 else "stopped", iso(rnd.uniform(0, 30)))
+                for i in range(users // 2)
+            ),
+        )
+        await db.commit()
+        await db.execute("ANALYZE")
+        await db.commit()
+
+
+def _queries(users: int) -> dict:
+    now = datetime.utcnow()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0).isoformat()
+    today_start = now.replace(hour=0, minute=0, second=0).isoformat()
+
+    def uid():
+        return random.randint(1, users)
+
+    return {
+        "get_user_tasks(user, service)": lambda: (
+            "SELECT * FROM active_tasks WHERE user_id = ? AND service = ? ORDER BY created_at DESC",
+            (uid(), "workers"),
+        ),
+        "update_task_status(task_id)": lambda: (
+            "SELECT id FROM active_tasks WHERE task_id = ?", (f"task-{uid() // 2}",),
+        ),
+        "get_all_running_tasks": lambda: (
+            "SELECT * FROM active_tasks WHERE status = 'running' ORDER BY created_at DESC", (),
+        ),
+        "revenue: month": lambda: (
+            "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM payments WHERE created_at >= ?",
+            (month_start,),
+        ),
+        "revenue: today": lambda: (
+            "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM payments WHERE created_at >= ?",
+            (today_start,),
+        ),
+        "delete_expired (count)": lambda: (
+            "SELECT COUNT(*) FROM subscriptions WHERE active_until < ?", (now.isoformat(),),
+        ),
+        "get_user_by_username": lambda: (
+            "SELECT * FROM users WHERE username = ?", (f"user{uid()}",),
+        ),
+        "get_all_trial_active": lambda: (
+            "SELECT user_id FROM users WHERE trial_until > ? "
+            "AND user_id NOT IN (SELECT user_id FROM subscriptions WHERE active_until > ?)",
+            ((now + timedelta(days=1)).isoformat(), now.isoformat()),
+        ),
+    }
+
+
+async def _measure(path: Path, queries: dict, repeat: int) -> dict:
+    results = {}
+    async with aiosqlite.connect(path) as db:
+        for name, make in queries.items():
+            timings = []
+            for _ in range(repeat):
+                sql, params = make()
+                started = time.perf_counter()
+                async with db.execute(sql, params) as cursor:
+                    await cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    without_indexes = [m for m in MIGRATIONS if m.version <= 2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / "plain.db"
+        indexed = Path(tmp) / "indexed.db"
+
+        print(f"Заполнение: {args.users} пользователей, {args.payments} платежей...")
+        started = time.perf_counter()
+        await _build(plain, without_indexes, args.users, args.payments, seed=1)
+        await _build(indexed, MIGRATIONS, args.users, args.payments, seed=1)
+        print(f"Готово за {time.perf_counter() - started:.1f} с\n")
+
+        queries = _queries(args.users)
+        random.seed(2)
+        before = await _measure(plain, queries, args.repeat)
+        random.seed(2)
+        after = await _measure(indexed, queries, args.repeat)
+
+    print(f"{'запрос':<32} {'без индексов, мс':>18} {'с индексами, мс':>18} {'ускорение':>10}")
+    for name in queries:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<32} {before[name]:>18.3f} {after[name]:>18.3f} {speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
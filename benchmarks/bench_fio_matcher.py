@@ -0,0 +1,187 @@
+"""
+Бенчмарк: задержка поиска по ФИО в локальном индексе ЧС
+
+Заполняет bot.db синтетическими записями ЧС (фамилии/имена/отчества в разных родах,
+двойные фамилии) вместе с FTS5 и триграммным индексом основ — так же, как их
+заполняет BlacklistIndex._apply — и замеряет BlacklistIndex.lookup / search_fio
+для точных запросов, запросов в другом падеже и запросов с опечаткой.
+
+Запуск:
+    python -m benchmarks.bench_fio_matcher
+    python -m benchmarks.bench_fio_matcher --records 1000000 --repeat 200
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+from parserhub.db_pool import ConnectionPool
+from parserhub.migrations import run_migrations
+from parserhub.services.blacklist_index import BlacklistIndex, fold
+from parserhub.services.fio_matcher import name_stems, trigrams
+
+
+SURNAME_ROOTS = [
+    "Иван", "Петр", "Сидор", "Смирн", "Кузнец", "Попов", "Васильев", "Соколов", "Михайлов",
+    "Новиков", "Фёдор", "Морозов", "Волков", "Алексеев", "Лебедев", "Семён", "Егор", "Павлов",
+    "Козлов", "Степан", "Никола", "Орлов", "Андреев", "Макаров", "Захар", "Зайцев", "Соловьёв",
+    "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьёв", "Сергеев", "Кудрявцев", "Беляев",
+]
+SURNAME_SUFFIXES = ["ов", "ев", "ин", "енко", "ский", "ович", "ук", "як", ""]
+# Имя → родительный падеж
+MALE_NAMES = {
+    "Иван": "Ивана", "Пётр": "Петра", "Сергей": "Сергея", "Алексей": "Алексея", "Дмитрий": "Дмитрия",
+    "Андрей": "Андрея", "Николай": "Николая", "Михаил": "Михаила", "Артём": "Артёма", "Юрий": "Юрия",
+}
+FEMALE_NAMES = {
+    "Анна": "Анны", "Мария": "Марии", "Наталья": "Натальи", "Елена": "Елены", "Ольга": "Ольги",
+    "Татьяна": "Татьяны", "Юлия": "Юлии", "Дарья": "Дарьи", "Алёна": "Алёны", "Ксения": "Ксении",
+}
+PATRONYM_ROOTS = ["Иванов", "Петров", "Сергеев", "Алексеев", "Андреев", "Николаев", "Михайлов", "Юрьев"]
+
+
+def _surname(rnd: random.Random, female: bool) -> str:
+    root = rnd.choice(SURNAME_ROOTS)
+    # Уникальный «хвост» даёт реалистичный размер словаря основ (десятки тысяч)
+    stem = f"{root}{rnd.choice(SURNAME_SUFFIXES)}" + "".join(rnd.choices("абвгдклмнпрст", k=rnd.randint(0, 2)))
+    if stem.endswith("ский"):
+        return stem[:-2] + "ая" if female else stem
+    if female and stem.endswith(("ов", "ев", "ин")):
+        return stem + "а"
+    return stem
+
+
+def _full_name(rnd: random.Random) -> str:
+    female = rnd.random() < 0.5
+    surname = _surname(rnd, female)
+    if rnd.random() < 0.03:
+        surname += "-" + _surname(rnd, female)
+    name = rnd.choice(list(FEMALE_NAMES if female else MALE_NAMES))
+    patronym = rnd.choice(PATRONYM_ROOTS) + ("на" if female else "ич")
+    return f"{surname} {name} {patronym}"
+
+
+def _typo(rnd: random.Random, word: str) -> str:
+    i = rnd.randrange(1, len(word))
+    return word[:i] + rnd.choice("аеиоу") + word[i + 1:]
+
+
+async def _build(path: Path, records: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    names = [_full_name(rnd) for _ in range(records)]
+
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = OFF")
+        await run_migrations(db)
+        await db.commit()
+
+        await db.executemany(
+            "INSERT INTO blacklist_records (id, record_id, chat, message_link, full_name, updated_at) "
+            "VALUES (?, ?, '@bl_chat', ?, ?, '2026-01-01T00:00:00')",
+            ((i, str(i), f"https://t.me/bl_chat/{i}", name) for i, name in enumerate(names, 1)),
+        )
+        await db.executemany(
+            "INSERT INTO blacklist_fts (rowid, full_name, message_text) VALUES (?, ?, '')",
+            ((i, fold(name)) for i, name in enumerate(names, 1)),
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO blacklist_fio_terms (stem, record_id) VALUES (?, ?)",
+            ((stem, i) for i, name in enumerate(names, 1) for stem in name_stems(name)),
+        )
+        vocabulary = {stem for name in names for stem in name_stems(name)}
+        await db.executemany(
+            "INSERT OR IGNORE INTO blacklist_fio_trigrams (trigram, stem) VALUES (?, ?)",
+            ((gram, stem) for stem in vocabulary for gram in trigrams(stem)),
+        )
+        await db.execute(
+            "INSERT INTO global_config (key, value) VALUES ('blacklist_index_cursor', 'bench')"
+        )
+        await db.commit()
+        await db.execute("ANALYZE")
+        await db.commit()
+
+    print(f"Словарь основ: {len(vocabulary)}")
+    return names
+
+
+def _queries(names: list[str], rnd: random.Random) -> dict:
+    def exact():
+        surname, name, _ = rnd.choice(names).split()
+        return f"{surname} {name}"
+
+    def inflected():
+        # Запрос в родительном падеже: «Иванова Ивана», «Ивановой Анны» — FTS по словам не совпадает
+        surname, name, _ = rnd.choice(names).split()
+        if name in FEMALE_NAMES:
+            surname = surname[:-2] + "ой" if surname.endswith("ая") else surname[:-1] + "ой"
+            return f"{surname} {FEMALE_NAMES[name]}"
+        surname = surname[:-2] + "ого" if surname.endswith("ий") else surname + "а"
+        return f"{surname} {MALE_NAMES[name]}"
+
+    def typo():
+        surname, name, patronym = rnd.choice(names).split()
+        return f"{_typo(rnd, surname)} {name} {patronym}"
+
+    return {"точное ФИО": exact, "другой падеж": inflected, "опечатка в фамилии": typo}
+
+
+async def _measure(index: BlacklistIndex, queries: dict, repeat: int) -> list[tuple]:
+    rows = []
+    for label, make in queries.items():
+        for method in ("lookup", "search_fio"):
+            timings, hits = [], 0
+            for _ in range(repeat):
+                fio = make()
+                started = time.perf_counter()
+                if method == "lookup":
+                    found = await index.lookup(fio=fio)
+                else:
+                    found = await index.search_fio(fio)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits += bool(found)
+            timings.sort()
+            rows.append((
+                label, method, statistics.median(timings),
+                timings[int(len(timings) * 0.95) - 1], hits / repeat,
+            ))
+    return rows
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bot.db"
+
+        print(f"Заполнение: {args.records} записей ЧС...")
+        started = time.perf_counter()
+        names = await _build(path, args.records, seed=1)
+        print(f"Готово за {time.perf_counter() - started:.1f} с\n")
+
+        pool = ConnectionPool(path, readers=1)
+        await pool.open()
+        index = BlacklistIndex(pool)
+        index.ready = True
+        try:
+            rows = await _measure(index, _queries(names, random.Random(2)), args.repeat)
+        finally:
+            await pool.close()
+
+    print(f"{'запрос':<22} {'метод':<12} {'медиана, мс':>12} {'p95, мс':>10} {'найдено':>9}")
+    for label, method, median, p95, hit_rate in rows:
+        print(f"{label:<22} {method:<12} {median:>12.2f} {p95:>10.2f} {hit_rate:>8.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+Бенчмарк: загрузка и запись персистентности PTB (SQLitePersistence) в bot.db
+
+Заполняет bot.db --conversations сохранёнными диалогами (поровну между
+ConversationHandler'ами бота) и столько же user_data, затем замеряет:
+  - загрузку при старте: get_user_data + get_conversations по всем диалогам
+  - цикл записи PTB: --dirty пользователей с изменившимися user_data и шагом диалога
+  - цикл, где обработчики касались пользователей, но ничего не изменили
+
+Запуск:
+    python -m benchmarks.bench_persistence
+    python -m benchmarks.bench_persistence --conversations 100000 --dirty 1000
+"""
+
+import argparse
+import asyncio
+import json
+import pickle
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+from parserhub.db_service import DatabaseService
+from parserhub.persistence import SQLitePersistence
+
+
+CONVERSATIONS = [
+    "workers_monitoring", "realty_parsing", "blacklist_check_user", "blacklist_bulk_check",
+    "admin_grant", "admin_revoke", "admin_add_admin", "admin_pvz_chats",
+    "admin_blacklist_chats", "admin_proxy", "admin_edit_price", "admin_broadcast",
+]
+
+
+def _user_data(rnd: random.Random) -> dict:
+    # Типичный набор полей мастера мониторинга ПВЗ
+    return {
+        "workers_mode": rnd.choice(["worker", "employer"]),
+        "workers_city": rnd.choice(["Москва", "Санкт-Петербург", "Казань"]),
+        "workers_date_from": "2026-10-01",
+        "workers_date_to": "2026-10-31",
+        "workers_min_price": rnd.randint(1000, 3000),
+    }
+
+
+async def _fill(db: DatabaseService, count: int):
+    rnd = random.Random(1)
+    now = datetime.utcnow().isoformat()
+    async with db.pool.write() as conn:
+        await conn.executemany(
+            "INSERT INTO persistence_user_data (user_id, data, updated_at) VALUES (?, ?, ?)",
+            ((user_id, pickle.dumps(_user_data(rnd)), now) for user_id in range(1, count + 1)),
+        )
+        await conn.executemany(
+            "INSERT INTO persistence_conversations (name, key, state, updated_at) VALUES (?, ?, ?, ?)",
+            (
+                (CONVERSATIONS[user_id % len(CONVERSATIONS)], json.dumps([user_id, user_id]),
+                 pickle.dumps(rnd.randint(1, 8)), now)
+                for user_id in range(1, count + 1)
+            ),
+        )
+
+
+async def _cycle(persistence: SQLitePersistence, user_data: dict, users: list[int], change: bool) -> float:
+    """Один цикл Application.update_persistence: все update_* через asyncio.gather"""
+    coroutines = []
+    for user_id in users:
+        data = dict(user_data[user_id])
+        if change:
+            data["workers_min_price"] += 1
+        user_data[user_id] = data
+        coroutines.append(persistence.update_user_data(user_id, data))
+        name = CONVERSATIONS[user_id % len(CONVERSATIONS)]
+        coroutines.append(persistence.update_conversation(name, (user_id, user_id), 9 if change else None))
+    started = time.perf_counter()
+    await asyncio.gather(*coroutines)
+    return (time.perf_counter() - started) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=100_000)
+    parser.add_argument("--dirty", type=int, default=1000, help="пользователей за один цикл записи")
+    args = parser.parse_args()
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bot.db"
+        db = DatabaseService(str(path), readers=1)
+        await db.open()
+        await db.init_db()
+        print(f"Заполнение: {args.conversations} диалогов и user_data...")
+        await _fill(db, args.conversations)
+        await db.close()
+
+        # «Рестарт»: загрузка как в Application.initialize
+        db = DatabaseService(str(path), readers=1)
+        persistence = SQLitePersistence(db)
+        started = time.perf_counter()
+        user_data = await persistence.get_user_data()
+        user_loaded = time.perf_counter()
+        loaded = 0
+        for name in CONVERSATIONS:
+            loaded += len(await persistence.get_conversations(name))
+        conv_loaded = time.perf_counter()
+
+        users = random.Random(2).sample(sorted(user_data), min(args.dirty, len(user_data)))
+        changed_ms = await _cycle(persistence, user_data, users, change=True)
+        written = persistence.rows_written
+        touched_ms = await _cycle(persistence, user_data, users, change=False)
+        await persistence.flush()
+        await db.close()
+
+    print()
+    print(f"{'операция':<52} {'время, мс':>10}")
+    print(f"{f'загрузка user_data ({len(user_data)})':<52} {(user_loaded - started) * 1000:>10.1f}")
+    print(f"{f'загрузка диалогов ({loaded}, {len(CONVERSATIONS)} обработчиков)':<52} "
+          f"{(conv_loaded - user_loaded) * 1000:>10.1f}")
+    print(f"{f'цикл записи: {len(users)} изменённых (строк {written})':<52} {changed_ms:>10.1f}")
+    print(f"{f'цикл записи: {len(users)} без изменений, диалоги завершены':<52} {touched_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
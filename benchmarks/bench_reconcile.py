@@ -0,0 +1,106 @@
+"""
+Бенчмарк: время reconcile задач при старте бота против локального фейкового сервиса
+
+Фейковые workers_service / avito_cian_parser (httpx.MockTransport) отвечают с задержкой
+--latency мс; часть задач — «зомби» (404). Сравниваются режимы:
+  - последовательно (как было: одна задача за раз)
+  - параллельно по одной задаче (RECONCILE_CONCURRENCY)
+  - пакетный эндпоинт /status/batch
+
+Запуск:
+    python -m benchmarks.bench_reconcile
+    python -m benchmarks.bench_reconcile --tasks 1000 --latency 20 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+from parserhub.api_client import RealtyAPI, WorkersAPI
+from parserhub.db_service import DatabaseService
+from parserhub.http_pool import HttpPool
+from parserhub.models import ActiveTask
+from parserhub.services.reconcile import reconcile_tasks
+
+
+def _fake_service(latency: float, zombie_ids: set[str], batch: bool):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        path = request.url.path
+        if path.endswith("/status/batch"):
+            if not batch:
+                return httpx.Response(405)
+            task_ids = json.loads(request.content)["task_ids"]
+            return httpx.Response(200, json={
+                "tasks": {tid: None if tid in zombie_ids else {"status": "running"} for tid in task_ids}
+            })
+        task_id = path.rsplit("/", 1)[-1]
+        if task_id in zombie_ids:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"task_id": task_id, "status": "running"})
+
+    return httpx.MockTransport(handler)
+
+
+async def _run(db_path: Path, tasks: int, latency: float, concurrency: int, batch: bool) -> tuple[float, int]:
+    db = DatabaseService(str(db_path), readers=2)
+    await db.open()
+    await db.init_db()
+
+    zombie_ids = set()
+    for i in range(tasks):
+        service = "workers" if i % 2 else "realty"
+        task_id = f"{service}-{i}"
+        if i % 10 == 0:
+            zombie_ids.add(task_id)
+        await db.add_task(ActiveTask(
+            user_id=i, task_id=task_id, service=service, task_type="monitor", created_at=datetime.utcnow(),
+        ))
+
+    http = HttpPool(max_connections=max(concurrency, 1) * 2)
+    http.client._transport = _fake_service(latency, zombie_ids, batch)
+    workers_api = WorkersAPI("http://workers", http=http)
+    realty_api = RealtyAPI("http://realty", http=http)
+
+    started = time.perf_counter()
+    removed = await reconcile_tasks(db, workers_api, realty_api, concurrency=concurrency)
+    elapsed = time.perf_counter() - started
+
+    await http.close()
+    await db.close()
+    return elapsed, removed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=20.0, help="задержка ответа сервиса, мс")
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    logger.remove()
+    latency = args.latency / 1000
+
+    modes = [
+        ("последовательно", 1, False),
+        (f"параллельно ({args.concurrency})", args.concurrency, False),
+        ("пакетный эндпоинт", args.concurrency, True),
+    ]
+
+    print(f"Reconcile {args.tasks} задач, задержка сервиса {args.latency:.0f} мс\n")
+    print(f"{'режим':<26} {'время, с':>10} {'удалено':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, concurrency, batch) in enumerate(modes):
+            elapsed, removed = await _run(Path(tmp) / f"bot{i}.db", args.tasks, latency, concurrency, batch)
+            print(f"{name:<26} {elapsed:>10.2f} {removed:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+Бенчмарк: пропускная способность обработки обновлений при многих пользователях
+
+--users пользователей присылают по --updates обновлений вперемешку; обработчик
+«ждёт сервис» --latency мс, а доля --slow-share обновлений — --slow-latency мс
+(как receive_add_chat на get_chat_topics или confirm_start на start_monitoring).
+Обновления подаются так же, как их раздаёт Application._update_fetcher. Сравниваются:
+  - последовательно (SimpleUpdateProcessor(1) — по умолчанию в PTB, как было)
+  - параллельно без порядка (SimpleUpdateProcessor(N))
+  - PerUserUpdateProcessor(N) — параллельно, по очереди внутри пользователя
+
+Обновления приходят одной пачкой. Для каждого режима — время, обновлений/сек,
+задержка от поступления до конца обработки (медиана, p95) и нарушения порядка
+(обновление пользователя началось раньше, чем закончилось предыдущее).
+
+Запуск:
+    python -m benchmarks.bench_update_processor
+    python -m benchmarks.bench_update_processor --users 1000 --updates 5 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import SimpleUpdateProcessor
+
+from parserhub.update_processor import PerUserUpdateProcessor
+
+
+def _updates(users: int, per_user: int, seed: int) -> list[Update]:
+    rnd = random.Random(seed)
+    order = [user_id for user_id in range(1, users + 1) for _ in range(per_user)]
+    rnd.shuffle(order)
+    updates = []
+    for update_id, user_id in enumerate(order, 1):
+        user = User(user_id, "user", False)
+        chat = Chat(user_id, Chat.PRIVATE)
+        message = Message(update_id, None, chat, from_user=user, text="x")
+        updates.append(Update(update_id, message=message))
+    return updates
+
+
+async def _run(processor, updates: list[Update], latency: float, slow_latency: float, slow_share: float) -> dict:
+    rnd = random.Random(1)
+    slow = {update.update_id for update in updates if rnd.random() < slow_share}
+    busy: dict[int, int] = {}  # user_id → обрабатываемых сейчас обновлений
+    last_seen: dict[int, int] = {}
+    violations = 0
+    latencies = []
+
+    async def handle(update: Update, received: float):
+        nonlocal violations
+        user_id = update.effective_user.id
+        if busy.get(user_id) or last_seen.get(user_id, 0) > update.update_id:
+            violations += 1
+        busy[user_id] = busy.get(user_id, 0) + 1
+        await asyncio.sleep(slow_latency if update.update_id in slow else latency)
+        busy[user_id] -= 1
+        last_seen[user_id] = update.update_id
+        latencies.append(time.perf_counter() - received)
+
+    await processor.initialize()
+    # Все обновления пришли пачкой: задержка считается от начала, включая ожидание в очереди
+    started = time.perf_counter()
+    tasks = []
+    for update in updates:
+        coroutine = handle(update, started)
+        if processor.max_concurrent_updates > 1:
+            tasks.append(asyncio.create_task(processor.process_update(update, coroutine)))
+        else:
+            await processor.process_update(update, coroutine)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await processor.shutdown()
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "rate": len(updates) / elapsed,
+        "median": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "violations": violations,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=3, help="обновлений на пользователя")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=2.0, help="обычный обработчик, мс")
+    parser.add_argument("--slow-latency", type=float, default=500.0, help="медленный обработчик, мс")
+    parser.add_argument("--slow-share", type=float, default=0.005)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    updates = _updates(args.users, args.updates, seed=1)
+    modes = {
+        "последовательно": lambda: SimpleUpdateProcessor(1),
+        f"параллельно ({args.concurrency}), без порядка": lambda: SimpleUpdateProcessor(args.concurrency),
+        f"PerUser ({args.concurrency})": lambda: PerUserUpdateProcessor(args.concurrency),
+    }
+    if args.skip_sequential:
+        del modes["последовательно"]
+
+    print(f"{len(updates)} обновлений от {args.users} пользователей\n")
+    print(f"{'режим':<32} {'время, с':>9} {'обн/сек':>9} {'медиана, мс':>12} {'p95, мс':>9} {'нарушений порядка':>18}")
+    for label, make in modes.items():
+        result = await _run(make(), updates, args.latency / 1000, args.slow_latency / 1000, args.slow_share)
+        print(
+            f"{label:<32} {result['elapsed']:>9.2f} {result['rate']:>9.0f} "
+            f"{result['median']:>12.1f} {result['p95']:>9.1f} {result['violations']:>18}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
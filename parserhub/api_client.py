@@ -1,8 +1,12 @@
 """HTTP клиенты для вызова микросервисов"""
+import asyncio
+import json
 import httpx
-from typing import Optional
+from typing import AsyncIterator, Optional
 from loguru import logger
 
+from parserhub.cache import TTLCache
+from parserhub.http_pool import HttpPool
 from parserhub.models import (
     StartMonitoringRequest,
     MonitoringStatus,
@@ -12,16 +16,142 @@ from parserhub.models import (
 )
 
 
-class WorkersAPI:
-    """HTTP клиент к workers_service"""
+_MISSING = object()
+
+
+def _is_transient(error: httpx.HTTPError) -> bool:
+    """Сбой, после которого запрос имеет смысл повторить: сеть, таймаут, 5xx, 408, 429"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in (408, 429)
+    return True
+
+
+class _ServiceClient:
+    """Базовый HTTP клиент микросервиса поверх общего HttpPool"""
 
-    def __init__(self, base_url: str):
+    # Имя сервиса в метриках HTTP-запросов (задаётся в наследниках)
+    SERVICE = ""
+    # None — ещё не проверяли, поддерживает ли сервис пакетный эндпоинт статусов
+    _batch_supported: Optional[bool] = None
+
+    def __init__(self, base_url: str, http: Optional[HttpPool] = None, status_ttl: float = 5.0):
         self.base_url = base_url.rstrip("/")
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Без общего пула клиент создаёт собственный и сам его закрывает
+        self._owns_http = http is None
+        self.http = http or HttpPool()
+        self.http.name_service(self.base_url, self.SERVICE)
+        self.client = self.http.client
+        # Кэш статусов задач: повторные «🔄 Обновить» и открытия списка в пределах TTL
+        # не доходят до сервиса. None в кэше — задачи нет в сервисе (404)
+        self.status_cache = TTLCache(maxsize=10_000, ttl=status_ttl)
 
     async def close(self):
-        """Закрыть HTTP клиент"""
-        await self.client.aclose()
+        """Закрыть HTTP клиент (общий пул закрывает его владелец)"""
+        if self._owns_http:
+            await self.http.close()
+
+    def _timeout(self, kind: str):
+        return self.http.timeout(kind)
+
+    # Эндпоинты статусов задач (задаются в наследниках)
+    STATUS_PATH = ""
+    BATCH_STATUS_PATH = ""
+
+    async def get_statuses(self, task_ids: list[str], concurrency: int = 20) -> dict[str, Optional[dict]]:
+        """Статусы нескольких задач за один проход
+
+        Сначала пробует пакетный эндпоинт (POST {BATCH_STATUS_PATH}); если сервис его
+        не поддерживает (404/405) — параллельные GET по одной задаче, не более
+        concurrency запросов одновременно. Другая ошибка пакетного запроса (таймаут,
+        5xx) на GET по одной задаче не переключает: сервис, скорее всего, недоступен.
+
+        Returns:
+            task_id -> статус, None если задачи нет в сервисе (404).
+            Задачи, статус которых получить не удалось (в т.ч. пропущенные в пакетном
+            ответе), в результат не попадают.
+        """
+        results: dict[str, Optional[dict]] = {}
+        missing = []
+        for task_id in dict.fromkeys(task_ids):
+            cached = self.status_cache.get(task_id, _MISSING)
+            if cached is _MISSING:
+                missing.append(task_id)
+            else:
+                results[task_id] = cached
+
+        if missing:
+            fetched = await self._fetch_statuses(missing, concurrency)
+            for task_id, status in fetched.items():
+                self.status_cache.set(task_id, status)
+            results.update(fetched)
+        return results
+
+    async def _fetch_statuses(self, task_ids: list[str], concurrency: int) -> dict[str, Optional[dict]]:
+        """Запрос статусов в сервис (минуя кэш)"""
+        if self._batch_supported is not False:
+            try:
+                response = await self.client.post(
+                    f"{self.base_url}{self.BATCH_STATUS_PATH}",
+                    json={"task_ids": task_ids},
+                    timeout=self._timeout("status"),
+                )
+                if response.status_code in (404, 405):
+                    self._batch_supported = False
+                    logger.info(f"{self.BATCH_STATUS_PATH} не поддерживается — статусы по одной задаче")
+                else:
+                    response.raise_for_status()
+                    self._batch_supported = True
+                    body = response.json()
+                    tasks = body.get("tasks") if isinstance(body, dict) else None
+                    if not isinstance(tasks, dict):
+                        raise ValueError(f"неожиданный ответ {self.BATCH_STATUS_PATH}: {body!r:.200}")
+                    # None — только явный null (задачи нет); задачи, которых нет в ответе,
+                    # считаются непроверенными — reconcile не должен удалить живую задачу
+                    return {task_id: tasks[task_id] for task_id in task_ids if task_id in tasks}
+            except (httpx.HTTPError, ValueError) as e:
+                # ValueError — тело не JSON или не {"tasks": {...}}
+                logger.warning(f"Ошибка пакетного запроса статусов: {e}")
+                return {}
+
+        semaphore = asyncio.Semaphore(concurrency)
+        results: dict[str, Optional[dict]] = {}
+
+        async def fetch(task_id: str):
+            async with semaphore:
+                try:
+                    response = await self.client.get(
+                        f"{self.base_url}{self.STATUS_PATH}/{task_id}",
+                        timeout=self._timeout("status"),
+                    )
+                    if response.status_code == 404:
+                        results[task_id] = None
+                        return
+                    response.raise_for_status()
+                    results[task_id] = response.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    logger.warning(f"Не удалось получить статус {task_id}: {e}")
+
+        await asyncio.gather(*(fetch(task_id) for task_id in task_ids))
+        return results
+
+
+class BlacklistJobError(Exception):
+    """Задание проверки ЧС завершилось ошибкой на стороне сервиса"""
+
+
+class WorkersAPI(_ServiceClient):
+    """HTTP клиент к workers_service"""
+
+    SERVICE = "workers"
+    STATUS_PATH = "/workers/status"
+    BATCH_STATUS_PATH = "/workers/status/batch"
+    # None — ещё не проверяли, поддерживает ли сервис job API проверок ЧС
+    _jobs_supported: Optional[bool] = None
+    # None — ещё не проверяли, поддерживает ли сервис пакетные задания проверок ЧС
+    _bulk_jobs_supported: Optional[bool] = None
+    # None — ещё не проверяли, отдаёт ли сервис поток событий задания (/events)
+    _events_supported: Optional[bool] = None
 
     async def start_monitoring(
         self,
@@ -61,6 +191,7 @@ class WorkersAPI:
     async def stop_monitoring(self, task_id: str) -> dict:
         """POST /workers/stop/{task_id} - Остановка мониторинга"""
         url = f"{self.base_url}/workers/stop/{task_id}"
+        self.status_cache.invalidate(task_id)
 
         try:
             response = await self.client.post(url)
@@ -73,13 +204,19 @@ class WorkersAPI:
             raise
 
     async def get_status(self, task_id: str) -> dict:
-        """GET /workers/status/{task_id} - Статус мониторинга"""
+        """GET /workers/status/{task_id} - Статус мониторинга (с кэшем на status_ttl)"""
+        cached = self.status_cache.get(task_id)
+        if cached is not None:
+            return cached
+
         url = f"{self.base_url}/workers/status/{task_id}"
 
         try:
-            response = await self.client.get(url)
+            response = await self.client.get(url, timeout=self._timeout("status"))
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            self.status_cache.set(task_id, data)
+            return data
         except httpx.HTTPError as e:
             logger.error(f"Ошибка получения статуса {task_id}: {e}")
             raise
@@ -90,7 +227,7 @@ class WorkersAPI:
         params = {"limit": limit}
 
         try:
-            response = await self.client.get(url, params=params)
+            response = await self.client.get(url, params=params, timeout=self._timeout("status"))
             response.raise_for_status()
             return response.json()
         except httpx.HTTPError as e:
@@ -98,21 +235,23 @@ class WorkersAPI:
             raise
 
     async def check_blacklist_by_item(self, item_id: int) -> dict:
-        """POST /workers/{item_id}/check-blacklist - Проверка автора объявления в ЧС"""
+        """POST /workers/{item_id}/check-blacklist - Проверка автора объявления в ЧС
+
+        Синхронный вариант (fallback для run_blacklist_check_by_item).
+        """
         url = f"{self.base_url}/workers/{item_id}/check-blacklist"
         params = {"task_id": "from_callback"}
 
         try:
-            response = await self.client.post(url, params=params, timeout=1200.0)
+            response = await self.client.post(url, params=params, timeout=self._timeout("blacklist"))
             response.raise_for_status()
             return response.json()
         except httpx.HTTPError as e:
             logger.error(f"Ошибка проверки ЧС для объявления {item_id}: {e}")
             raise
 
-    async def check_blacklist(self, username: str | None, blacklist_session_path: str, fio: str | None = None) -> dict:
-        """POST /blacklist/check - Проверка в ЧС (3 ступени: username → user_id → ФИО)"""
-        url = f"{self.base_url}/blacklist/check"
+    @staticmethod
+    def _blacklist_params(username: str | None, blacklist_session_path: str, fio: str | None) -> dict:
         params = {
             "blacklist_session_path": blacklist_session_path,
         }
@@ -120,9 +259,19 @@ class WorkersAPI:
             params["username"] = username
         if fio:
             params["fio"] = fio
+        return params
+
+    async def check_blacklist(self, username: str | None, blacklist_session_path: str, fio: str | None = None) -> dict:
+        """POST /blacklist/check - Проверка в ЧС (3 ступени: username → user_id → ФИО)
+
+        Держит HTTP-запрос открытым на всё время сканирования. Используется как
+        fallback, если сервис не поддерживает job API (см. run_blacklist_check).
+        """
+        url = f"{self.base_url}/blacklist/check"
+        params = self._blacklist_params(username, blacklist_session_path, fio)
 
         try:
-            response = await self.client.post(url, params=params, timeout=1200.0)
+            response = await self.client.post(url, params=params, timeout=self._timeout("blacklist"))
             response.raise_for_status()
             data = response.json()
             logger.info(f"Проверка ЧС для {username}: found={data.get('found')}")
@@ -131,6 +280,263 @@ class WorkersAPI:
             logger.error(f"Ошибка проверки ЧС для {username}: {e}")
             raise
 
+    # ===== Job API проверки ЧС: submit → poll =====
+
+    async def submit_blacklist_check(
+        self, username: str | None, blacklist_session_path: str, fio: str | None = None
+    ) -> Optional[str]:
+        """POST /blacklist/jobs - Поставить проверку в ЧС в очередь сервиса
+
+        Returns:
+            job_id, или None если сервис не поддерживает job API (404/405)
+        """
+        url = f"{self.base_url}/blacklist/jobs"
+        params = self._blacklist_params(username, blacklist_session_path, fio)
+        return await self._submit_job(url, params, f"проверки ЧС для {username or fio}")
+
+    async def submit_blacklist_check_by_item(self, item_id: int) -> Optional[str]:
+        """POST /workers/{item_id}/check-blacklist/jobs - Поставить проверку автора объявления в очередь
+
+        Returns:
+            job_id, или None если сервис не поддерживает job API (404/405)
+        """
+        url = f"{self.base_url}/workers/{item_id}/check-blacklist/jobs"
+        params = {"task_id": "from_callback"}
+        return await self._submit_job(url, params, f"проверки ЧС для объявления {item_id}")
+
+    async def _submit_job(self, url: str, params: dict, what: str) -> Optional[str]:
+        if self._jobs_supported is False:
+            return None
+
+        try:
+            response = await self.client.post(url, params=params)
+            if response.status_code in (404, 405):
+                self._jobs_supported = False
+                logger.info("Job API проверки ЧС не поддерживается сервисом — синхронные запросы")
+                return None
+            response.raise_for_status()
+            self._jobs_supported = True
+            job_id = response.json()["job_id"]
+            logger.info(f"Задание {what} поставлено в очередь: job_id={job_id}")
+            return job_id
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка постановки задания {what}: {e}")
+            raise
+
+    async def get_blacklist_job(self, job_id: str) -> dict:
+        """GET /blacklist/jobs/{job_id} - Состояние задания: pending | running | done | failed"""
+        url = f"{self.base_url}/blacklist/jobs/{job_id}"
+
+        try:
+            response = await self.client.get(url, timeout=self._timeout("status"))
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка получения задания {job_id}: {e}")
+            raise
+
+    async def wait_blacklist_job(
+        self,
+        job_id: str,
+        poll_interval: float = 2.0,
+        max_interval: float = 15.0,
+        deadline: Optional[float] = None,
+    ) -> dict:
+        """Дождаться завершения задания короткими GET-запросами с нарастающим интервалом
+
+        Между опросами соединение возвращается в пул — ожидание не держит сокет.
+
+        Returns:
+            Результат задания (тот же формат, что у синхронной проверки)
+
+        Raises:
+            BlacklistJobError: задание завершилось ошибкой или не уложилось в deadline
+        """
+        async for event in self._poll_blacklist_job_events(job_id, poll_interval, max_interval, deadline):
+            if event["type"] == "done":
+                return event["result"]
+            if event["type"] == "failed":
+                raise BlacklistJobError(event["error"])
+
+    async def iter_blacklist_job(self, job_id: str) -> AsyncIterator[dict]:
+        """GET /blacklist/jobs/{job_id}/events - Поток событий задания (NDJSON)
+
+        События:
+            {"type": "progress", "stage", "chats_checked", "chats_total", "messages_checked"}
+            {"type": "hit", "result"}   — найдено совпадение (поиск может продолжаться)
+            {"type": "done", "result"}  — задание завершено
+            {"type": "failed", "error"} — задание завершилось ошибкой
+
+        Если сервис не отдаёт поток (404/405), события строятся из опроса
+        GET /blacklist/jobs/{job_id} (поле progress в ответе); следующие
+        задания сразу опрашиваются, без запроса к /events.
+        """
+        if self._events_supported is not False:
+            url = f"{self.base_url}/blacklist/jobs/{job_id}/events"
+            timeout = httpx.Timeout(self.http.timeouts["blacklist"], connect=self.http.timeout("status").connect)
+
+            async with self.client.stream("GET", url, timeout=timeout) as response:
+                if response.status_code in (404, 405):
+                    self._events_supported = False
+                    logger.info("Поток событий заданий ЧС не поддерживается сервисом — опрос статуса")
+                else:
+                    if response.is_error:
+                        # Тело читается до raise: обработчику нужен e.response.json()
+                        await response.aread()
+                        response.raise_for_status()
+                    self._events_supported = True
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        yield event
+                        if event.get("type") in ("done", "failed"):
+                            return
+                    raise BlacklistJobError(f"Поток событий задания {job_id} оборвался")
+
+        async for event in self._poll_blacklist_job_events(job_id):
+            yield event
+
+    async def _poll_blacklist_job_events(
+        self,
+        job_id: str,
+        poll_interval: float = 2.0,
+        max_interval: float = 15.0,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[dict]:
+        """События задания из опроса GET /blacklist/jobs/{job_id}"""
+        deadline = deadline if deadline is not None else self.http.timeouts["blacklist"]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        interval = poll_interval
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                job = await self.get_blacklist_job(job_id)
+            except httpx.HTTPError as e:
+                # Задание продолжает работать в сервисе — сбой опроса не повод бросать
+                # многоминутный поиск. Сдаёмся на 404 (задания нет) и прочих 4xx
+                if not _is_transient(e):
+                    raise
+                if loop.time() - started > deadline:
+                    raise BlacklistJobError(f"Задание {job_id} не удалось опросить за {deadline:.0f} с: {e}") from e
+                logger.warning(f"Опрос задания {job_id} не удался, повтор через {interval:.0f} с: {e}")
+                interval = min(interval * 1.5, max_interval)
+                continue
+            status = job.get("status")
+            if status == "done":
+                yield {"type": "done", "result": job.get("result") or {}}
+                return
+            if status == "failed":
+                yield {"type": "failed", "error": job.get("error") or "Задание завершилось ошибкой"}
+                return
+            if job.get("progress"):
+                yield {"type": "progress", **job["progress"]}
+            if loop.time() - started > deadline:
+                raise BlacklistJobError(f"Задание {job_id} не завершилось за {deadline:.0f} с")
+            interval = min(interval * 1.5, max_interval)
+
+    async def run_blacklist_check(
+        self, username: str | None, blacklist_session_path: str, fio: str | None = None
+    ) -> dict:
+        """Проверка в ЧС через job API (fallback — синхронный /blacklist/check)"""
+        job_id = await self.submit_blacklist_check(username, blacklist_session_path, fio=fio)
+        if job_id is None:
+            return await self.check_blacklist(username, blacklist_session_path, fio=fio)
+
+        result = await self.wait_blacklist_job(job_id)
+        logger.info(f"Проверка ЧС для {username}: found={result.get('found')}")
+        return result
+
+    async def submit_blacklist_batch(
+        self, candidates: list[dict], blacklist_session_path: str
+    ) -> Optional[str]:
+        """POST /blacklist/jobs/batch - Поставить пакетную проверку списка кандидатов
+
+        Сервис сканирует чаты ЧС один раз для всего списка.
+
+        Args:
+            candidates: [{"username": ..., "fio": ...}] — пустые поля опускаются
+
+        Returns:
+            job_id, или None если сервис не поддерживает пакетные задания (404/405)
+        """
+        if self._bulk_jobs_supported is False:
+            return None
+
+        url = f"{self.base_url}/blacklist/jobs/batch"
+        payload = {
+            "blacklist_session_path": blacklist_session_path,
+            "candidates": [{k: v for k, v in c.items() if v} for c in candidates],
+        }
+
+        try:
+            response = await self.client.post(url, json=payload)
+            if response.status_code in (404, 405):
+                self._bulk_jobs_supported = False
+                logger.info("Пакетные задания проверки ЧС не поддерживаются сервисом — проверки по одной")
+                return None
+            response.raise_for_status()
+            self._bulk_jobs_supported = True
+            job_id = response.json()["job_id"]
+            logger.info(f"Пакетная проверка ЧС ({len(candidates)} кандидатов) поставлена в очередь: job_id={job_id}")
+            return job_id
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка постановки пакетной проверки ЧС: {e}")
+            raise
+
+    async def run_blacklist_batch(self, candidates: list[dict], blacklist_session_path: str) -> list[dict]:
+        """Пакетная проверка списка в ЧС (fallback — кандидаты по одному через run_blacklist_check)
+
+        Returns:
+            Результаты в порядке candidates (формат как у одиночной проверки);
+            ошибка по кандидату в fallback-режиме — {"found": False, "error": ...}
+        """
+        job_id = await self.submit_blacklist_batch(candidates, blacklist_session_path)
+        if job_id is not None:
+            result = await self.wait_blacklist_job(job_id)
+            return result.get("results", [])
+
+        results = []
+        for candidate in candidates:
+            try:
+                results.append(await self.run_blacklist_check(
+                    candidate.get("username"), blacklist_session_path, fio=candidate.get("fio")
+                ))
+            except (httpx.HTTPError, BlacklistJobError) as e:
+                results.append({"found": False, "error": str(e)})
+        return results
+
+    async def run_blacklist_check_by_item(self, item_id: int) -> dict:
+        """Проверка автора объявления через job API (fallback — синхронный запрос)"""
+        job_id = await self.submit_blacklist_check_by_item(item_id)
+        if job_id is None:
+            return await self.check_blacklist_by_item(item_id)
+        return await self.wait_blacklist_job(job_id)
+
+    async def get_blacklist_changes(self, cursor: Optional[str], limit: int = 1000) -> Optional[dict]:
+        """GET /blacklist/records/changes - Лента изменений записей ЧС для локального индекса
+
+        Returns:
+            {"records": [...], "cursor", "has_more", "reset"} или None,
+            если сервис не отдаёт ленту изменений (404/405)
+        """
+        url = f"{self.base_url}/blacklist/records/changes"
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+
+        try:
+            response = await self.client.get(url, params=params, timeout=self._timeout("status"))
+            if response.status_code in (404, 405):
+                return None
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"Ошибка получения ленты изменений ЧС: {e}")
+            raise
+
     async def get_blacklist_chats(self) -> dict:
         """GET /blacklist/chats - Список чатов ЧС"""
         url = f"{self.base_url}/blacklist/chats"
@@ -180,7 +586,7 @@ class WorkersAPI:
         }
 
         try:
-            response = await self.client.get(url, params=params, timeout=60.0)
+            response = await self.client.get(url, params=params, timeout=self._timeout("topics"))
             response.raise_for_status()
             data = response.json()
             logger.info(f"Топики чата {chat_username}: is_forum={data.get('is_forum')}, topics={len(data.get('topics', []))}")
@@ -218,16 +624,12 @@ class WorkersAPI:
             raise
 
 
-class RealtyAPI:
+class RealtyAPI(_ServiceClient):
     """HTTP клиент к avito_cian_parser"""
 
-    def __init__(self, base_url: str):
-        self.base_url = base_url.rstrip("/")
-        self.client = httpx.AsyncClient(timeout=30.0)
-
-    async def close(self):
-        """Закрыть HTTP клиент"""
-        await self.client.aclose()
+    SERVICE = "realty"
+    STATUS_PATH = "/parse/status"
+    BATCH_STATUS_PATH = "/parse/status/batch"
 
     async def start_parsing(
         self,
@@ -269,6 +671,7 @@ class RealtyAPI:
     async def stop_parsing(self, task_id: str) -> dict:
         """POST /parse/stop/{task_id} - Остановка парсинга"""
         url = f"{self.base_url}/parse/stop/{task_id}"
+        self.status_cache.invalidate(task_id)
 
         try:
             response = await self.client.post(url)
@@ -281,13 +684,19 @@ class RealtyAPI:
             raise
 
     async def get_status(self, task_id: str) -> dict:
-        """GET /parse/status/{task_id} - Статус парсинга"""
+        """GET /parse/status/{task_id} - Статус парсинга (с кэшем на status_ttl)"""
+        cached = self.status_cache.get(task_id)
+        if cached is not None:
+            return cached
+
         url = f"{self.base_url}/parse/status/{task_id}"
 
         try:
-            response = await self.client.get(url)
+            response = await self.client.get(url, timeout=self._timeout("status"))
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            self.status_cache.set(task_id, data)
+            return data
         except httpx.HTTPError as e:
             logger.error(f"Ошибка получения статуса мониторинга {task_id}: {e}")
             raise
@@ -295,6 +704,7 @@ class RealtyAPI:
     async def resume_parsing(self, task_id: str) -> dict:
         """POST /parse/resume/{task_id} - Возобновить приостановленный мониторинг"""
         url = f"{self.base_url}/parse/resume/{task_id}"
+        self.status_cache.invalidate(task_id)
 
         try:
             response = await self.client.post(url)
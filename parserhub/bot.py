@@ -1,8 +1,11 @@
 """Главный модуль Telegram бота ParserHub"""
 import sys
 import asyncio
-import httpx
+import multiprocessing
+import secrets
+import signal
 from pathlib import Path
+from typing import Optional
 from loguru import logger
 from telegram import BotCommand
 from telegram.ext import Application
@@ -11,7 +14,23 @@ from parserhub.config import config
 from parserhub.db_service import DatabaseService
 from parserhub.session_manager import SessionManager
 from parserhub.api_client import WorkersAPI, RealtyAPI
+from parserhub.http_pool import HttpPool
+from parserhub.metrics import (
+    REGISTRY, application_collector, instrument_handlers, instrument_methods,
+    metrics_route, serve_metrics, stats_samples,
+)
+from parserhub.rate_limiter import OutboundRateLimiter
+from parserhub.persistence import SQLitePersistence
+from parserhub.sharding import ShardRouter, ShardWorker, run_router, run_shard
+from parserhub.singleflight import SharedSingleFlight, SingleFlight
+from parserhub.update_processor import PerUserUpdateProcessor
+from parserhub.webhook import WebhookApp, run_webhook
 from parserhub.services.subscription_service import SubscriptionService
+from parserhub.services.blacklist_cache import BlacklistCache
+from parserhub.services.blacklist_index import BlacklistIndex
+from parserhub.services.blacklist_scheduler import BlacklistScheduler
+from parserhub.services.broadcast import BroadcastManager, BroadcastService
+from parserhub.services.reconcile import reconcile_tasks
 
 # Импорт handlers
 from parserhub.handlers.start import register_start_handlers
@@ -24,20 +43,30 @@ from parserhub.handlers.blacklist import register_blacklist_handlers
 from parserhub.handlers.admin import register_admin_handlers
 
 
-def setup_logging():
-    """Настройка логирования"""
+ALLOWED_UPDATES = ["message", "callback_query", "pre_checkout_query"]
+
+
+def setup_logging(shard: Optional[int] = None):
+    """Настройка логирования (у каждого шарда свой файл: ротация из нескольких процессов небезопасна)"""
     logger.remove()  # Удалить дефолтный handler
 
+    log_path = Path(config.LOG_PATH)
+    prefix = ""
+    if shard is not None:
+        log_path = log_path.with_name(f"{log_path.stem}.shard{shard}{log_path.suffix}")
+        prefix = f"[shard {shard}] "
+
     # Console logging
     logger.add(
         sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
+        format=f"<green>{{time:YYYY-MM-DD HH:mm:ss}}</green> | <level>{{level: <8}}</level> | "
+               f"{prefix}<level>{{message}}</level>",
         level="DEBUG",  # Изменено на DEBUG для отладки авторизации
     )
 
     # File logging
     logger.add(
-        config.LOG_PATH,
+        log_path,
         format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
         level="DEBUG",
         rotation="10 MB",
@@ -56,9 +85,17 @@ async def post_init(application: Application):
     sessions_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"Директория сессий: {sessions_dir.resolve()}")
 
-    # Инициализировать БД
-    db = DatabaseService(config.DB_PATH)
-    await db.init_db()
+    # БД создана в main(); обычно её уже открыла персистентность при загрузке
+    # диалогов и user_data (пул соединений живёт до post_shutdown)
+    db: DatabaseService = application.bot_data["db"]
+    if not db.pool.is_open:
+        await db.open()
+        await db.init_db()
+
+    # В шардированном запуске задачи «одна на бота» выполняет только шард 0
+    shard: Optional[ShardWorker] = application.bot_data.get("shard")
+    primary = shard is None or shard.primary
+    shards = shard.shards if shard else 1
 
     # Создать session manager
     session_manager = SessionManager(
@@ -67,28 +104,86 @@ async def post_init(application: Application):
         api_hash=config.API_HASH,
     )
 
-    # Инициализировать сервис подписок
-    subscription_service = SubscriptionService(config.DB_PATH)
-    await subscription_service.init_table()
-
-    # Создать API клиенты
-    workers_api = WorkersAPI(config.WORKERS_SERVICE_URL)
-    realty_api = RealtyAPI(config.REALTY_SERVICE_URL)
+    # Инициализировать сервис подписок (общий пул соединений с DatabaseService)
+    subscription_service = SubscriptionService(
+        db.pool, access_cache=db.access_cache, owner_id=config.ADMIN_ID
+    )
+    if config.METRICS_ENABLED:
+        instrument_methods(subscription_service)
+    # Кэш результатов проверки в ЧС (таблица blacklist_cache в bot.db)
+    blacklist_cache = BlacklistCache(db.pool, ttl=config.BLACKLIST_CACHE_TTL)
+    # Локальное зеркало записей ЧС (таблицы blacklist_records / blacklist_fts)
+    blacklist_index = BlacklistIndex(db.pool, synced_elsewhere=not primary)
+
+    # Общий HTTP-пул и API клиенты поверх него
+    http_pool = HttpPool(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive=config.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        http2=config.HTTP2,
+        timeouts={
+            "default": config.HTTP_TIMEOUT,
+            "status": config.HTTP_STATUS_TIMEOUT,
+            "blacklist": config.HTTP_BLACKLIST_TIMEOUT,
+        },
+    )
+    workers_api = WorkersAPI(config.WORKERS_SERVICE_URL, http=http_pool, status_ttl=config.STATUS_CACHE_TTL)
+    realty_api = RealtyAPI(config.REALTY_SERVICE_URL, http=http_pool, status_ttl=config.STATUS_CACHE_TTL)
 
     # Сохранить в bot_data
-    application.bot_data["db"] = db
+    application.bot_data["http_pool"] = http_pool
     application.bot_data["session_manager"] = session_manager
     application.bot_data["subscription"] = subscription_service
+    application.bot_data["blacklist_cache"] = blacklist_cache
+    application.bot_data["blacklist_index"] = blacklist_index
+    # Дедупликация одновременных одинаковых проверок в ЧС; одинаковые проверки разных
+    # пользователей попадают в разные шарды — там запросы сводятся через bot.db
+    if shard:
+        flights = SharedSingleFlight(
+            db.pool, shard=shard.shard, claim_ttl=config.HTTP_BLACKLIST_TIMEOUT + 60
+        )
+        await flights.release_shard()
+        application.bot_data["blacklist_flights"] = flights
+    else:
+        application.bot_data["blacklist_flights"] = SingleFlight()
+    # Очередь поисков в ЧС: общий лимит сканирований, round-robin между пользователями
+    # (лимит делится между шардами — у каждого свои пользователи)
+    application.bot_data["blacklist_scheduler"] = BlacklistScheduler(
+        concurrency=max(1, config.BLACKLIST_CONCURRENCY // shards), user_queue=config.BLACKLIST_USER_QUEUE
+    )
     application.bot_data["workers_api"] = workers_api
     application.bot_data["realty_api"] = realty_api
+    # Лимитер исходящих запускается и останавливается вместе с ботом (PTB) — здесь только для метрик
+    application.bot_data["rate_limiter"] = application.bot.rate_limiter
+    application.bot_data["update_processor"] = application.update_processor
+    application.bot_data["broadcasts"] = BroadcastManager(
+        BroadcastService(db.pool),
+        concurrency=config.BROADCAST_CONCURRENCY,
+        page_size=config.BROADCAST_PAGE_SIZE,
+    )
 
     # Очистить зомби-задачи (задачи, которых уже нет в сервисах после рестарта)
-    await _reconcile_tasks(db, config.WORKERS_SERVICE_URL, config.REALTY_SERVICE_URL)
-
-    # Запустить фоновую очистку истёкших подписок
-    application.bot_data["cleaner_task"] = asyncio.create_task(
-        _subscription_cleaner_loop(application)
+    if primary and config.RECONCILE_IN_BACKGROUND:
+        application.bot_data["reconcile_task"] = asyncio.create_task(
+            _background_reconcile(application)
+        )
+    elif primary:
+        await reconcile_tasks(db, workers_api, realty_api, concurrency=config.RECONCILE_CONCURRENCY)
+
+    # Запустить фоновую запись отложенных обновлений профилей
+    application.bot_data["user_flush_task"] = asyncio.create_task(
+        _user_flush_loop(application)
     )
+    # Запустить дельта-синхронизацию локального индекса ЧС
+    if primary and config.BLACKLIST_INDEX_SYNC_INTERVAL > 0:
+        application.bot_data["index_sync_task"] = asyncio.create_task(
+            _blacklist_index_loop(application)
+        )
+    # Запустить фоновую очистку истёкших подписок
+    if primary:
+        application.bot_data["cleaner_task"] = asyncio.create_task(
+            _subscription_cleaner_loop(application)
+        )
     # Запустить фоновую очистку зависших сессий авторизации Pyrogram
     application.bot_data["auth_cleaner_task"] = asyncio.create_task(
         _auth_cleaner_loop(application)
@@ -98,44 +193,67 @@ async def post_init(application: Application):
         _antispam_cleaner_loop(application)
     )
 
-    # Установить команды бота (Menu Button)
-    commands = [
-        BotCommand("start", "🏠 Главное меню"),
-    ]
-    await application.bot.set_my_commands(commands)
-    logger.info("Команды бота установлены (Menu Button)")
+    if primary:
+        # Продолжить рассылки, прерванные прошлой остановкой
+        await application.bot_data["broadcasts"].resume(application.bot)
+
+        # Установить команды бота (Menu Button)
+        commands = [
+            BotCommand("start", "🏠 Главное меню"),
+        ]
+        await application.bot.set_my_commands(commands)
+        logger.info("Команды бота установлены (Menu Button)")
+
+    if config.METRICS_ENABLED:
+        REGISTRY.add_collector(application_collector(application))
+        # В режиме webhook /metrics отдаёт тот же сервер (маршрут добавлен в main)
+        if "webhook" not in application.bot_data:
+            port = config.PORT + 1 + shard.shard if shard else config.PORT
+            application.bot_data["metrics_server"] = await serve_metrics(config.HOST, port)
 
     logger.info("Инициализация завершена")
 
 
-async def _reconcile_tasks(db: DatabaseService, workers_url: str, realty_url: str):
-    """При старте удаляем из active_tasks задачи, которых уже нет в сервисах (зомби)"""
-    tasks = await db.get_all_running_tasks()
-    if not tasks:
-        logger.info("Reconcile: активных задач нет")
-        return
+async def _background_reconcile(application: Application):
+    """Reconcile в фоне после старта polling (RECONCILE_IN_BACKGROUND)"""
+    try:
+        await reconcile_tasks(
+            application.bot_data["db"],
+            application.bot_data["workers_api"],
+            application.bot_data["realty_api"],
+            concurrency=config.RECONCILE_CONCURRENCY,
+        )
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.error(f"Reconcile error: {e}")
 
-    removed = 0
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        for task in tasks:
-            try:
-                if task.service == "workers":
-                    r = await client.get(f"{workers_url}/workers/status/{task.task_id}")
-                elif task.service == "realty":
-                    r = await client.get(f"{realty_url}/parse/status/{task.task_id}")
-                else:
-                    continue
 
-                if r.status_code == 404:
-                    await db.delete_task(task.task_id)
-                    removed += 1
-                    logger.info(f"Reconcile: зомби-задача удалена {task.task_id} (user={task.user_id})")
+async def _user_flush_loop(application: Application):
+    """Фоновая задача: пакетная запись last_active/username/full_name в БД"""
+    while True:
+        try:
+            await asyncio.sleep(config.USER_FLUSH_INTERVAL)
+            db: DatabaseService = application.bot_data["db"]
+            await db.flush_user_updates()
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"User flush error: {e}")
 
-            except Exception as e:
-                # Сервис недоступен — не удаляем, он может подняться
-                logger.warning(f"Reconcile: не удалось проверить {task.task_id}: {e}")
 
-    logger.info(f"Reconcile завершён: проверено {len(tasks)}, удалено зомби: {removed}")
+async def _blacklist_index_loop(application: Application):
+    """Фоновая задача: догрузка изменений записей ЧС в локальный индекс"""
+    index: BlacklistIndex = application.bot_data["blacklist_index"]
+    while True:
+        try:
+            await index.sync(application.bot_data["workers_api"])
+            await asyncio.sleep(config.BLACKLIST_INDEX_SYNC_INTERVAL)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Blacklist index sync error: {e}")
+            await asyncio.sleep(config.BLACKLIST_INDEX_SYNC_INTERVAL)
 
 
 async def _antispam_cleaner_loop(application: Application):
@@ -166,7 +284,7 @@ async def _auth_cleaner_loop(application: Application):
 
 
 async def _subscription_cleaner_loop(application: Application):
-    """Фоновая задача: удаление истёкших подписок раз в сутки"""
+    """Фоновая задача: удаление истёкших подписок и записей кэша ЧС раз в сутки"""
     while True:
         try:
             await asyncio.sleep(24 * 60 * 60)  # раз в сутки
@@ -174,6 +292,9 @@ async def _subscription_cleaner_loop(application: Application):
             removed = await service.delete_expired()
             if removed:
                 logger.info(f"Expired subscriptions cleaned: {removed}")
+            removed = await application.bot_data["blacklist_cache"].delete_expired()
+            if removed:
+                logger.info(f"Expired blacklist cache entries cleaned: {removed}")
         except asyncio.CancelledError:
             break
         except Exception as e:
@@ -186,7 +307,15 @@ async def post_shutdown(application: Application):
 
     # НЕ удаляем active_tasks при shutdown — задачи в сервисах восстанавливаются сами
     # после рестарта (workers-service из 'paused', realty-monitor из 'suspended').
-    # _reconcile_tasks при следующем post_init очистит настоящие зомби (404 от сервиса).
+    # reconcile_tasks при следующем post_init очистит настоящие зомби (404 от сервиса).
+
+    # Прервать поиски в ЧС — до закрытия HTTP клиентов, которыми они пользуются
+    if "blacklist_scheduler" in application.bot_data:
+        await application.bot_data["blacklist_scheduler"].close()
+
+    # Прервать рассылки — статус 'running' остаётся, после рестарта они продолжатся
+    if "broadcasts" in application.bot_data:
+        await application.bot_data["broadcasts"].close()
 
     # Закрыть HTTP клиенты
     if "workers_api" in application.bot_data:
@@ -195,9 +324,15 @@ async def post_shutdown(application: Application):
     if "realty_api" in application.bot_data:
         await application.bot_data["realty_api"].close()
 
+    if "http_pool" in application.bot_data:
+        await application.bot_data["http_pool"].close()
+
     # Отменить все фоновые задачи и дождаться их завершения
     tasks_to_cancel = []
-    for task_key in ("cleaner_task", "auth_cleaner_task", "antispam_task"):
+    for task_key in (
+        "reconcile_task", "user_flush_task", "index_sync_task",
+        "cleaner_task", "auth_cleaner_task", "antispam_task",
+    ):
         task = application.bot_data.get(task_key)
         if task and not task.done():
             task.cancel()
@@ -206,29 +341,74 @@ async def post_shutdown(application: Application):
     if tasks_to_cancel:
         await asyncio.gather(*tasks_to_cancel, return_exceptions=True)
 
-    logger.info("Бот остановлен")
+    if "metrics_server" in application.bot_data:
+        server = application.bot_data["metrics_server"]
+        server.close()
+        await server.wait_closed()
 
+    # Закрыть пул соединений SQLite — после фоновых задач, которые ещё могут писать в БД
+    if "db" in application.bot_data:
+        db: DatabaseService = application.bot_data["db"]
+        try:
+            await db.flush_user_updates()
+        except Exception as e:
+            logger.error(f"Не удалось записать отложенные обновления профилей: {e}")
+        await db.close()
 
-def main():
-    """Запуск бота"""
-    setup_logging()
+    logger.info("Бот остановлен")
 
-    logger.info("=" * 50)
-    logger.info("ParserHub Bot - Starting")
-    logger.info(f"Workers Service: {config.WORKERS_SERVICE_URL}")
-    logger.info(f"Realty Service: {config.REALTY_SERVICE_URL}")
-    logger.info(f"Sessions Directory: {config.SESSIONS_DIR}")
-    logger.info("=" * 50)
 
-    # Создать приложение
+def build_application(shard: Optional[ShardWorker] = None) -> Application:
+    """Приложение PTB со всеми обработчиками (один процесс или один шард)"""
+    shards = shard.shards if shard else 1
+
+    # БД нужна до post_init: персистентность загружает из неё диалоги в Application.initialize
+    db = DatabaseService(
+        config.DB_PATH,
+        readers=config.DB_POOL_READERS,
+        cache_ttl=config.ACCESS_CACHE_TTL,
+        cache_size=config.ACCESS_CACHE_SIZE,
+        # Сброс прав доступа пользователя доходит до его шарда
+        access_cache=(
+            shard.cache("access", maxsize=config.ACCESS_CACHE_SIZE, ttl=config.ACCESS_CACHE_TTL)
+            if shard else None
+        ),
+    )
+    if config.METRICS_ENABLED:
+        # Время каждого метода DatabaseService — parserhub_db_query_seconds
+        instrument_methods(db)
+
+    # Создать приложение (в режиме webhook обновления кладёт в очередь WebhookApp
+    # или шард, Updater не нужен)
+    builder = Application.builder().token(config.BOT_TOKEN)
+    if config.WEBHOOK_URL or shard:
+        builder = builder.updater(None)
     app = (
-        Application.builder()
-        .token(config.BOT_TOKEN)
+        builder
+        # Лимиты Telegram — на бота целиком: шарды делят общий и групповой поровну
+        .rate_limiter(OutboundRateLimiter(
+            global_rate=config.OUTBOUND_GLOBAL_RATE / shards,
+            chat_rate=config.OUTBOUND_CHAT_RATE,
+            group_rate=config.OUTBOUND_GROUP_RATE / 60 / shards,
+            burst=config.OUTBOUND_CHAT_BURST,
+            max_retries=config.OUTBOUND_MAX_RETRIES,
+        ))
+        .concurrent_updates(PerUserUpdateProcessor(config.UPDATE_CONCURRENCY))
+        .persistence(SQLitePersistence(
+            db,
+            update_interval=config.PERSISTENCE_FLUSH_INTERVAL,
+            shard=(shard.shard, shards) if shard else None,
+        ))
         .post_init(post_init)
         .post_shutdown(post_shutdown)
         .build()
     )
 
+    # bot_data не персистентный — сервисы кладутся в него напрямую
+    app.bot_data["db"] = db
+    if shard:
+        app.bot_data["shard"] = shard
+
     # Регистрация handlers (порядок важен!)
     # ConversationHandler'ы регистрируются ДО start_handlers, чтобы их fallback'и
     # перехватывали кнопки меню ("❌ Отмена", "🔙 Назад" и т.д.) раньше
@@ -241,12 +421,110 @@ def main():
     register_blacklist_handlers(app)
     register_admin_handlers(app)
     register_start_handlers(app)  # ПОСЛЕДНИМ: catch-all для главного меню
+    if config.METRICS_ENABLED:
+        instrument_handlers(app)
 
     logger.info("Handlers зарегистрированы")
+    return app
+
+
+def run_shard_worker(shard: int, inboxes: list):
+    """Точка входа процесса-обработчика (multiprocessing, spawn)"""
+    # Ctrl+C в терминале получает вся группа процессов; шарды останавливает приёмник (STOP),
+    # дав им обработать уже принятые обновления
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging(shard)
+
+    worker = ShardWorker(shard, inboxes, max_queue=config.WEBHOOK_QUEUE_SIZE)
+    asyncio.run(run_shard(build_application(worker), worker))
+
+
+async def _migrate():
+    db = DatabaseService(config.DB_PATH, readers=1)
+    await db.open()
+    try:
+        await db.init_db()
+    finally:
+        await db.close()
+
+
+def run_sharded():
+    """Приёмник webhook в этом процессе и SHARDS процессов-обработчиков"""
+    # Миграции — один раз до запуска шардов, а не параллельно в каждом
+    asyncio.run(_migrate())
+
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue(maxsize=config.WEBHOOK_QUEUE_SIZE) for _ in range(config.SHARDS)]
+    router = ShardRouter(config.WEBHOOK_PATH, config.WEBHOOK_SECRET or secrets.token_urlsafe(32), inboxes)
+    if config.METRICS_ENABLED:
+        # Метрики приёмника; у шардов — свои, на PORT + 1 + N
+        REGISTRY.add_collector(lambda: stats_samples("webhook", router.stats()))
+        router.add_route("GET", "/metrics", metrics_route())
+
+    def start_worker(shard: int):
+        process = context.Process(
+            target=run_shard_worker, args=(shard, inboxes), name=f"parserhub-shard-{shard}"
+        )
+        process.start()
+        return process
+
+    asyncio.run(run_router(
+        router,
+        start_worker,
+        token=config.BOT_TOKEN,
+        url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+        host=config.HOST,
+        port=config.PORT,
+        max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=ALLOWED_UPDATES,
+    ))
+
+
+def main():
+    """Запуск бота"""
+    setup_logging()
+
+    logger.info("=" * 50)
+    logger.info("ParserHub Bot - Starting")
+    logger.info(f"Workers Service: {config.WORKERS_SERVICE_URL}")
+    logger.info(f"Realty Service: {config.REALTY_SERVICE_URL}")
+    logger.info(f"Sessions Directory: {config.SESSIONS_DIR}")
+    logger.info("=" * 50)
+
+    if config.SHARDS > 1:
+        if not config.WEBHOOK_URL:
+            logger.error("SHARDS > 1 работает только в режиме webhook: задайте WEBHOOK_URL")
+            sys.exit(1)
+        logger.info(f"Запуск webhook с шардами: {config.SHARDS}...")
+        run_sharded()
+        return
+
+    app = build_application()
 
     # Запуск бота
-    logger.info("Запуск polling...")
-    app.run_polling(allowed_updates=["message", "callback_query", "pre_checkout_query"])
+    if config.WEBHOOK_URL:
+        logger.info("Запуск webhook...")
+        webhook_app = WebhookApp(
+            app,
+            path=config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or secrets.token_urlsafe(32),
+            max_queue=config.WEBHOOK_QUEUE_SIZE,
+        )
+        app.bot_data["webhook"] = webhook_app
+        if config.METRICS_ENABLED:
+            webhook_app.add_route("GET", "/metrics", metrics_route())
+        asyncio.run(run_webhook(
+            app,
+            webhook_app,
+            url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            host=config.HOST,
+            port=config.PORT,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=ALLOWED_UPDATES,
+        ))
+    else:
+        logger.info("Запуск polling...")
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
@@ -23,6 +23,63 @@ class Config(BaseSettings):
     SESSIONS_DIR: str = "./sessions"
     LOG_PATH: str = "parserhub.log"
 
+    # SQLite: количество соединений-читателей в пуле (писатель всегда один)
+    DB_POOL_READERS: int = 4
+
+    # Кэш прав доступа (админ / подписка / пробный период): TTL в секундах и макс. размер
+    ACCESS_CACHE_TTL: float = 60.0
+    ACCESS_CACHE_SIZE: int = 10_000
+
+    # HTTP-пул к микросервисам: размер, keep-alive, HTTP/2 (нужен пакет h2 и поддержка сервисом)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2: bool = False
+
+    # Таймауты HTTP-запросов (сек): обычные, статусы/списки, проверка ЧС
+    HTTP_TIMEOUT: float = 30.0
+    HTTP_STATUS_TIMEOUT: float = 10.0
+    HTTP_BLACKLIST_TIMEOUT: float = 1200.0
+
+    # TTL (сек) кэша статусов задач микросервисов (список задач, «🔄 Обновить»)
+    STATUS_CACHE_TTL: float = 5.0
+
+    # Кэш результатов проверки в ЧС (сек); 0 — выключен. Сбрасывается при изменении чатов ЧС
+    BLACKLIST_CACHE_TTL: int = 6 * 60 * 60
+
+    # Очередь поисков в ЧС: одновременных сканирований на весь бот и глубина очереди пользователя
+    BLACKLIST_CONCURRENCY: int = 3
+    BLACKLIST_USER_QUEUE: int = 3
+
+    # Период дельта-синхронизации локального индекса записей ЧС (сек); 0 — индекс выключен
+    BLACKLIST_INDEX_SYNC_INTERVAL: int = 300
+
+    # Лимиты исходящих запросов к Bot API: всего в секунду, в личный чат в секунду,
+    # в группу в минуту; допустимая пачка подряд в один чат и повторы после RetryAfter
+    OUTBOUND_GLOBAL_RATE: float = 30.0
+    OUTBOUND_CHAT_RATE: float = 1.0
+    OUTBOUND_GROUP_RATE: float = 20.0
+    OUTBOUND_CHAT_BURST: int = 3
+    OUTBOUND_MAX_RETRIES: int = 3
+
+    # Рассылки из админки: одновременных отправок и размер страницы получателей
+    BROADCAST_CONCURRENCY: int = 20
+    BROADCAST_PAGE_SIZE: int = 100
+
+    # Параллельная обработка обновлений разных пользователей (обновления одного — по очереди)
+    UPDATE_CONCURRENCY: int = 64
+
+    # Период (сек) записи изменившихся состояний диалогов и user_data в bot.db
+    PERSISTENCE_FLUSH_INTERVAL: float = 5.0
+
+    # Reconcile задач при старте: одновременных запросов статуса к сервису
+    # и запуск в фоне (не задерживает начало polling)
+    RECONCILE_CONCURRENCY: int = 20
+    RECONCILE_IN_BACKGROUND: bool = False
+
+    # Интервал (сек) сброса отложенных обновлений профилей (last_active, username) в БД
+    USER_FLUSH_INTERVAL: float = 5.0
+
     # Payments (YooKassa через BotFather)
     PROVIDER_TOKEN: str = ""
 
@@ -30,6 +87,23 @@ class Config(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8003
 
+    # Webhook: публичный адрес бота (https://bot.example.com); пусто — long polling.
+    # Сервер слушает HOST:PORT, Telegram шлёт обновления на WEBHOOK_URL + WEBHOOK_PATH.
+    # WEBHOOK_SECRET пустой — случайный при каждом запуске (webhook переустанавливается на старте)
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/telegram"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    WEBHOOK_QUEUE_SIZE: int = 1000
+
+    # Процессов-обработчиков (только с WEBHOOK_URL). 1 — всё в одном процессе; больше —
+    # приёмник webhook раздаёт обновления шардам по user_id % SHARDS
+    SHARDS: int = 1
+
+    # Метрики Prometheus: GET /metrics на HOST:PORT (в режиме webhook — на том же сервере);
+    # шард N в шардированном запуске отдаёт свои на PORT + 1 + N
+    METRICS_ENABLED: bool = True
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
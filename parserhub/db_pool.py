@@ -0,0 +1,110 @@
+"""Пул долгоживущих соединений SQLite (один писатель + N читателей)"""
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aiosqlite
+from loguru import logger
+
+
+# PRAGMA для всех соединений. WAL позволяет читателям работать параллельно с писателем,
+# synchronous=NORMAL в WAL-режиме безопасен и не делает fsync на каждый commit.
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",      # ~16 МБ страничного кэша на соединение
+    "PRAGMA mmap_size = 134217728",    # 128 МБ memory-mapped I/O
+)
+
+
+class ConnectionPool:
+    """Пул соединений aiosqlite, открываемый один раз на время жизни бота.
+
+    Запись идёт через единственное соединение под asyncio.Lock (SQLite всё равно
+    допускает только одного писателя), чтение — через очередь из N соединений.
+    """
+
+    def __init__(self, db_path: str | Path, readers: int = 4):
+        self.db_path = Path(db_path)
+        self.readers_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in _PRAGMAS:
+            await conn.execute(pragma)
+        if read_only:
+            await conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    async def open(self):
+        """Открыть соединения (вызывается в post_init)"""
+        if self.is_open:
+            return
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Писатель открывается первым: он переводит файл в WAL до подключения читателей
+        self._writer = await self._connect()
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.readers_count):
+            conn = await self._connect(read_only=True)
+            self._readers.append(conn)
+            self._idle_readers.put_nowait(conn)
+
+        logger.info(f"Пул SQLite открыт: {self.db_path} (1 writer, {self.readers_count} readers)")
+
+    async def close(self):
+        """Закрыть все соединения (вызывается в post_shutdown)"""
+        if not self.is_open:
+            return
+
+        async with self._write_lock:
+            for conn in self._readers:
+                await conn.close()
+            self._readers.clear()
+            self._idle_readers = None
+            await self._writer.close()
+            self._writer = None
+
+        logger.info("Пул SQLite закрыт")
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение только для чтения из пула"""
+        if not self.is_open:
+            raise RuntimeError("ConnectionPool не открыт: вызовите open() перед использованием")
+
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение писателя: одна транзакция, commit при успехе, rollback при ошибке"""
+        if not self.is_open:
+            raise RuntimeError("ConnectionPool не открыт: вызовите open() перед использованием")
+
+        async with self._write_lock:
+            # IMMEDIATE: блокировка записи берётся сразу (с ожиданием busy_timeout). С отложенной
+            # транзакцией «прочитал, потом пишу» при втором процессе-писателе (шарды) падает
+            # с «database is locked» без ожидания
+            await self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
@@ -1,107 +1,64 @@
 """Сервис для работы с SQLite базой данных"""
-import aiosqlite
 import json
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 from loguru import logger
 
+from parserhub.cache import TTLCache
+from parserhub.db_pool import ConnectionPool
+from parserhub.migrations import get_schema_version, run_migrations
 from parserhub.models import User, UserSettings, ActiveTask
 
 
 class DatabaseService:
     """Управление базой данных пользователей и задач"""
 
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        readers: int = 4,
+        cache_ttl: float = 60.0,
+        cache_size: int = 10_000,
+        access_cache: Optional[TTLCache] = None,
+    ):
         self.db_path = Path(db_path)
+        # Общий пул соединений: его же использует SubscriptionService
+        self.pool = ConnectionPool(self.db_path, readers=readers)
+        # Кэш прав доступа для горячего пути (главное меню, входы в разделы).
+        # Заполняется SubscriptionService.resolve_access, сбрасывается здесь при изменениях.
+        # В шардированном запуске передаётся ShardedTTLCache шарда
+        if access_cache is None:
+            access_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.access_cache = access_cache
+        # Write-behind буфер профилей: user_id -> (username, full_name, last_active).
+        # Повторные /start одного пользователя схлопываются в одну запись до flush
+        self._pending_profiles: dict[int, tuple[Optional[str], Optional[str], str]] = {}
+
+    async def open(self):
+        """Открыть пул соединений (вызывается в post_init до init_db)"""
+        await self.pool.open()
+
+    async def close(self):
+        """Закрыть пул соединений (вызывается в post_shutdown)"""
+        await self.pool.close()
 
     async def init_db(self):
-        """Инициализация БД и создание таблиц"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Таблица пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    full_name TEXT,
-                    phone TEXT,
-                    is_parser_authorized BOOLEAN DEFAULT 0,
-                    is_blacklist_authorized BOOLEAN DEFAULT 0,
-                    created_at TEXT NOT NULL,
-                    last_active TEXT
-                )
-            """)
-
-            # Таблица настроек пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_settings (
-                    user_id INTEGER PRIMARY KEY,
-                    default_mode TEXT DEFAULT 'worker',
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица активных задач
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS active_tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    task_id TEXT NOT NULL,
-                    service TEXT NOT NULL,
-                    task_type TEXT,
-                    status TEXT DEFAULT 'running',
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица администраторов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS admins (
-                    user_id INTEGER PRIMARY KEY,
-                    added_by INTEGER,
-                    created_at TEXT NOT NULL
-                )
-            """)
-
-            # Таблица платежей (для статистики доходов)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS payments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    plan TEXT NOT NULL,
-                    amount INTEGER NOT NULL,
-                    currency TEXT NOT NULL DEFAULT 'RUB',
-                    created_at TEXT NOT NULL
-                )
-            """)
-
-            # Таблица глобальных настроек (для чатов ПВЗ и ЧС)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS global_config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-            """)
-
-            await db.commit()
-
-            # Миграция: trial_until (безопасно — игнорируем если уже есть)
-            try:
-                await db.execute("ALTER TABLE users ADD COLUMN trial_until TEXT DEFAULT NULL")
-                await db.commit()
-                logger.info("Миграция: добавлена колонка trial_until в таблицу users")
-            except Exception:
-                pass  # Колонка уже существует
+        """Инициализация БД: применить недостающие миграции схемы"""
+        async with self.pool.write() as db:
+            applied = await run_migrations(db)
+            version = await get_schema_version(db)
 
-            logger.info(f"База данных инициализирована: {self.db_path}")
+        if applied:
+            logger.info(f"База данных обновлена до схемы v{version}: {self.db_path}")
+        else:
+            logger.info(f"База данных инициализирована (схема v{version}): {self.db_path}")
 
     # ===== Пользователи =====
 
     async def get_user(self, user_id: int) -> Optional[User]:
         """Получить пользователя по ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM users WHERE user_id = ?", (user_id,)
             ) as cursor:
@@ -113,8 +70,7 @@ class DatabaseService:
     async def get_user_by_username(self, username: str) -> Optional[User]:
         """Найти пользователя по username"""
         username = username.lstrip("@")
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM users WHERE username = ?", (username,)
             ) as cursor:
@@ -130,40 +86,141 @@ class DatabaseService:
         full_name: Optional[str] = None,
         phone: Optional[str] = None,
     ) -> User:
-        """Создать или обновить пользователя"""
-        existing = await self.get_user(user_id)
+        """Создать или обновить пользователя (UPSERT, сразу в БД)"""
         now = datetime.utcnow().isoformat()
+        # Применяется только при вставке — новому пользователю пробный период 3 дня
+        trial_until = (datetime.utcnow() + timedelta(days=3)).isoformat()
 
-        async with aiosqlite.connect(self.db_path) as db:
-            if existing:
-                # Обновление
+        async with self.pool.write() as db:
+            # Строка возвращается только если вставка произошла — так видно нового пользователя
+            async with db.execute(
+                """
+                INSERT INTO users (user_id, username, full_name, phone, created_at, last_active, trial_until)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO NOTHING
+                RETURNING *
+                """,
+                (user_id, username, full_name, phone, now, now, trial_until),
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            is_new = row is not None
+            if is_new:
                 await db.execute(
+                    "INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,)
+                )
+            else:
+                async with db.execute(
                     """
-                    UPDATE users
-                    SET username = ?, full_name = ?, phone = COALESCE(?, phone), last_active = ?
+                    UPDATE users SET
+                        username = ?,
+                        full_name = ?,
+                        phone = COALESCE(?, phone),
+                        last_active = ?
                     WHERE user_id = ?
+                    RETURNING *
                     """,
                     (username, full_name, phone, now, user_id),
-                )
-            else:
-                # Создание — выдаём пробный период 3 дня
-                trial_until = (datetime.utcnow() + timedelta(days=3)).isoformat()
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+        # Отложенное обновление профиля устарело — записали более свежие данные
+        self._pending_profiles.pop(user_id, None)
+        if is_new:
+            logger.info(f"Новый пользователь {user_id}: пробный период до {trial_until}")
+            # Закэшированное «нет доступа» до регистрации больше не актуально
+            self.access_cache.invalidate(user_id)
+
+        return User(**dict(row))
+
+    async def register_user(
+        self,
+        user_id: int,
+        username: Optional[str] = None,
+        full_name: Optional[str] = None,
+    ) -> bool:
+        """Регистрация при /start: новый пользователь пишется сразу,
+        для существующего обновление профиля откладывается в буфер.
+
+        Returns:
+            True если пользователь новый
+        """
+        async with self.pool.read() as db:
+            async with db.execute(
+                "SELECT 1 FROM users WHERE user_id = ?", (user_id,)
+            ) as cursor:
+                exists = await cursor.fetchone() is not None
+
+        if exists:
+            self.touch_user(user_id, username, full_name)
+            return False
+
+        now = datetime.utcnow().isoformat()
+        trial_until = (datetime.utcnow() + timedelta(days=3)).isoformat()
+        async with self.pool.write() as db:
+            # DO NOTHING: параллельный /start того же пользователя мог успеть раньше
+            cursor = await db.execute(
+                """
+                INSERT INTO users (user_id, username, full_name, created_at, last_active, trial_until)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO NOTHING
+                """,
+                (user_id, username, full_name, now, now, trial_until),
+            )
+            is_new = cursor.rowcount == 1
+            if is_new:
                 await db.execute(
+                    "INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,)
+                )
+
+        if not is_new:
+            self.touch_user(user_id, username, full_name)
+            return False
+
+        logger.info(f"Новый пользователь {user_id}: пробный период до {trial_until}")
+        self.access_cache.invalidate(user_id)
+        return True
+
+    def touch_user(
+        self,
+        user_id: int,
+        username: Optional[str] = None,
+        full_name: Optional[str] = None,
+    ):
+        """Отложить обновление username/full_name/last_active до следующего flush"""
+        self._pending_profiles[user_id] = (username, full_name, datetime.utcnow().isoformat())
+
+    async def flush_user_updates(self) -> int:
+        """Записать накопленные обновления профилей одной транзакцией
+
+        Returns:
+            Количество обновлённых пользователей
+        """
+        if not self._pending_profiles:
+            return 0
+
+        # Забираем буфер целиком: touch_user во время записи попадёт уже в новый
+        pending, self._pending_profiles = self._pending_profiles, {}
+        try:
+            async with self.pool.write() as db:
+                await db.executemany(
                     """
-                    INSERT INTO users (user_id, username, full_name, phone, created_at, last_active, trial_until)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    UPDATE users
+                    SET username = ?, full_name = ?, last_active = ?
+                    WHERE user_id = ?
                     """,
-                    (user_id, username, full_name, phone, now, now, trial_until),
-                )
-                # Создать настройки по умолчанию
-                await db.execute(
-                    "INSERT INTO user_settings (user_id) VALUES (?)", (user_id,)
+                    [
+                        (username, full_name, last_active, user_id)
+                        for user_id, (username, full_name, last_active) in pending.items()
+                    ],
                 )
-                logger.info(f"Новый пользователь {user_id}: пробный период до {trial_until}")
+        except Exception:
+            # Вернуть в буфер то, что не было перезаписано более свежими данными
+            for user_id, profile in pending.items():
+                self._pending_profiles.setdefault(user_id, profile)
+            raise
 
-            await db.commit()
-
-        return await self.get_user(user_id)
+        return len(pending)
 
     async def update_auth_status(
         self, user_id: int, session_type: str, authorized: bool
@@ -174,19 +231,17 @@ class DatabaseService:
             if session_type == "parser"
             else "is_blacklist_authorized"
         )
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 f"UPDATE users SET {column} = ? WHERE user_id = ?",
                 (1 if authorized else 0, user_id),
             )
-            await db.commit()
 
     # ===== Настройки =====
 
     async def get_settings(self, user_id: int) -> Optional[UserSettings]:
         """Получить настройки пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM user_settings WHERE user_id = ?", (user_id,)
             ) as cursor:
@@ -197,7 +252,7 @@ class DatabaseService:
 
     async def update_settings(self, settings: UserSettings):
         """Обновить настройки пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 """
                 UPDATE user_settings
@@ -209,13 +264,12 @@ class DatabaseService:
                     settings.user_id,
                 ),
             )
-            await db.commit()
 
     # ===== Задачи =====
 
     async def add_task(self, task: ActiveTask) -> int:
         """Добавить активную задачу"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             cursor = await db.execute(
                 """
                 INSERT INTO active_tasks (user_id, task_id, service, task_type, status, created_at)
@@ -230,13 +284,11 @@ class DatabaseService:
                     task.created_at.isoformat(),
                 ),
             )
-            await db.commit()
             return cursor.lastrowid
 
     async def get_user_tasks(self, user_id: int, service: Optional[str] = None) -> list[ActiveTask]:
         """Получить задачи пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             if service:
                 query = "SELECT * FROM active_tasks WHERE user_id = ? AND service = ? ORDER BY created_at DESC"
                 params = (user_id, service)
@@ -250,23 +302,31 @@ class DatabaseService:
 
     async def update_task_status(self, task_id: str, status: str):
         """Обновить статус задачи"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 "UPDATE active_tasks SET status = ? WHERE task_id = ?",
                 (status, task_id),
             )
-            await db.commit()
 
     async def delete_task(self, task_id: str):
         """Удалить задачу"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute("DELETE FROM active_tasks WHERE task_id = ?", (task_id,))
-            await db.commit()
+
+    async def delete_tasks(self, task_ids: list[str]) -> int:
+        """Удалить несколько задач одной транзакцией"""
+        if not task_ids:
+            return 0
+        async with self.pool.write() as db:
+            await db.executemany(
+                "DELETE FROM active_tasks WHERE task_id = ?",
+                [(task_id,) for task_id in task_ids],
+            )
+        return len(task_ids)
 
     async def get_all_running_tasks(self) -> list[ActiveTask]:
         """Получить все задачи со статусом running (для reconcile при старте)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM active_tasks WHERE status = 'running' ORDER BY created_at DESC"
             ) as cursor:
@@ -275,16 +335,15 @@ class DatabaseService:
 
     async def clear_running_tasks(self) -> int:
         """Удалить все задачи со статусом running (вызывается при shutdown)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             cursor = await db.execute("DELETE FROM active_tasks WHERE status = 'running'")
-            await db.commit()
             return cursor.rowcount
 
     # ===== Администраторы =====
 
     async def is_admin(self, user_id: int) -> bool:
         """Проверить является ли пользователь администратором (из БД)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT user_id FROM admins WHERE user_id = ?", (user_id,)
             ) as cursor:
@@ -292,8 +351,7 @@ class DatabaseService:
 
     async def get_admins(self) -> list[dict]:
         """Получить список администраторов из БД (с username из таблицы users)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 """SELECT a.*, u.username FROM admins a
                 LEFT JOIN users u ON a.user_id = u.user_id
@@ -305,18 +363,18 @@ class DatabaseService:
     async def add_admin(self, user_id: int, added_by: int):
         """Добавить администратора"""
         now = datetime.utcnow().isoformat()
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 "INSERT OR IGNORE INTO admins (user_id, added_by, created_at) VALUES (?, ?, ?)",
                 (user_id, added_by, now),
             )
-            await db.commit()
+        self.access_cache.invalidate(user_id)
 
     async def remove_admin(self, user_id: int):
         """Удалить администратора"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
-            await db.commit()
+        self.access_cache.invalidate(user_id)
 
     # ===== Глобальные настройки =====
 
@@ -329,7 +387,7 @@ class DatabaseService:
         Returns:
             Список чатов или пустой список
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT value FROM global_config WHERE key = ?", (key,)
             ) as cursor:
@@ -349,61 +407,101 @@ class DatabaseService:
             key: Ключ настройки ('pvz_monitoring_chats' или 'blacklist_chats')
             chats: Список чатов для сохранения
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             value_json = json.dumps(chats, ensure_ascii=False)
             await db.execute(
                 "INSERT OR REPLACE INTO global_config (key, value) VALUES (?, ?)",
                 (key, value_json),
             )
-            await db.commit()
             logger.info(f"Сохранены глобальные чаты для {key}: {len(chats)} чатов")
 
     # ===== Платежи =====
 
     async def log_payment(self, user_id: int, plan: str, amount: int, currency: str = "RUB"):
-        """Записать платёж"""
-        now = datetime.utcnow().isoformat()
-        async with aiosqlite.connect(self.db_path) as db:
+        """Записать платёж и обновить агрегаты доходов (в одной транзакции)"""
+        now = datetime.utcnow()
+        created_at = now.isoformat()
+        async with self.pool.write() as db:
             await db.execute(
                 "INSERT INTO payments (user_id, plan, amount, currency, created_at) VALUES (?, ?, ?, ?, ?)",
-                (user_id, plan, amount, currency, now),
+                (user_id, plan, amount, currency, created_at),
+            )
+            await db.executemany(
+                """
+                INSERT INTO revenue_rollup (period, bucket, plan, currency, amount, count)
+                VALUES (?, ?, ?, ?, ?, 1)
+                ON CONFLICT (period, bucket, plan, currency) DO UPDATE SET
+                    amount = amount + excluded.amount,
+                    count = count + 1
+                """,
+                [
+                    (period, bucket, plan, currency, amount)
+                    for period, bucket in _revenue_buckets(now)
+                ],
             )
-            await db.commit()
 
     async def get_revenue_stats(self) -> dict:
-        """Статистика доходов"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Всего
-            async with db.execute("SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM payments") as cur:
-                row = await cur.fetchone()
-                total_amount = row[0]
-                total_count = row[1]
-
-            # За текущий месяц
-            month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0).isoformat()
+        """Статистика доходов (из агрегатов revenue_rollup)"""
+        now = datetime.utcnow()
+        async with self.pool.read() as db:
             async with db.execute(
-                "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM payments WHERE created_at >= ?",
-                (month_start,),
-            ) as cur:
-                row = await cur.fetchone()
-                month_amount = row[0]
-                month_count = row[1]
-
-            # За сегодня
-            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0).isoformat()
+                """
+                SELECT period, COALESCE(SUM(amount), 0) AS amount, COALESCE(SUM(count), 0) AS count
+                FROM revenue_rollup
+                WHERE (period, bucket) IN (VALUES (?, ?), (?, ?), (?, ?))
+                GROUP BY period
+                """,
+                tuple(value for pair in _revenue_buckets(now) for value in pair),
+            ) as cursor:
+                totals = {row["period"]: (row["amount"], row["count"]) for row in await cursor.fetchall()}
+
+        today_amount, today_count = totals.get("day", (0, 0))
+        month_amount, month_count = totals.get("month", (0, 0))
+        total_amount, total_count = totals.get("all", (0, 0))
+        return {
+            "total_amount": total_amount,
+            "total_count": total_count,
+            "month_amount": month_amount,
+            "month_count": month_count,
+            "today_amount": today_amount,
+            "today_count": today_count,
+        }
+
+    async def get_revenue_breakdown(self, period: str = "day", limit: int = 30) -> list[dict]:
+        """Доходы по тарифам за последние периоды
+
+        Args:
+            period: 'day' или 'month'
+            limit: Сколько последних периодов вернуть
+
+        Returns:
+            Список {bucket, plan, currency, amount, count}, свежие периоды первыми
+        """
+        if period not in ("day", "month"):
+            raise ValueError(f"Неизвестный период: {period}")
+
+        async with self.pool.read() as db:
             async with db.execute(
-                "SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM payments WHERE created_at >= ?",
-                (today_start,),
-            ) as cur:
-                row = await cur.fetchone()
-                today_amount = row[0]
-                today_count = row[1]
-
-            return {
-                "total_amount": total_amount,
-                "total_count": total_count,
-                "month_amount": month_amount,
-                "month_count": month_count,
-                "today_amount": today_amount,
-                "today_count": today_count,
-            }
+                """
+                SELECT bucket, plan, currency, amount, count
+                FROM revenue_rollup
+                WHERE period = ? AND bucket IN (
+                    SELECT DISTINCT bucket FROM revenue_rollup
+                    WHERE period = ?
+                    ORDER BY bucket DESC
+                    LIMIT ?
+                )
+                ORDER BY bucket DESC, amount DESC
+                """,
+                (period, period, limit),
+            ) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+
+def _revenue_buckets(moment: datetime) -> list[tuple[str, str]]:
+    """Ключи (period, bucket) revenue_rollup, в которые попадает момент времени"""
+    return [
+        ("day", moment.strftime("%Y-%m-%d")),
+        ("month", moment.strftime("%Y-%m")),
+        ("all", "all"),
+    ]
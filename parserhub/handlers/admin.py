@@ -15,6 +15,7 @@ from loguru import logger
 from parserhub.config import config
 from parserhub.db_service import DatabaseService
 from parserhub.services.subscription_service import SubscriptionService
+from parserhub.services.broadcast import AUDIENCES, STOP_CALLBACK, BroadcastManager
 from parserhub.handlers.start import MAIN_MENU_FILTER
 
 
@@ -45,6 +46,10 @@ class AdminCB:
     PROXY_RESTART_CONFIRM = "admin_proxy_restart_confirm"
     REVOKE_SUB = "admin_revoke"
     SUBS_PAGE = "admin_subs_p_"  # + page number
+    BROADCAST = "admin_bcast"  # Рассылка
+    BROADCAST_AUDIENCE = "admin_bcast_a_"  # + audience
+    BROADCAST_CONFIRM = "admin_bcast_ok"
+    BROADCAST_STOP = STOP_CALLBACK  # + broadcast_id
     NOOP = "admin_noop"
     CLOSE = "admin_close"
 
@@ -66,13 +71,15 @@ class AdminState:
     CONFIRM_CLEAR_BL = 14
     INPUT_USER_FOR_REVOKE = 15
     CONFIRM_REVOKE = 16
+    INPUT_BROADCAST_TEXT = 17
+    CONFIRM_BROADCAST = 18
 
 
-async def _is_admin(user_id: int, db: DatabaseService) -> bool:
+async def _is_admin(user_id: int, service: SubscriptionService) -> bool:
     """Проверка: мастер-админ (из .env) или добавленный админ (из БД)"""
     if user_id == config.ADMIN_ID:
         return True
-    return await db.is_admin(user_id)
+    return (await service.resolve_access(user_id)).is_admin
 
 
 # ===== Главное меню админки =====
@@ -80,9 +87,9 @@ async def _is_admin(user_id: int, db: DatabaseService) -> bool:
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /admin"""
     user_id = update.effective_user.id
-    db: DatabaseService = context.bot_data["db"]
+    service: SubscriptionService = context.bot_data["subscription"]
 
-    if not await _is_admin(user_id, db):
+    if not await _is_admin(user_id, service):
         await update.message.reply_text("Нет доступа.")
         return
 
@@ -92,9 +99,9 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def admin_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Возврат в меню админки по кнопке"""
     user_id = update.effective_user.id
-    db: DatabaseService = context.bot_data["db"]
+    service: SubscriptionService = context.bot_data["subscription"]
 
-    if not await _is_admin(user_id, db):
+    if not await _is_admin(user_id, service):
         await update.callback_query.answer("Нет доступа.")
         return
 
@@ -113,6 +120,7 @@ async def _show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("📝 Чаты ПВЗ", callback_data=AdminCB.PVZ_CHATS)],
         [InlineKeyboardButton("📝 Чаты ЧС", callback_data=AdminCB.BLACKLIST_CHATS)],
         [InlineKeyboardButton("🌐 Настройки прокси", callback_data=AdminCB.PROXY_SETTINGS)],
+        [InlineKeyboardButton("📣 Рассылка", callback_data=AdminCB.BROADCAST)],
         [InlineKeyboardButton("✖ Закрыть", callback_data=AdminCB.CLOSE)],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -136,37 +144,29 @@ _SUBS_PAGE_SIZE = 20
 
 
 def _build_subs_page(
-    subs: list, trials: list, page: int
+    entries: list, counts: dict, page: int, has_next: bool
 ) -> tuple[str, InlineKeyboardMarkup]:
     """Построить одну страницу списка активных пользователей."""
-    # Объединяем: сначала платные, затем пробные
-    all_entries = [{**s, "type": "sub"} for s in subs] + \
-                  [{**t, "type": "trial"} for t in trials]
-
-    total = len(all_entries)
+    total = counts["subs"] + counts["trials"]
     total_pages = max(1, (total + _SUBS_PAGE_SIZE - 1) // _SUBS_PAGE_SIZE)
-    page = max(0, min(page, total_pages - 1))
 
     now = datetime.now(timezone.utc)
-    page_entries = all_entries[page * _SUBS_PAGE_SIZE: (page + 1) * _SUBS_PAGE_SIZE]
 
     header = (
         f"📋 <b>Все активные пользователи</b> ({total})\n"
-        f"💳 Платные: {len(subs)}   🎁 Пробный: {len(trials)}\n"
+        f"💳 Платные: {counts['subs']}   🎁 Пробный: {counts['trials']}\n"
     )
     lines = []
-    for e in page_entries:
+    for e in entries:
         name = e.get("username") or e.get("full_name") or "?"
+        until = datetime.fromisoformat(e["until"]).replace(tzinfo=timezone.utc)
+        remaining = until - now
         if e["type"] == "sub":
-            until = datetime.fromisoformat(e["active_until"]).replace(tzinfo=timezone.utc)
-            remaining = until - now
             lines.append(
                 f"• 💳 <code>{e['user_id']}</code> @{name} — "
                 f"{e['plan']} (ост. {remaining.days}д {remaining.seconds // 3600}ч)"
             )
         else:
-            until = datetime.fromisoformat(e["trial_until"]).replace(tzinfo=timezone.utc)
-            remaining = until - now
             lines.append(
                 f"• 🎁 <code>{e['user_id']}</code> @{name} "
                 f"(ост. {remaining.days}д {remaining.seconds // 3600}ч)"
@@ -182,27 +182,43 @@ def _build_subs_page(
     if page > 0:
         nav.append(InlineKeyboardButton("◀", callback_data=f"{AdminCB.SUBS_PAGE}{page - 1}"))
     nav.append(InlineKeyboardButton(f"{page + 1}/{total_pages}", callback_data=AdminCB.NOOP))
-    if page < total_pages - 1:
+    if has_next:
         nav.append(InlineKeyboardButton("▶", callback_data=f"{AdminCB.SUBS_PAGE}{page + 1}"))
 
     keyboard = []
-    if total_pages > 1:
+    if page > 0 or has_next:
         keyboard.append(nav)
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=AdminCB.MENU)])
 
     return text, InlineKeyboardMarkup(keyboard)
 
 
+async def _render_subs_page(context: ContextTypes.DEFAULT_TYPE, page: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Загрузить страницу N из БД по сохранённым курсорам.
+
+    В user_data["admin_subs_cursors"] лежат курсоры начала уже открытых страниц
+    (cursors[0] = None), поэтому переход ◀/▶ — один keyset-запрос на 20 строк.
+    """
+    service: SubscriptionService = context.bot_data["subscription"]
+    cursors = context.user_data.setdefault("admin_subs_cursors", [None])
+    page = max(0, min(page, len(cursors) - 1))
+
+    entries, next_cursor = await service.get_active_page(cursors[page], limit=_SUBS_PAGE_SIZE)
+    del cursors[page + 1:]
+    if next_cursor is not None:
+        cursors.append(next_cursor)
+
+    counts = await service.count_active()
+    return _build_subs_page(entries, counts, page, has_next=next_cursor is not None)
+
+
 async def show_subscriptions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Список всех активных подписок и пробных периодов (страница 0)"""
     query = update.callback_query
     await query.answer()
 
-    service: SubscriptionService = context.bot_data["subscription"]
-    subs = await service.get_all_active()
-    trials = await service.get_all_trial_active()
-
-    text, markup = _build_subs_page(subs, trials, page=0)
+    context.user_data["admin_subs_cursors"] = [None]
+    text, markup = await _render_subs_page(context, page=0)
     await query.edit_message_text(text=text, reply_markup=markup, parse_mode="HTML")
 
 
@@ -213,11 +229,7 @@ async def show_subscriptions_page(update: Update, context: ContextTypes.DEFAULT_
 
     page = int(query.data.replace(AdminCB.SUBS_PAGE, ""))
 
-    service: SubscriptionService = context.bot_data["subscription"]
-    subs = await service.get_all_active()
-    trials = await service.get_all_trial_active()
-
-    text, markup = _build_subs_page(subs, trials, page=page)
+    text, markup = await _render_subs_page(context, page=page)
     await query.edit_message_text(text=text, reply_markup=markup, parse_mode="HTML")
 
 
@@ -321,8 +333,9 @@ async def revoke_sub_receive_user(update: Update, context: ContextTypes.DEFAULT_
         await update.message.reply_text("Введите числовой Telegram ID.")
         return AdminState.INPUT_USER_FOR_REVOKE
 
-    db: DatabaseService = context.bot_data["db"]
-    if not await db.get_user(user_id):
+    service: SubscriptionService = context.bot_data["subscription"]
+    access = await service.resolve_access(user_id)
+    if not access.is_registered:
         await update.message.reply_text(
             f"❌ Пользователь <code>{user_id}</code> не найден в базе данных.",
             parse_mode="HTML",
@@ -331,21 +344,17 @@ async def revoke_sub_receive_user(update: Update, context: ContextTypes.DEFAULT_
 
     context.user_data["admin_revoke_user_id"] = user_id
 
-    service: SubscriptionService = context.bot_data["subscription"]
-    sub = await service.get_info(user_id)
-    trial = await service.get_trial_info(user_id)
-
     now = datetime.now(timezone.utc)
     status_lines = []
-    if sub:
-        until = datetime.fromisoformat(sub["active_until"]).replace(tzinfo=timezone.utc)
+    if access.active_until:
+        until = access.active_until.replace(tzinfo=timezone.utc)
         if until > now:
             remaining = until - now
-            status_lines.append(f"💳 Платная подписка: {sub['plan']} (ост. {remaining.days}д {remaining.seconds // 3600}ч)")
+            status_lines.append(f"💳 Платная подписка: {access.plan} (ост. {remaining.days}д {remaining.seconds // 3600}ч)")
         else:
             status_lines.append("💳 Платная подписка: истекла")
-    if trial and trial["is_active"]:
-        trial_until = datetime.fromisoformat(trial["trial_until"]).replace(tzinfo=timezone.utc)
+    if access.has_trial:
+        trial_until = access.trial_until.replace(tzinfo=timezone.utc)
         remaining = trial_until - now
         status_lines.append(f"🎁 Пробный период: ост. {remaining.days}д {remaining.seconds // 3600}ч")
 
@@ -415,17 +424,25 @@ async def show_revenue(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db: DatabaseService = context.bot_data["db"]
     stats = await db.get_revenue_stats()
     service: SubscriptionService = context.bot_data["subscription"]
-    subs = await service.get_all_active()
-    trials = await service.get_all_trial_active()
+    counts = await service.count_active()
+
+    current_month = datetime.utcnow().strftime("%Y-%m")
+    month_by_plan = await db.get_revenue_breakdown("month", limit=1)
+    plan_lines = "".join(
+        f"  • {row['plan']}: {row['amount'] / 100:.0f} {row['currency']} ({row['count']} оплат)\n"
+        for row in month_by_plan
+        if row["bucket"] == current_month
+    )
 
     text = (
         "💰 <b>Доходы</b>\n\n"
         f"<b>Сегодня:</b> {stats['today_amount'] / 100:.0f} RUB ({stats['today_count']} оплат)\n"
         f"<b>Этот месяц:</b> {stats['month_amount'] / 100:.0f} RUB ({stats['month_count']} оплат)\n"
+        f"{plan_lines}"
         f"<b>Всего:</b> {stats['total_amount'] / 100:.0f} RUB ({stats['total_count']} оплат)\n\n"
-        f"<b>Активных подписок:</b> {len(subs)}\n"
-        f"<b>На пробном периоде:</b> {len(trials)}\n"
-        f"<b>Итого пользователей:</b> {len(subs) + len(trials)}"
+        f"<b>Активных подписок:</b> {counts['subs']}\n"
+        f"<b>На пробном периоде:</b> {counts['trials']}\n"
+        f"<b>Итого пользователей:</b> {counts['subs'] + counts['trials']}"
     )
 
     keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=AdminCB.MENU)]]
@@ -550,6 +567,143 @@ async def add_admin_receive_user(update: Update, context: ContextTypes.DEFAULT_T
     return ConversationHandler.END
 
 
+# ===== Рассылка =====
+
+async def broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Начало: выбор аудитории рассылки"""
+    query = update.callback_query
+    await query.answer()
+
+    manager: BroadcastManager = context.bot_data["broadcasts"]
+    keyboard = []
+    for audience, label in AUDIENCES.items():
+        count = await manager.service.count_audience(audience)
+        keyboard.append([InlineKeyboardButton(
+            f"{label} ({count})", callback_data=f"{AdminCB.BROADCAST_AUDIENCE}{audience}"
+        )])
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="admin_conv_cancel")])
+
+    running = manager.running()
+    running_text = f"\n\n⏳ Сейчас идёт рассылок: {len(running)}" if running else ""
+    await query.edit_message_text(
+        f"📣 <b>Рассылка</b>\n\nВыберите получателей:{running_text}",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="HTML",
+    )
+    return AdminState.INPUT_BROADCAST_TEXT
+
+
+async def broadcast_select_audience(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Аудитория выбрана — запросить текст"""
+    query = update.callback_query
+    await query.answer()
+
+    audience = query.data.replace(AdminCB.BROADCAST_AUDIENCE, "")
+    if audience not in AUDIENCES:
+        return AdminState.INPUT_BROADCAST_TEXT
+    context.user_data["admin_broadcast_audience"] = audience
+
+    keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="admin_conv_cancel")]]
+    await query.edit_message_text(
+        f"📣 <b>Рассылка: {AUDIENCES[audience]}</b>\n\n"
+        "Отправьте текст сообщения. Форматирование (жирный, курсив, ссылки) сохранится.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="HTML",
+    )
+    return AdminState.INPUT_BROADCAST_TEXT
+
+
+async def broadcast_receive_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Получен текст — показать предпросмотр и запросить подтверждение"""
+    audience = context.user_data.get("admin_broadcast_audience")
+    if audience is None:
+        await update.message.reply_text("Сначала выберите получателей кнопкой выше.")
+        return AdminState.INPUT_BROADCAST_TEXT
+
+    text = update.message.text_html
+    context.user_data["admin_broadcast_text"] = text
+
+    manager: BroadcastManager = context.bot_data["broadcasts"]
+    count = await manager.service.count_audience(audience)
+
+    await update.message.reply_text(text, parse_mode="HTML")
+    keyboard = [
+        [InlineKeyboardButton("✅ Отправить", callback_data=AdminCB.BROADCAST_CONFIRM)],
+        [InlineKeyboardButton("❌ Отмена", callback_data="admin_conv_cancel")],
+    ]
+    await update.message.reply_text(
+        f"☝️ Так сообщение увидят получатели.\n\n"
+        f"<b>Аудитория:</b> {AUDIENCES[audience]}\n"
+        f"<b>Получателей:</b> {count}\n\n"
+        "Начать рассылку?",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="HTML",
+    )
+    return AdminState.CONFIRM_BROADCAST
+
+
+async def broadcast_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Подтверждение — зафиксировать получателей и запустить рассылку в фоне"""
+    query = update.callback_query
+    await query.answer()
+
+    audience = context.user_data.pop("admin_broadcast_audience", None)
+    text = context.user_data.pop("admin_broadcast_text", None)
+    if audience is None or text is None:
+        await query.edit_message_text(
+            "❌ Ошибка: текст рассылки утерян (возможно, бот перезапускался). "
+            "Начните заново через меню администратора."
+        )
+        return ConversationHandler.END
+
+    manager: BroadcastManager = context.bot_data["broadcasts"]
+    try:
+        broadcast = await manager.service.create(
+            created_by=update.effective_user.id,
+            audience=audience,
+            text=text,
+            report_chat_id=update.effective_chat.id,
+        )
+    except Exception as e:
+        logger.exception("Ошибка создания рассылки")
+        await query.edit_message_text(f"❌ Ошибка: {e}")
+        return ConversationHandler.END
+
+    if not broadcast["total"]:
+        await manager.service.finish(broadcast["id"], "done")
+        await query.edit_message_text("ℹ️ Получателей нет — рассылка не запущена.")
+        return ConversationHandler.END
+
+    manager.start(context.bot, broadcast)
+    logger.info(
+        f"Admin {update.effective_user.id} started broadcast #{broadcast['id']}: "
+        f"{audience}, {broadcast['total']} recipients"
+    )
+    await query.edit_message_text(
+        f"✅ Рассылка #{broadcast['id']} поставлена в очередь: {broadcast['total']} получателей.\n"
+        "Ход отправки — в следующем сообщении."
+    )
+    return ConversationHandler.END
+
+
+async def broadcast_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка ⏹ под сообщением о ходе рассылки"""
+    query = update.callback_query
+    service: SubscriptionService = context.bot_data["subscription"]
+    if not await _is_admin(update.effective_user.id, service):
+        await query.answer("Нет доступа.")
+        return
+
+    broadcast_id = int(query.data.replace(AdminCB.BROADCAST_STOP, ""))
+    manager: BroadcastManager = context.bot_data["broadcasts"]
+    if await manager.cancel(broadcast_id):
+        await query.answer("Рассылка остановлена")
+        logger.info(f"Admin {update.effective_user.id} stopped broadcast #{broadcast_id}")
+    else:
+        await query.answer("Рассылка уже завершена")
+        await query.edit_message_reply_markup(reply_markup=None)
+
+
 # ===== Закрыть / Отмена =====
 
 async def close_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -768,6 +922,8 @@ async def bl_chats_clear_execute(update: Update, context: ContextTypes.DEFAULT_T
 
     db: DatabaseService = context.bot_data["db"]
     await db.set_global_chats('blacklist_chats', [])
+    # Результаты прежних проверок получены по другому набору чатов
+    await context.bot_data["blacklist_cache"].clear()
 
     # Синхронизируем очистку с workers_service
     from parserhub.api_client import WorkersAPI
@@ -801,6 +957,8 @@ async def receive_blacklist_chats(update: Update, context: ContextTypes.DEFAULT_
 
     db: DatabaseService = context.bot_data["db"]
     await db.set_global_chats('blacklist_chats', normalized_chats)
+    # Результаты прежних проверок получены по другому набору чатов
+    await context.bot_data["blacklist_cache"].clear()
 
     # Синхронизируем с workers_service
     # Парсим "@chat/topic_id" → отдельные поля для корректного хранения в БД
@@ -1165,6 +1323,7 @@ async def receive_new_price(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 def _build_chats_conv(
+    name: str,
     entry_cb: str,
     entry_handler,
     menu_state: int,
@@ -1200,6 +1359,8 @@ def _build_chats_conv(
             CommandHandler("start", cancel_admin_conv),
             MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
         ],
+        name=name,
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
@@ -1251,6 +1412,8 @@ def register_admin_handlers(app):
             CommandHandler("start", cancel_admin_conv),
             MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
         ],
+        name="admin_grant",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
@@ -1274,6 +1437,8 @@ def register_admin_handlers(app):
             CommandHandler("start", cancel_admin_conv),
             MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
         ],
+        name="admin_revoke",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
@@ -1294,6 +1459,8 @@ def register_admin_handlers(app):
             CommandHandler("start", cancel_admin_conv),
             MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
         ],
+        name="admin_add_admin",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
@@ -1301,6 +1468,7 @@ def register_admin_handlers(app):
 
     # ConversationHandler: управление чатами ПВЗ
     app.add_handler(_build_chats_conv(
+        name="admin_pvz_chats",
         entry_cb=AdminCB.PVZ_CHATS,
         entry_handler=manage_pvz_chats,
         menu_state=AdminState.PVZ_CHATS_MENU,
@@ -1317,6 +1485,7 @@ def register_admin_handlers(app):
 
     # ConversationHandler: управление чатами ЧС
     app.add_handler(_build_chats_conv(
+        name="admin_blacklist_chats",
         entry_cb=AdminCB.BLACKLIST_CHATS,
         entry_handler=manage_blacklist_chats,
         menu_state=AdminState.BL_CHATS_MENU,
@@ -1362,6 +1531,8 @@ def register_admin_handlers(app):
             CommandHandler("start", cancel_admin_conv),
             MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
         ],
+        name="admin_proxy",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
@@ -1382,7 +1553,36 @@ def register_admin_handlers(app):
             CommandHandler("start", cancel_admin_conv),
             MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
         ],
+        name="admin_edit_price",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
     app.add_handler(edit_price_conv)
+
+    # ConversationHandler: рассылка
+    broadcast_conv = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(broadcast_start, pattern=f"^{AdminCB.BROADCAST}$")
+        ],
+        states={
+            AdminState.INPUT_BROADCAST_TEXT: [
+                CallbackQueryHandler(broadcast_select_audience, pattern=f"^{AdminCB.BROADCAST_AUDIENCE}"),
+                MessageHandler(filters.TEXT & ~filters.COMMAND & ~MAIN_MENU_FILTER, broadcast_receive_text),
+            ],
+            AdminState.CONFIRM_BROADCAST: [
+                CallbackQueryHandler(broadcast_confirm, pattern=f"^{AdminCB.BROADCAST_CONFIRM}$")
+            ],
+        },
+        fallbacks=[
+            CallbackQueryHandler(cancel_admin_conv, pattern="^admin_conv_cancel$|^admin_menu$"),
+            CommandHandler("start", cancel_admin_conv),
+            MessageHandler(MAIN_MENU_FILTER, cancel_admin_conv),
+        ],
+        name="admin_broadcast",
+        persistent=True,
+        conversation_timeout=300,
+        allow_reentry=True,
+    )
+    app.add_handler(broadcast_conv)
+    app.add_handler(CallbackQueryHandler(broadcast_stop, pattern=f"^{AdminCB.BROADCAST_STOP}\\d+$"))
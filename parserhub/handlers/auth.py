@@ -337,7 +337,8 @@ def register_auth_handlers(app):
         CallbackQueryHandler(show_account_menu, pattern=f"^{AuthCB.ACCOUNT_MENU}$|^account$")
     )
 
-    # ConversationHandler для авторизации
+    # ConversationHandler для авторизации. Не персистентный: ожидание кода держит
+    # Pyrogram-клиент в памяти SessionManager, после рестарта авторизацию всё равно начинать заново
     auth_conv = ConversationHandler(
         entry_points=[
             CallbackQueryHandler(start_auth, pattern=f"^{AuthCB.AUTH_PARSER}$"),
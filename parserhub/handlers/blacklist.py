@@ -1,6 +1,9 @@
 """Обработчики черного списка"""
-import asyncio
 import html as html_module
+import time
+from contextlib import aclosing
+from datetime import datetime
+from typing import Awaitable, Callable
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, Bot
 from telegram.ext import (
     ContextTypes,
@@ -10,17 +13,33 @@ from telegram.ext import (
     ConversationHandler,
     filters,
 )
+from telegram.error import TelegramError
 from httpx import HTTPStatusError
 from loguru import logger
 
 from parserhub.db_service import DatabaseService
-from parserhub.api_client import WorkersAPI
+from parserhub.api_client import BlacklistJobError, WorkersAPI
+from parserhub.rate_limiter import Priority
+from parserhub.services.blacklist_bulk import ParsedList, build_report, decode_upload, parse_candidates
+from parserhub.services.blacklist_cache import BlacklistCache, blacklist_cache_key
+from parserhub.services.blacklist_index import BlacklistIndex
+from parserhub.services.blacklist_scheduler import BlacklistJob, BlacklistScheduler
+from parserhub.singleflight import SingleFlight
 from parserhub.validators import Validators
 from parserhub.handlers.start import cancel_and_return_to_menu, MAIN_MENU_FILTER, MenuButton
 
 
 _TG_LIMIT = 4096       # Лимит Telegram на одно сообщение
 _CHUNK_SIZE = 3800     # Размер куска текста с запасом на label и HTML-теги
+_PROGRESS_EDIT_INTERVAL = 3.0  # Не чаще одного редактирования сообщения о ходе поиска (сек)
+_BULK_LIMIT = 200                # Максимум кандидатов в одном файле массовой проверки
+_BULK_MAX_FILE_SIZE = 1024 * 1024
+
+_STAGE_LABELS = {
+    "username": "по никнейму",
+    "user_id": "по User ID",
+    "fio": "по ФИО",
+}
 
 
 def _split_text(text: str, chunk_size: int = _CHUNK_SIZE) -> list[str]:
@@ -49,6 +68,7 @@ class BlacklistState:
     WAITING_FIO = 4
     WAITING_ADD_CHAT = 2
     WAITING_SELECT_TOPIC = 3
+    WAITING_BULK_FILE = 5
 
 
 # Callback data
@@ -66,6 +86,8 @@ class BlacklistBtn:
     CHECK = "🔍 Проверить пользователя"
     SKIP_FIO = "⏩ Пропустить"
     FIO_ONLY = "👤 Только по ФИО"
+    CANCEL_SEARCH = "⏹ Отменить поиск"
+    BULK = "📄 Массовая проверка"
 
 
 async def show_blacklist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -100,6 +122,7 @@ async def show_blacklist_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     keyboard = ReplyKeyboardMarkup([
         [KeyboardButton(BlacklistBtn.CHECK)],
+        [KeyboardButton(BlacklistBtn.BULK)],
         [KeyboardButton(MenuButton.BACK)],
     ], resize_keyboard=True)
 
@@ -140,6 +163,215 @@ async def start_check_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     return BlacklistState.WAITING_USERNAME
 
 
+class _ProgressMessage:
+    """Одно сообщение о ходе поиска, которое редактируется на месте.
+
+    Промежуточные обновления чаще min_interval пропускаются — Telegram ограничивает
+    частоту редактирования, а пользователю достаточно свежей картины раз в несколько секунд.
+    """
+
+    def __init__(self, bot: Bot, chat_id: int, min_interval: float = _PROGRESS_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id: int | None = None
+        self.finished = False
+        self._text: str | None = None
+        self._last_edit = 0.0
+
+    async def update(self, text: str, force: bool = False):
+        if self.finished or text == self._text:
+            return
+        now = time.monotonic()
+        if self.message_id is not None and not force and now - self._last_edit < self.min_interval:
+            return
+
+        try:
+            if self.message_id is None:
+                message = await self.bot.send_message(
+                    chat_id=self.chat_id, text=text, parse_mode="HTML", rate_limit_args=Priority.BACKGROUND
+                )
+                self.message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(
+                    chat_id=self.chat_id, message_id=self.message_id, text=text, parse_mode="HTML",
+                    rate_limit_args=Priority.BACKGROUND,
+                )
+        except TelegramError as e:
+            logger.debug(f"Не удалось обновить сообщение о ходе поиска: {e}")
+            return
+
+        self._text = text
+        self._last_edit = now
+
+    async def finish(self, text: str):
+        """Финальный текст (только если сообщение о ходе поиска уже отправлено)"""
+        if self.message_id is not None and not self.finished:
+            await self.update(text, force=True)
+        self.finished = True
+
+
+def _format_progress(event: dict) -> str:
+    stage = _STAGE_LABELS.get(event.get("stage"), event.get("stage") or "—")
+    chats_total = event.get("chats_total")
+    chats = f"{event.get('chats_checked', 0)}/{chats_total}" if chats_total else f"{event.get('chats_checked', 0)}"
+    return (
+        "🔍 <b>Идёт поиск в чёрном списке</b>\n\n"
+        f"<b>Этап:</b> {stage}\n"
+        f"<b>Чатов проверено:</b> {chats}\n"
+        f"<b>Сообщений проверено:</b> {event.get('messages_checked', 0)}"
+    )
+
+
+async def _run_search_with_progress(
+    workers_api: WorkersAPI,
+    progress: _ProgressMessage,
+    username: str | None,
+    blacklist_session_path: str,
+    fio: str | None,
+) -> dict:
+    """Поиск в ЧС с обновлением прогресса; первое совпадение возвращается сразу,
+    не дожидаясь окончания остальных ступеней"""
+    job_id = await workers_api.submit_blacklist_check(username, blacklist_session_path, fio=fio)
+    if job_id is None:
+        # Сервис без job API — синхронный запрос без прогресса
+        return await workers_api.check_blacklist(username, blacklist_session_path, fio=fio)
+
+    # aclosing: при раннем совпадении поток событий закрывается сразу, а не при сборке мусора
+    async with aclosing(workers_api.iter_blacklist_job(job_id)) as events:
+        async for event in events:
+            kind = event.get("type")
+            if kind == "progress":
+                await progress.update(_format_progress(event))
+            elif kind in ("hit", "done"):
+                return event.get("result") or {}
+            elif kind == "failed":
+                raise BlacklistJobError(event.get("error") or "Задание завершилось ошибкой")
+
+    raise BlacklistJobError(f"Задание {job_id} завершилось без результата")
+
+
+async def _send_search_result(
+    bot: Bot,
+    chat_id: int,
+    result: dict,
+    username: str | None,
+    fio: str | None,
+):
+    """Отправить результат поиска в ЧС (свежий или из кэша)"""
+    if result["found"]:
+        info = result.get("extracted_info", {})
+        username_info = info.get("username", "—")
+        phone = info.get("phone", "—")
+        found_user_id = info.get("user_id", "—")
+        raw_text = result.get("message_text", "") or ""
+
+        match_type = result.get("match_type", "")
+        match_labels = {
+            "username": "по никнейму",
+            "user_id": "по User ID (ник был сменён)",
+            "fio": "по ФИО",
+        }
+        match_label = match_labels.get(match_type, "")
+
+        header = (
+            f"⚠️ <b>Пользователь найден в черном списке!</b>\n"
+            f"<i>Найден {match_label}</i>\n\n"
+            f"<b>Username:</b> {username_info}\n"
+            f"<b>Телефон:</b> {phone}\n"
+            f"<b>User ID:</b> {found_user_id}"
+        )
+
+        # Проверяем реальную длину финального сообщения (с HTML-тегами и экранированием)
+        safe_text = html_module.escape(raw_text)
+        single_msg = header + (f"\n\n<b>Текст записи:</b>\n<i>{safe_text}</i>" if safe_text else "")
+        # Темп отправки кусков задаёт лимитер исходящих (rate_limiter) — не больше ~1 сообщения/сек в чат
+        if len(single_msg) <= _TG_LIMIT:
+            await bot.send_message(
+                chat_id=chat_id, text=single_msg, parse_mode="HTML", rate_limit_args=Priority.BACKGROUND
+            )
+        else:
+            await bot.send_message(
+                chat_id=chat_id, text=header, parse_mode="HTML", rate_limit_args=Priority.BACKGROUND
+            )
+            if safe_text:
+                chunks = _split_text(safe_text)
+                total = len(chunks)
+                for i, chunk in enumerate(chunks):
+                    label = f"<b>Текст записи [{i + 1}/{total}]:</b>\n" if total > 1 else "<b>Текст записи:</b>\n"
+                    await bot.send_message(
+                        chat_id=chat_id, text=label + chunk, parse_mode="HTML",
+                        rate_limit_args=Priority.BACKGROUND,
+                    )
+    else:
+        steps = result.get("steps_done", [])
+        steps_text = ", ".join(steps) if steps else "—"
+        if username:
+            identity_line = f"<b>Username:</b> {username}\n"
+        else:
+            identity_line = f"<b>ФИО:</b> {fio}\n" if fio else ""
+        text = (
+            "✅ <b>Пользователь НЕ найден в черном списке</b>\n\n"
+            f"{identity_line}"
+            f"<b>Проверено:</b> {steps_text}\n"
+            f"<b>Сообщений проверено:</b> {result.get('messages_checked', 0)}\n"
+            f"<b>Чатов проверено:</b> {len(result.get('chats_checked', []))}"
+        )
+        await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML", rate_limit_args=Priority.BACKGROUND)
+
+
+def _similar_records_text(candidates: list[dict]) -> str:
+    """Похожие ФИО из локального индекса — подсказка, не совпадение"""
+    lines = []
+    for i, candidate in enumerate(candidates, 1):
+        name = html_module.escape(candidate.get("full_name") or "—")
+        if candidate.get("message_link"):
+            name = f'<a href="{html_module.escape(candidate["message_link"])}">{name}</a>'
+        lines.append(f"{i}. {name} — {candidate['score']:.0%}")
+    return (
+        "🔎 <b>В локальном индексе есть похожие записи</b>\n"
+        "<i>Точного совпадения нет — поиск по чатам продолжается.</i>\n\n"
+        + "\n".join(lines)
+    )
+
+
+async def _shared_search(
+    bot: Bot,
+    chat_id: int,
+    flights: SingleFlight,
+    key: str,
+    run_search: Callable[[], Awaitable[dict]],
+) -> dict:
+    """Присоединиться к уже идущему поиску с тем же ключом или запустить свой.
+
+    Поиск ведётся сессией того, кто его запустил. Если у присоединившегося она
+    завершилась ошибкой (например, сессия аннулирована), повторяем поиск своей сессией —
+    чужая ошибка авторизации не должна сбрасывать авторизацию этого пользователя.
+    """
+    joined = flights.in_flight(key) or await flights.in_flight_elsewhere(key)
+    if joined:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=(
+                "👥 <b>Этот пользователь уже проверяется по другому запросу</b>\n\n"
+                "⏳ <i>Результат придёт, как только проверка завершится.</i>"
+            ),
+            parse_mode="HTML",
+        )
+
+    try:
+        result = await flights.do(key, run_search)
+    except Exception:
+        if not joined:
+            raise
+        logger.info(f"Общий поиск в ЧС завершился ошибкой, повторяем своей сессией: {key}")
+        return await run_search()
+
+    if joined and result.get("error"):
+        return await run_search()
+    return result
+
+
 async def _blacklist_search_task(
     bot: Bot,
     chat_id: int,
@@ -151,10 +383,24 @@ async def _blacklist_search_task(
     db: DatabaseService,
     blacklist_session_path: str,
     bot_data: dict,
+    cache: BlacklistCache | None = None,
 ):
     """Фоновая задача поиска в ЧС — выполняется без блокировки бота"""
+    progress = _ProgressMessage(bot, chat_id)
     try:
-        result = await workers_api.check_blacklist(normalized_username, blacklist_session_path, fio=fio)
+        def run_search():
+            return _run_search_with_progress(
+                workers_api, progress, normalized_username, blacklist_session_path, fio
+            )
+
+        flights: SingleFlight | None = bot_data.get("blacklist_flights")
+        if flights is None:
+            result = await run_search()
+        else:
+            result = await _shared_search(
+                bot, chat_id, flights, blacklist_cache_key(username=normalized_username, fio=fio), run_search
+            )
+        await progress.finish("🏁 <b>Поиск завершён</b>")
 
         # Проверяем ошибку авторизации в теле ответа
         if not result.get("found") and result.get("error"):
@@ -173,59 +419,10 @@ async def _blacklist_search_task(
                 )
                 return
 
-        if result["found"]:
-            info = result.get("extracted_info", {})
-            username_info = info.get("username", "—")
-            phone = info.get("phone", "—")
-            found_user_id = info.get("user_id", "—")
-            raw_text = result.get("message_text", "") or ""
-
-            match_type = result.get("match_type", "")
-            match_labels = {
-                "username": "по никнейму",
-                "user_id": "по User ID (ник был сменён)",
-                "fio": "по ФИО",
-            }
-            match_label = match_labels.get(match_type, "")
-
-            header = (
-                f"⚠️ <b>Пользователь найден в черном списке!</b>\n"
-                f"<i>Найден {match_label}</i>\n\n"
-                f"<b>Username:</b> {username_info}\n"
-                f"<b>Телефон:</b> {phone}\n"
-                f"<b>User ID:</b> {found_user_id}"
-            )
+        if cache is not None and not result.get("error"):
+            await cache.put(blacklist_cache_key(username=normalized_username, fio=fio), result)
 
-            # Проверяем реальную длину финального сообщения (с HTML-тегами и экранированием)
-            safe_text = html_module.escape(raw_text)
-            single_msg = header + (f"\n\n<b>Текст записи:</b>\n<i>{safe_text}</i>" if safe_text else "")
-            if len(single_msg) <= _TG_LIMIT:
-                await bot.send_message(chat_id=chat_id, text=single_msg, parse_mode="HTML")
-            else:
-                await bot.send_message(chat_id=chat_id, text=header, parse_mode="HTML")
-                if safe_text:
-                    chunks = _split_text(safe_text)
-                    total = len(chunks)
-                    for i, chunk in enumerate(chunks):
-                        label = f"<b>Текст записи [{i + 1}/{total}]:</b>\n" if total > 1 else "<b>Текст записи:</b>\n"
-                        await bot.send_message(chat_id=chat_id, text=label + chunk, parse_mode="HTML")
-                        if i < total - 1:
-                            await asyncio.sleep(0.3)
-        else:
-            steps = result.get("steps_done", [])
-            steps_text = ", ".join(steps) if steps else "—"
-            if username:
-                identity_line = f"<b>Username:</b> {username}\n"
-            else:
-                identity_line = f"<b>ФИО:</b> {fio}\n" if fio else ""
-            text = (
-                "✅ <b>Пользователь НЕ найден в черном списке</b>\n\n"
-                f"{identity_line}"
-                f"<b>Проверено:</b> {steps_text}\n"
-                f"<b>Сообщений проверено:</b> {result.get('messages_checked', 0)}\n"
-                f"<b>Чатов проверено:</b> {len(result.get('chats_checked', []))}"
-            )
-            await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+        await _send_search_result(bot, chat_id, result, username, fio)
 
     except HTTPStatusError as e:
         detail = e.response.json().get("detail", "").lower()
@@ -245,7 +442,11 @@ async def _blacklist_search_task(
             await bot.send_message(chat_id=chat_id, text=f"❌ Ошибка проверки:\n\n{str(e)}")
     except Exception as e:
         logger.exception(f"Ошибка фонового поиска в ЧС для user {user_id}")
-        is_auth_error = any(kw in str(e).lower() for kw in ["authkeyinvalid", "unauthorized"])
+        # BlacklistJobError несёт текст ошибки сервиса (например AUTH_KEY_UNREGISTERED)
+        is_auth_error = any(
+            kw in str(e).lower()
+            for kw in ["authkeyinvalid", "unauthorized", "auth_key_unregistered", "auth_key_invalid"]
+        )
         if is_auth_error:
             await db.update_auth_status(user_id, "blacklist", False)
             await bot.send_message(
@@ -260,7 +461,7 @@ async def _blacklist_search_task(
         else:
             await bot.send_message(chat_id=chat_id, text=f"❌ Ошибка проверки:\n\n{str(e)}")
     finally:
-        bot_data.get("blacklist_searching", set()).discard(user_id)
+        await progress.finish("⏹ <b>Поиск прерван</b>")
 
 
 async def receive_username(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -361,25 +562,29 @@ async def receive_fio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
     workers_api: WorkersAPI = context.bot_data["workers_api"]
     db: DatabaseService = context.bot_data["db"]
+    cache: BlacklistCache | None = context.bot_data.get("blacklist_cache")
     blacklist_session_path = f"/app/sessions/{user_id}_blacklist"
 
-    # Проверяем, не идёт ли уже поиск для этого пользователя
-    searching: set = context.bot_data.setdefault("blacklist_searching", set())
-    if user_id in searching:
+    # Для API: пустая строка → None
+    api_username = normalized_username or None
+
+    # Тот же запрос уже проверялся или запись есть в локальном индексе — отвечаем сразу,
+    # без сканирования чатов
+    cached = await cache.get(blacklist_cache_key(username=api_username, fio=fio)) if cache else None
+    if cached:
         await update.message.reply_text(
-            "⏳ <b>Проверка уже выполняется</b>\n\n"
-            "Одновременно по чёрному списку может проверяться только один пользователь.\n"
-            "Пожалуйста, подождите завершения поиска и введите запрос повторно.",
-            parse_mode="HTML",
+            f"📦 Результат из кэша (проверка от {cached.cached_at:%d.%m.%Y %H:%M} UTC)",
+            reply_markup=_search_keyboard(),
         )
+        await _send_search_result(context.bot, chat_id, cached.result, api_username, fio)
         return ConversationHandler.END
 
-    searching.add(user_id)
-
-    back_keyboard = ReplyKeyboardMarkup([
-        [KeyboardButton(BlacklistBtn.CHECK)],
-        [KeyboardButton(MenuButton.BACK)],
-    ], resize_keyboard=True)
+    index: BlacklistIndex | None = context.bot_data.get("blacklist_index")
+    hit = await index.lookup(username=api_username, fio=fio) if index else None
+    if hit and hit["found"]:
+        await update.message.reply_text("⚡ Найдено в локальном индексе ЧС", reply_markup=_search_keyboard())
+        await _send_search_result(context.bot, chat_id, hit, api_username, fio)
+        return ConversationHandler.END
 
     # Формируем сообщение о запуске в зависимости от режима
     if fio_only:
@@ -388,33 +593,232 @@ async def receive_fio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         fio_line = f"\n<b>ФИО:</b> {fio}" if fio else ""
         search_info = f"<b>Никнейм:</b> {normalized_username}{fio_line}"
 
+    scheduler: BlacklistScheduler = context.bot_data["blacklist_scheduler"]
+    job = scheduler.submit(user_id, lambda: _blacklist_search_task(
+        bot=context.bot,
+        chat_id=chat_id,
+        user_id=user_id,
+        username=api_username,
+        normalized_username=api_username,
+        fio=fio,
+        workers_api=workers_api,
+        db=db,
+        blacklist_session_path=blacklist_session_path,
+        bot_data=context.bot_data,
+        cache=cache,
+    ))
+    if job is None:
+        await update.message.reply_text(
+            "⏳ <b>Очередь ваших проверок заполнена</b>\n\n"
+            f"Одновременно можно поставить в очередь не больше {scheduler.user_queue} запросов.\n"
+            "Пожалуйста, дождитесь результатов и введите запрос повторно.",
+            reply_markup=_search_keyboard(),
+            parse_mode="HTML",
+        )
+        return ConversationHandler.END
+
     await update.message.reply_text(
-        f"🔍 Поиск запущен:\n"
+        f"{_queue_status(scheduler, job)}\n"
         f"{search_info}\n\n"
         "⏳ <i>Результат придёт автоматически — можете пользоваться ботом.</i>",
-        reply_markup=back_keyboard,
+        reply_markup=_search_keyboard(),
         parse_mode="HTML",
     )
+    if hit and hit.get("candidates"):
+        await update.message.reply_text(
+            _similar_records_text(hit["candidates"]), parse_mode="HTML", disable_web_page_preview=True
+        )
 
-    # Для API: пустая строка → None
-    api_username = normalized_username or None
+    return ConversationHandler.END
+
+
+def _search_keyboard() -> ReplyKeyboardMarkup:
+    """Клавиатура после запуска поиска — с кнопкой отмены"""
+    return ReplyKeyboardMarkup([
+        [KeyboardButton(BlacklistBtn.CHECK)],
+        [KeyboardButton(BlacklistBtn.CANCEL_SEARCH)],
+        [KeyboardButton(MenuButton.BACK)],
+    ], resize_keyboard=True)
+
+
+def _queue_status(scheduler: BlacklistScheduler, job: BlacklistJob) -> str:
+    position = scheduler.position(job)
+    if position == 0:
+        return "🔍 Поиск запущен:"
+    return f"🕐 Поиск поставлен в очередь (позиция {position}):"
+
+
+async def cancel_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отменить выполняющийся и ожидающие поиски пользователя"""
+    scheduler: BlacklistScheduler = context.bot_data["blacklist_scheduler"]
+    cancelled = scheduler.cancel(update.effective_user.id)
+    text = f"⏹ Отменено поисков: {cancelled}" if cancelled else "Нет активных поисков"
+    await update.message.reply_text(text)
+    await show_blacklist_menu(update, context)
+
+
+# ===== Массовая проверка =====
+
+async def start_bulk_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Начало массовой проверки — ждём файл со списком кандидатов"""
+    keyboard = ReplyKeyboardMarkup([
+        [KeyboardButton(MenuButton.CANCEL)],
+    ], resize_keyboard=True)
 
-    asyncio.create_task(_blacklist_search_task(
+    await update.message.reply_text(
+        "📄 <b>Массовая проверка в чёрном списке</b>\n\n"
+        "Отправьте файл <b>.csv</b> или <b>.txt</b> — по одному кандидату на строку:\n"
+        "<code>@username;Иванов Иван Иванович</code>\n"
+        "<code>@username</code>\n"
+        "<code>Петров Пётр</code>\n\n"
+        f"Не больше {_BULK_LIMIT} кандидатов. Дубликаты отбрасываются.\n\n"
+        "⏳ <i>Весь список проверяется за один проход по чатам — результат придёт файлом.</i>",
+        reply_markup=keyboard,
+        parse_mode="HTML",
+    )
+    return BlacklistState.WAITING_BULK_FILE
+
+
+async def receive_bulk_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Получен файл — разбираем, валидируем и ставим одну пакетную проверку в очередь"""
+    document = update.message.document
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+
+    if not (document.file_name or "").lower().endswith((".csv", ".txt")):
+        await update.message.reply_text("❌ Поддерживаются только файлы .csv и .txt")
+        return BlacklistState.WAITING_BULK_FILE
+    if document.file_size and document.file_size > _BULK_MAX_FILE_SIZE:
+        await update.message.reply_text("❌ Файл слишком большой (максимум 1 МБ)")
+        return BlacklistState.WAITING_BULK_FILE
+
+    file = await document.get_file()
+    parsed = parse_candidates(decode_upload(bytes(await file.download_as_bytearray())), _BULK_LIMIT)
+
+    if not parsed.candidates:
+        errors = "\n".join(
+            f"• строка {line.line_no}: {html_module.escape(line.error)}" for line in parsed.invalid[:5]
+        )
+        await update.message.reply_text(
+            "❌ В файле нет ни одного корректного кандидата.\n\n" + (errors or "Файл пуст."),
+            parse_mode="HTML",
+        )
+        return BlacklistState.WAITING_BULK_FILE
+
+    workers_api: WorkersAPI = context.bot_data["workers_api"]
+    cache: BlacklistCache | None = context.bot_data.get("blacklist_cache")
+    scheduler: BlacklistScheduler = context.bot_data["blacklist_scheduler"]
+
+    job = scheduler.submit(user_id, lambda: _bulk_search_task(
         bot=context.bot,
         chat_id=chat_id,
         user_id=user_id,
-        username=api_username,
-        normalized_username=api_username,
-        fio=fio,
+        parsed=parsed,
         workers_api=workers_api,
-        db=db,
-        blacklist_session_path=blacklist_session_path,
-        bot_data=context.bot_data,
+        blacklist_session_path=f"/app/sessions/{user_id}_blacklist",
+        cache=cache,
+        index=context.bot_data.get("blacklist_index"),
     ))
+    if job is None:
+        await update.message.reply_text(
+            "⏳ <b>Очередь ваших проверок заполнена</b>\n\n"
+            "Пожалуйста, дождитесь результатов и отправьте файл повторно.",
+            reply_markup=_search_keyboard(),
+            parse_mode="HTML",
+        )
+        return ConversationHandler.END
 
+    await update.message.reply_text(
+        f"{_queue_status(scheduler, job)}\n"
+        f"<b>Кандидатов:</b> {len(parsed.candidates)}\n"
+        f"<b>Дубликатов отброшено:</b> {parsed.duplicates}\n"
+        f"<b>Строк с ошибками:</b> {len(parsed.invalid)}\n\n"
+        "⏳ <i>Отчёт придёт файлом — можете пользоваться ботом.</i>",
+        reply_markup=_search_keyboard(),
+        parse_mode="HTML",
+    )
     return ConversationHandler.END
 
 
+async def bulk_file_expected(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """В режиме массовой проверки прислали текст вместо файла"""
+    await update.message.reply_text("📎 Отправьте список кандидатов файлом .csv или .txt")
+    return BlacklistState.WAITING_BULK_FILE
+
+
+async def _bulk_search_task(
+    bot: Bot,
+    chat_id: int,
+    user_id: int,
+    parsed: ParsedList,
+    workers_api: WorkersAPI,
+    blacklist_session_path: str,
+    cache: BlacklistCache | None = None,
+    index: BlacklistIndex | None = None,
+):
+    """Фоновая массовая проверка: кэш и локальный индекс → одна пакетная проверка остальных → файл-отчёт"""
+    try:
+        results: dict[str, dict] = {}
+        if cache is not None:
+            for candidate in parsed.candidates:
+                cached = await cache.get(candidate.key)
+                if cached:
+                    results[candidate.key] = cached.result
+
+        # Похожие ФИО из индекса — не находка: кандидат уходит в пакетную проверку,
+        # а похожие записи попадают в отчёт рядом с её результатом
+        similar: dict[str, list[dict]] = {}
+        if index is not None:
+            for candidate in parsed.candidates:
+                if candidate.key not in results:
+                    hit = await index.lookup(username=candidate.username, fio=candidate.fio)
+                    if hit and hit["found"]:
+                        results[candidate.key] = hit
+                    elif hit:
+                        similar[candidate.key] = hit["candidates"]
+
+        misses = [c for c in parsed.candidates if c.key not in results]
+        if misses:
+            fresh = await workers_api.run_blacklist_batch(
+                [c.as_dict() for c in misses], blacklist_session_path
+            )
+            for candidate, result in zip(misses, fresh):
+                results[candidate.key] = result
+                if cache is not None and not result.get("error"):
+                    await cache.put(candidate.key, result)
+
+        ordered = [
+            results.get(c.key, {"found": False, "error": "сервис не вернул результат"})
+            for c in parsed.candidates
+        ]
+        ordered = [
+            {**r, "candidates": similar[c.key]} if c.key in similar and not r.get("found") else r
+            for c, r in zip(parsed.candidates, ordered)
+        ]
+        found = sum(1 for r in ordered if r.get("found"))
+        failed = sum(1 for r in ordered if not r.get("found") and r.get("error"))
+
+        await bot.send_document(
+            chat_id=chat_id,
+            document=build_report(parsed.candidates, ordered, parsed.invalid),
+            filename=f"blacklist_report_{datetime.utcnow():%Y%m%d_%H%M}.csv",
+            caption=(
+                "🏁 <b>Массовая проверка завершена</b>\n\n"
+                f"<b>Проверено:</b> {len(ordered)}\n"
+                f"<b>Найдено в ЧС:</b> {found}\n"
+                f"<b>Ошибок:</b> {failed}\n"
+                f"<b>Пропущено строк:</b> {len(parsed.invalid)}"
+            ),
+            parse_mode="HTML",
+            rate_limit_args=Priority.BACKGROUND,
+        )
+        logger.info(f"Массовая проверка ЧС user {user_id}: {len(ordered)} кандидатов, найдено {found}")
+
+    except Exception as e:
+        logger.exception(f"Ошибка массовой проверки в ЧС для user {user_id}")
+        await bot.send_message(chat_id=chat_id, text=f"❌ Ошибка массовой проверки:\n\n{str(e)}")
+
+
 async def show_manage_chats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список чатов ЧС"""
     workers_api: WorkersAPI = context.bot_data["workers_api"]
@@ -584,6 +988,7 @@ async def receive_add_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             # Не форум — сохраняем сразу
             chat_title = topics_result.get("chat_title", "")
             await workers_api.add_blacklist_chat(normalized_username, chat_title=chat_title)
+            await context.bot_data["blacklist_cache"].clear()
             await status_msg.edit_text(
                 f"✅ Чат {normalized_username} добавлен в черный список!"
             )
@@ -640,6 +1045,7 @@ async def receive_topic_selection(update: Update, context: ContextTypes.DEFAULT_
         # Пользователь выбрал "Весь чат" — сохраняем без topic_id
         try:
             await workers_api.add_blacklist_chat(chat_username, chat_title=chat_title)
+            await context.bot_data["blacklist_cache"].clear()
             await query.edit_message_text(
                 f"✅ Чат {chat_username} добавлен в черный список!\n"
                 f"(все топики)"
@@ -661,6 +1067,7 @@ async def receive_topic_selection(update: Update, context: ContextTypes.DEFAULT_
                 topic_id=topic_id,
                 topic_name=topic_name,
             )
+            await context.bot_data["blacklist_cache"].clear()
             await query.edit_message_text(
                 f"✅ Чат {chat_username} добавлен в черный список!\n"
                 f"Топик: <b>{topic_name}</b>",
@@ -695,6 +1102,7 @@ async def remove_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await workers_api.remove_blacklist_chat(chat_username, topic_id=topic_id)
+        await context.bot_data["blacklist_cache"].clear()
         await query.answer(f"✅ Чат {chat_username} удалён")
         await show_manage_chats(update, context)
 
@@ -740,7 +1148,36 @@ def register_blacklist_handlers(app):
             CommandHandler("start", cancel_and_return_to_menu),
             MessageHandler(MAIN_MENU_FILTER, cancel_and_return_to_menu),
         ],
+        name="blacklist_check_user",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
     app.add_handler(check_user_conv)
+
+    # ConversationHandler для массовой проверки из файла
+    bulk_check_conv = ConversationHandler(
+        entry_points=[
+            MessageHandler(filters.Regex(f"^{BlacklistBtn.BULK}$"), start_bulk_check),
+        ],
+        states={
+            BlacklistState.WAITING_BULK_FILE: [
+                MessageHandler(filters.Document.ALL, receive_bulk_file),
+                MessageHandler(filters.TEXT & ~filters.COMMAND & ~MAIN_MENU_FILTER, bulk_file_expected),
+            ],
+        },
+        fallbacks=[
+            CommandHandler("start", cancel_and_return_to_menu),
+            MessageHandler(MAIN_MENU_FILTER, cancel_and_return_to_menu),
+        ],
+        name="blacklist_bulk_check",
+        persistent=True,
+        conversation_timeout=300,
+        allow_reentry=True,
+    )
+    app.add_handler(bulk_check_conv)
+
+    # Отмена поиска (после запуска диалог уже завершён — обработчик глобальный)
+    app.add_handler(
+        MessageHandler(filters.Regex(f"^{BlacklistBtn.CANCEL_SEARCH}$"), cancel_search)
+    )
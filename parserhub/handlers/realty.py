@@ -1,4 +1,5 @@
 """Обработчики парсинга недвижимости (Avito/Cian)"""
+import asyncio
 import re
 from datetime import datetime, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
@@ -19,7 +20,6 @@ from parserhub.api_client import RealtyAPI
 from parserhub.models import ActiveTask
 from parserhub.validators import Validators
 from parserhub.services.subscription_service import SubscriptionService
-from parserhub.handlers.admin import _is_admin
 from parserhub.handlers.start import cancel_and_return_to_menu, MAIN_MENU_FILTER, MenuButton, show_main_menu
 from parserhub.config import config
 
@@ -79,18 +79,17 @@ async def start_parsing_select_source(update: Update, context: ContextTypes.DEFA
 
     # Проверка подписки
     user_id = update.effective_user.id
-    db: DatabaseService = context.bot_data["db"]
+    sub_service: SubscriptionService = context.bot_data["subscription"]
 
-    if not await _is_admin(user_id, db):
-        sub_service: SubscriptionService = context.bot_data["subscription"]
-        if not await sub_service.has_access(user_id):
-            await update.message.reply_text(
-                "🔒 <b>Требуется подписка</b>\n\n"
-                "Для запуска мониторинга недвижимости необходима активная подписка.\n"
-                "Перейдите в «💳 Подписка» для оформления.",
-                parse_mode="HTML",
-            )
-            return ConversationHandler.END
+    access = await sub_service.resolve_access(user_id)
+    if not (access.is_admin or access.has_access):
+        await update.message.reply_text(
+            "🔒 <b>Требуется подписка</b>\n\n"
+            "Для запуска мониторинга недвижимости необходима активная подписка.\n"
+            "Перейдите в «💳 Подписка» для оформления.",
+            parse_mode="HTML",
+        )
+        return ConversationHandler.END
 
     if text_btn == RealtyBtn.AVITO:
         context.user_data["realty_source"] = "avito"
@@ -316,6 +315,21 @@ async def confirm_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     return ConversationHandler.END
 
 
+# Сколько ждать живые статусы при открытии списка задач, сек — дальше статусы из БД
+_LIVE_STATUS_TIMEOUT = 3.0
+
+
+async def _live_statuses(realty_api: RealtyAPI, tasks: list) -> dict:
+    """Актуальные статусы задач одним запросом (при ошибке или таймауте — пусто, берём статус из БД)"""
+    try:
+        return await asyncio.wait_for(
+            realty_api.get_statuses([t.task_id for t in tasks]), timeout=_LIVE_STATUS_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось получить статусы задач: {e}")
+        return {}
+
+
 async def show_my_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать активные задачи пользователя"""
     user_id = update.effective_user.id
@@ -339,18 +353,28 @@ async def show_my_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(text=text, reply_markup=reply_markup, parse_mode="HTML")
         return
 
+    shown = tasks[:10]
+    live = await _live_statuses(context.bot_data["realty_api"], shown)
+
     keyboard = []
-    for task in tasks[:10]:
+    for task in shown:
         type_emoji = {
             "avito": "🟦",
             "cian": "🟩",
             "avito_cian": "🔀",
         }.get(task.task_type, "📄")
 
-        if task.status == "running":
+        if task.task_id in live:
+            status = live[task.task_id].get("status", task.status) if live[task.task_id] else "gone"
+        else:
+            status = task.status
+
+        if status in ("running", "monitoring", "active"):
             status_emoji = "🟢"
-        elif task.status == "paused":
+        elif status == "paused":
             status_emoji = "⏸"
+        elif status == "gone":
+            status_emoji = "❌"
         else:
             status_emoji = "⭕"
 
@@ -636,6 +660,8 @@ def register_realty_handlers(app):
             CommandHandler("start", cancel_and_return_to_menu),
             MessageHandler(MAIN_MENU_FILTER, cancel_and_return_to_menu),
         ],
+        name="realty_parsing",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
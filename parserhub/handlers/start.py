@@ -74,10 +74,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     db: DatabaseService = context.bot_data["db"]
 
-    is_new_user = await db.get_user(user.id) is None
-
-    # Регистрация/обновление пользователя
-    await db.create_or_update_user(
+    # Регистрация нового пользователя; для существующего профиль обновится отложенно
+    is_new_user = await db.register_user(
         user_id=user.id,
         username=user.username,
         full_name=user.full_name,
@@ -96,9 +94,9 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from parserhub.handlers.admin import _is_admin
 
     user_id = update.effective_user.id
-    db: DatabaseService = context.bot_data["db"]
+    service = context.bot_data["subscription"]
 
-    is_admin = await _is_admin(user_id, db)
+    is_admin = await _is_admin(user_id, service)
 
     keyboard = [
         [KeyboardButton(MenuButton.ACCOUNT)],
@@ -55,11 +55,10 @@ async def subscription_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     service: SubscriptionService = context.bot_data["subscription"]
 
-    info = await service.get_info(user_id)
-    trial = await service.get_trial_info(user_id)
+    access = await service.resolve_access(user_id)
 
-    if info:
-        active_until = datetime.fromisoformat(info["active_until"]).replace(tzinfo=timezone.utc)
+    if access.active_until:
+        active_until = access.active_until.replace(tzinfo=timezone.utc)
         if active_until > datetime.now(timezone.utc):
             remaining = active_until - datetime.now(timezone.utc)
             days_left = remaining.days
@@ -67,7 +66,7 @@ async def subscription_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             status_text = (
                 f"<b>Статус:</b> ✅ Активна\n"
-                f"<b>Тариф:</b> {info['plan']}\n"
+                f"<b>Тариф:</b> {access.plan}\n"
                 f"<b>Действует до:</b> {active_until.strftime('%d.%m.%Y %H:%M')} UTC\n"
                 f"<b>Осталось:</b> {days_left} дн. {hours_left} ч.\n\n"
                 "Вы можете продлить подписку:"
@@ -77,8 +76,8 @@ async def subscription_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "<b>Статус:</b> Истекла\n\n"
                 "Выберите тариф для активации:"
             )
-    elif trial and trial["is_active"]:
-        trial_until = datetime.fromisoformat(trial["trial_until"]).replace(tzinfo=timezone.utc)
+    elif access.has_trial:
+        trial_until = access.trial_until.replace(tzinfo=timezone.utc)
         remaining = trial_until - datetime.now(timezone.utc)
         days_left = remaining.days
         hours_left = remaining.seconds // 3600
@@ -88,7 +87,7 @@ async def subscription_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"<b>Осталось:</b> {days_left} дн. {hours_left} ч.\n\n"
             "После окончания пробного периода для продолжения работы оформите подписку:"
         )
-    elif trial and not trial["is_active"]:
+    elif access.trial_until:
         status_text = (
             "<b>Статус:</b> Пробный период истёк\n\n"
             "Выберите тариф для активации:"
@@ -186,6 +185,9 @@ async def successful_payment_callback(update: Update, context: ContextTypes.DEFA
         db: DatabaseService = context.bot_data["db"]
         await db.log_payment(user_id, plan, payment.total_amount, payment.currency)
 
+        # Сбросить кэш доступа: оплаченные разделы должны открыться сразу
+        service.invalidate(user_id)
+
         plans = await service.get_plans()
         plan_info = plans.get(plan, {})
         label = plan_info.get("label", plan)
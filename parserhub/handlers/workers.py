@@ -17,9 +17,12 @@ from loguru import logger
 from parserhub.db_service import DatabaseService
 from parserhub.api_client import WorkersAPI
 from parserhub.models import ActiveTask
+from parserhub.rate_limiter import Priority
 from parserhub.validators import Validators
 from parserhub.services.subscription_service import SubscriptionService
-from parserhub.handlers.admin import _is_admin
+from parserhub.services.blacklist_cache import BlacklistCache, blacklist_cache_key, checked_username_key
+from parserhub.services.blacklist_scheduler import BlacklistScheduler
+from parserhub.singleflight import SingleFlight
 from parserhub.handlers.start import cancel_and_return_to_menu, MAIN_MENU_FILTER, MenuButton, show_main_menu
 
 
@@ -110,18 +113,17 @@ async def start_monitoring_select_mode(update: Update, context: ContextTypes.DEF
     """Выбор режима: работники или работодатели"""
     # Проверка подписки
     user_id = update.effective_user.id
-    db: DatabaseService = context.bot_data["db"]
+    sub_service: SubscriptionService = context.bot_data["subscription"]
 
-    if not await _is_admin(user_id, db):
-        sub_service: SubscriptionService = context.bot_data["subscription"]
-        if not await sub_service.has_access(user_id):
-            await update.message.reply_text(
-                "🔒 <b>Требуется подписка</b>\n\n"
-                "Для запуска мониторинга ПВЗ необходима активная подписка.\n"
-                "Перейдите в «💳 Подписка» для оформления.",
-                parse_mode="HTML",
-            )
-            return ConversationHandler.END
+    access = await sub_service.resolve_access(user_id)
+    if not (access.is_admin or access.has_access):
+        await update.message.reply_text(
+            "🔒 <b>Требуется подписка</b>\n\n"
+            "Для запуска мониторинга ПВЗ необходима активная подписка.\n"
+            "Перейдите в «💳 Подписка» для оформления.",
+            parse_mode="HTML",
+        )
+        return ConversationHandler.END
 
     keyboard = ReplyKeyboardMarkup([
         [KeyboardButton(WorkersBtn.MODE_WORKER), KeyboardButton(WorkersBtn.MODE_EMPLOYER)],
@@ -467,6 +469,31 @@ async def confirm_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     return ConversationHandler.END
 
 
+# Эмодзи статуса задачи в списке; "gone" — задачи нет в сервисе
+_TASK_STATUS_EMOJI = {
+    "running": "🟢",
+    "paused": "⏸",
+    "auth_error": "🔴",
+    "failed": "❌",
+    "gone": "❌",
+}
+
+
+# Сколько ждать живые статусы при открытии списка задач, сек — дальше статусы из БД
+_LIVE_STATUS_TIMEOUT = 3.0
+
+
+async def _live_statuses(workers_api: WorkersAPI, tasks: list) -> dict:
+    """Актуальные статусы задач одним запросом (при ошибке или таймауте — пусто, берём статус из БД)"""
+    try:
+        return await asyncio.wait_for(
+            workers_api.get_statuses([t.task_id for t in tasks]), timeout=_LIVE_STATUS_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось получить статусы задач: {e}")
+        return {}
+
+
 async def show_my_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать активные задачи пользователя"""
     user_id = update.effective_user.id
@@ -490,9 +517,16 @@ async def show_my_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(text=text, reply_markup=reply_markup, parse_mode="HTML")
         return
 
+    shown = tasks[:10]  # Показываем последние 10
+    live = await _live_statuses(context.bot_data["workers_api"], shown)
+
     keyboard = []
-    for task in tasks[:10]:  # Показываем последние 10
-        status_emoji = "🟢" if task.status == "running" else "⭕"
+    for task in shown:
+        if task.task_id in live:
+            status = live[task.task_id].get("status", task.status) if live[task.task_id] else "gone"
+        else:
+            status = task.status
+        status_emoji = _TASK_STATUS_EMOJI.get(status, "⭕")
         keyboard.append([
             InlineKeyboardButton(
                 f"{status_emoji} {task.task_id[:8]}...",
@@ -657,36 +691,63 @@ async def stop_all_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await show_my_tasks(update, context)
 
 
+async def _send_item_check_result(bot: Bot, chat_id: int, result: dict):
+    """Отправить результат проверки автора объявления (свежий или из кэша)"""
+    check_result = result.get("result", {})
+    if check_result.get("found"):
+        parts = ["⚠️ НАЙДЕН В ЧЕРНОМ СПИСКЕ!", ""]
+        extracted = check_result.get("extracted_info", {})
+        if check_result.get("chat"):
+            parts.append(f"💬 Чат: {check_result['chat']}")
+        if extracted.get("full_name"):
+            parts.append(f"📝 ФИО: {extracted['full_name']}")
+        if extracted.get("username"):
+            parts.append(f"🔗 Ник: {extracted['username']}")
+        if extracted.get("phone"):
+            parts.append(f"📞 Тел: {extracted['phone']}")
+        parts.append("")
+        parts.append("🔗 Сообщение в ЧС:")
+        parts.append(check_result.get("message_link", ""))
+        await bot.send_message(
+            chat_id=chat_id, text="\n".join(parts), disable_web_page_preview=False,
+            rate_limit_args=Priority.BACKGROUND,
+        )
+    else:
+        await bot.send_message(
+            chat_id=chat_id, text="✅ В черном списке НЕ найден", rate_limit_args=Priority.BACKGROUND
+        )
+
+
 async def _notification_blacklist_task(
     bot: Bot,
     chat_id: int,
-    user_id: int,
     item_id: int,
     workers_api: WorkersAPI,
     bot_data: dict,
+    cache: BlacklistCache | None = None,
 ):
     """Фоновая задача проверки в ЧС из уведомления — выполняется без блокировки бота"""
     try:
-        result = await workers_api.check_blacklist_by_item(item_id)
+        # Одно объявление могло прийти в уведомлениях нескольким пользователям —
+        # одновременные проверки одного item_id выполняются одним запросом
+        flights: SingleFlight | None = bot_data.get("blacklist_flights")
+        if flights is None:
+            result = await workers_api.run_blacklist_check_by_item(item_id)
+        else:
+            result = await flights.do(
+                blacklist_cache_key(item_id=item_id),
+                lambda: workers_api.run_blacklist_check_by_item(item_id),
+            )
 
         check_result = result.get("result", {})
-        if check_result.get("found"):
-            parts = ["⚠️ НАЙДЕН В ЧЕРНОМ СПИСКЕ!", ""]
-            extracted = check_result.get("extracted_info", {})
-            if check_result.get("chat"):
-                parts.append(f"💬 Чат: {check_result['chat']}")
-            if extracted.get("full_name"):
-                parts.append(f"📝 ФИО: {extracted['full_name']}")
-            if extracted.get("username"):
-                parts.append(f"🔗 Ник: {extracted['username']}")
-            if extracted.get("phone"):
-                parts.append(f"📞 Тел: {extracted['phone']}")
-            parts.append("")
-            parts.append("🔗 Сообщение в ЧС:")
-            parts.append(check_result.get("message_link", ""))
-            await bot.send_message(chat_id=chat_id, text="\n".join(parts), disable_web_page_preview=False)
-        else:
-            await bot.send_message(chat_id=chat_id, text="✅ В черном списке НЕ найден")
+        if cache is not None and not check_result.get("error"):
+            await cache.put(blacklist_cache_key(item_id=item_id), result)
+            # Тот же кандидат мог проверяться вручную или придёт в ручной проверке позже
+            candidate_key = checked_username_key(check_result)
+            if candidate_key is not None:
+                await cache.put(candidate_key, check_result)
+
+        await _send_item_check_result(bot, chat_id, result)
 
     except HTTPStatusError as e:
         logger.exception(f"Ошибка фоновой проверки ЧС из уведомления для item {item_id}")
@@ -694,8 +755,6 @@ async def _notification_blacklist_task(
     except Exception as e:
         logger.exception(f"Ошибка фоновой проверки ЧС из уведомления для item {item_id}")
         await bot.send_message(chat_id=chat_id, text=f"❌ Ошибка проверки: {e}")
-    finally:
-        bot_data.get("blacklist_searching", set()).discard(user_id)
 
 
 async def handle_notification_blacklist_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -716,23 +775,43 @@ async def handle_notification_blacklist_check(update: Update, context: ContextTy
         )
         return
 
-    # Проверяем, не идёт ли уже поиск для этого пользователя
-    searching: set = context.bot_data.setdefault("blacklist_searching", set())
-    if user_id in searching:
+    item_id = int(query.data.split(":")[1])
+    cache: BlacklistCache | None = context.bot_data.get("blacklist_cache")
+
+    # Автор объявления уже проверялся — отвечаем сразу
+    cached = await cache.get(blacklist_cache_key(item_id=item_id)) if cache else None
+    if cached:
+        await query.answer("Результат из кэша")
+        try:
+            await query.edit_message_reply_markup(reply_markup=None)
+        except Exception:
+            pass
+        await _send_item_check_result(context.bot, chat_id, cached.result)
+        return
+
+    workers_api: WorkersAPI = context.bot_data["workers_api"]
+    scheduler: BlacklistScheduler = context.bot_data["blacklist_scheduler"]
+
+    job = scheduler.submit(user_id, lambda: _notification_blacklist_task(
+        bot=context.bot,
+        chat_id=chat_id,
+        item_id=item_id,
+        workers_api=workers_api,
+        bot_data=context.bot_data,
+        cache=cache,
+    ))
+    if job is None:
         await query.answer()
         await query.message.reply_text(
-            "⏳ <b>Проверка уже выполняется</b>\n\n"
-            "Одновременно по чёрному списку может проверяться только один пользователь.\n"
-            "Пожалуйста, подождите завершения поиска и попробуйте снова.",
+            "⏳ <b>Очередь ваших проверок заполнена</b>\n\n"
+            f"Одновременно можно поставить в очередь не больше {scheduler.user_queue} запросов.\n"
+            "Пожалуйста, дождитесь результатов и попробуйте снова.",
             parse_mode="HTML",
         )
         return
 
-    item_id = int(query.data.split(":")[1])
-    workers_api: WorkersAPI = context.bot_data["workers_api"]
-
-    await query.answer("Поиск в черном списке запущен")
-    searching.add(user_id)
+    position = scheduler.position(job)
+    await query.answer("Поиск в черном списке запущен" if position == 0 else "Поиск поставлен в очередь")
 
     # Убираем кнопки с уведомления, чтобы нельзя было нажать повторно
     try:
@@ -740,21 +819,16 @@ async def handle_notification_blacklist_check(update: Update, context: ContextTy
     except Exception:
         pass
 
+    status = (
+        "🔍 <b>Поиск в черном списке запущен</b>" if position == 0
+        else f"🕐 <b>Поиск в черном списке поставлен в очередь</b> (позиция {position})"
+    )
     await query.message.reply_text(
-        "🔍 <b>Поиск в черном списке запущен</b>\n\n"
+        f"{status}\n\n"
         "⏳ <i>Результат придёт автоматически — можете пользоваться ботом.</i>",
         parse_mode="HTML",
     )
 
-    asyncio.create_task(_notification_blacklist_task(
-        bot=context.bot,
-        chat_id=chat_id,
-        user_id=user_id,
-        item_id=item_id,
-        workers_api=workers_api,
-        bot_data=context.bot_data,
-    ))
-
 
 async def handle_notification_ignore(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка кнопки 'Игнорировать' из уведомления workers-service"""
@@ -833,6 +907,8 @@ def register_workers_handlers(app):
             CommandHandler("start", cancel_and_return_to_menu),
             MessageHandler(MAIN_MENU_FILTER, cancel_and_return_to_menu),
         ],
+        name="workers_monitoring",
+        persistent=True,
         conversation_timeout=300,
         allow_reentry=True,
     )
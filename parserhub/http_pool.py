@@ -0,0 +1,118 @@
+"""Общий HTTP-транспорт для клиентов микросервисов (workers_service, avito_cian_parser)"""
+import importlib.util
+import time
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+from parserhub.metrics import HTTP_REQUESTS, HTTP_SECONDS, http_endpoint
+
+
+# Таймауты по типам запросов (сек). Переопределяются из Config через HttpPool(timeouts=...)
+DEFAULT_TIMEOUTS = {
+    "default": 30.0,     # старт/стоп задач, настройки
+    "status": 10.0,      # статусы и списки — быстрые GET, нажатия «🔄 Обновить»
+    "topics": 60.0,      # получение топиков форума через Pyrogram
+    "blacklist": 1200.0, # синхронная проверка ЧС (сканирование чатов)
+}
+
+# Таймаут на установку TCP-соединения — не зависит от типа запроса
+CONNECT_TIMEOUT = 5.0
+
+
+class _MeteredClient(httpx.AsyncClient):
+    """httpx.AsyncClient с метриками каждого запроса: время до заголовков ответа и класс
+    ответа по сервису и шаблону эндпоинта. Нет ответа (таймаут, отказ соединения) — error
+    """
+
+    def __init__(self, *args, services: dict[str, str], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.services = services
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        netloc = request.url.netloc.decode()
+        labels = (self.services.get(netloc, netloc), request.method, http_endpoint(request.url.path))
+        started = time.perf_counter()
+        try:
+            response = await super().send(request, **kwargs)
+        except Exception:
+            HTTP_REQUESTS.inc(*labels, "error")
+            raise
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - started, *labels)
+        HTTP_REQUESTS.inc(*labels, f"{response.status_code // 100}xx")
+        return response
+
+
+class HttpPool:
+    """Один httpx.AsyncClient с настроенным пулом соединений на все API-клиенты.
+
+    WorkersAPI, RealtyAPI и reconcile при старте используют общий пул keep-alive
+    соединений, поэтому серия запросов идёт по уже открытым TCP-сессиям.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        timeouts: Optional[dict[str, float]] = None,
+    ):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.requests_total = 0
+        # host:port → имя сервиса для меток метрик (заполняют API-клиенты)
+        self.services: dict[str, str] = {}
+
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 включён, но пакет h2 не установлен — используется HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        self.client = _MeteredClient(
+            services=self.services,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=self.timeout("default"),
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def _on_request(self, request: httpx.Request):
+        self.requests_total += 1
+
+    def name_service(self, base_url: str, name: str):
+        """Подписывать запросы к base_url в метриках именем сервиса"""
+        self.services[httpx.URL(base_url).netloc.decode()] = name
+
+    def timeout(self, kind: str) -> httpx.Timeout:
+        """Таймаут для типа запроса ('default', 'status', 'topics', 'blacklist')"""
+        value = self.timeouts.get(kind, self.timeouts["default"])
+        return httpx.Timeout(value, connect=min(value, CONNECT_TIMEOUT))
+
+    def stats(self) -> dict:
+        """Метрики пула: открытые / простаивающие / занятые соединения и число запросов"""
+        # httpx не публикует состояние пула — берём его у httpcore (если доступно)
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "requests_total": self.requests_total,
+            "http2": self.http2,
+        }
+
+    async def close(self):
+        """Закрыть все соединения (вызывается в post_shutdown)"""
+        stats = self.stats()
+        await self.client.aclose()
+        logger.info(
+            f"HTTP пул закрыт: запросов {stats['requests_total']}, "
+            f"соединений на момент закрытия {stats['connections']}"
+        )
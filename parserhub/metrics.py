@@ -0,0 +1,408 @@
+"""Метрики бота в текстовом формате Prometheus: счётчики, гистограммы и снимки stats() сервисов"""
+import asyncio
+import functools
+import inspect
+import json
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, Optional
+
+from loguru import logger
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы гистограмм времени (сек): от запроса к индексу SQLite до долгих HTTP-вызовов
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Сэмпл коллектора: (имя, тип, описание, метки, значение)
+Sample = tuple[str, str, str, dict[str, str], float]
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Гистограмма (накопительные корзины, сумма и количество) с метками"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # метки → [счётчики корзин (последняя — +Inf), сумма]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: Any):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def count(self, *labels: Any) -> int:
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def sum(self, *labels: Any) -> float:
+        state = self._values.get(labels)
+        return state[1] if state else 0.0
+
+    def render(self) -> Iterable[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """Набор метрик процесса и коллекторов, снимающих stats() сервисов при каждом запросе"""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._collectors: list[Callable[[], Iterable[Sample]]] = []
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+
+        # Сэмплы одной метрики в формате Prometheus идут подряд под одним HELP/TYPE
+        groups: dict[str, tuple[str, str, list[str]]] = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                # Сломанный коллектор не должен ронять весь /metrics
+                logger.warning(f"Метрики: ошибка коллектора {collector}: {e}")
+                continue
+            for name, kind, help, labels, value in samples:
+                group = groups.setdefault(name, (kind, help, []))
+                group[2].append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        for name, (kind, help, samples) in groups.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = Registry()
+
+HANDLER_CALLS = REGISTRY.counter(
+    "parserhub_handler_calls_total", "Вызовы обработчиков обновлений", ("handler", "status")
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "parserhub_handler_seconds", "Время работы обработчика обновления", ("handler",)
+)
+DB_SECONDS = REGISTRY.histogram(
+    "parserhub_db_query_seconds", "Время метода доступа к bot.db", ("service", "method")
+)
+DB_ERRORS = REGISTRY.counter(
+    "parserhub_db_errors_total", "Исключения в методах доступа к bot.db", ("service", "method")
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "parserhub_http_request_seconds",
+    "Время HTTP-запроса к микросервису (до заголовков ответа)",
+    ("service", "method", "endpoint"),
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "parserhub_http_requests_total",
+    "HTTP-запросы к микросервисам по классу ответа (2xx/4xx/5xx) или error — нет ответа",
+    ("service", "method", "endpoint", "status"),
+)
+TELEGRAM_REQUESTS = REGISTRY.counter(
+    "parserhub_telegram_requests_total", "Запросы к Bot API через лимитер исходящих", ("method", "priority")
+)
+TELEGRAM_FLOOD_WAITS = REGISTRY.counter(
+    "parserhub_telegram_flood_waits_total", "Ответы Bot API RetryAfter (flood wait)", ("method",)
+)
+
+
+# ===== Инструментирование =====
+
+def instrument_handlers(application) -> int:
+    """Обернуть колбэки всех обработчиков приложения (вместе с вложенными в
+    ConversationHandler) замером времени и счётчиком вызовов.
+
+    Вызывается после регистрации обработчиков. Returns: сколько колбэков обёрнуто
+    """
+
+    def walk(handlers) -> int:
+        wrapped = 0
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                wrapped += walk(handler.entry_points)
+                for state_handlers in handler.states.values():
+                    wrapped += walk(state_handlers)
+                wrapped += walk(handler.fallbacks)
+            elif not getattr(handler.callback, "_metered", False):
+                handler.callback = _timed_handler(handler.callback)
+                wrapped += 1
+        return wrapped
+
+    return sum(walk(handlers) for handlers in application.handlers.values())
+
+
+def _timed_handler(callback: Callable) -> Callable:
+    name = getattr(callback, "__name__", type(callback).__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+            HANDLER_CALLS.inc(name, status)
+
+    wrapper._metered = True
+    return wrapper
+
+
+def instrument_methods(obj: Any, histogram: Histogram = DB_SECONDS, errors: Counter = DB_ERRORS) -> int:
+    """Обернуть публичные async-методы объекта замером времени (метки: класс, метод).
+
+    Меняются только атрибуты экземпляра — класс и остальные экземпляры не затронуты.
+    Returns: сколько методов обёрнуто
+    """
+    service = type(obj).__name__
+    wrapped = 0
+    for name, function in inspect.getmembers(type(obj), inspect.iscoroutinefunction):
+        if name.startswith("_"):
+            continue
+        setattr(obj, name, _timed_method(getattr(obj, name), service, name, histogram, errors))
+        wrapped += 1
+    return wrapped
+
+
+def _timed_method(method: Callable, service: str, name: str, histogram: Histogram, errors: Counter) -> Callable:
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            errors.inc(service, name)
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started, service, name)
+
+    return wrapper
+
+
+def http_endpoint(path: str) -> str:
+    """Шаблон пути для метки: сегменты с цифрами (task_id, job_id, item_id) → {id}"""
+    segments = [
+        "{id}" if any(char.isdigit() for char in segment) else segment
+        for segment in path.split("/")
+    ]
+    return "/".join(segments) or "/"
+
+
+# ===== Снимки stats() сервисов =====
+
+# Поля stats(), которые только растут, — экспортируются как counter с суффиксом _total
+_COUNTER_FIELDS = {
+    "processed", "sent", "flood_waits", "requests_total", "received", "rejected", "completed",
+    "cancelled", "rows_written", "flushes", "updates", "invalidations", "dropped", "routed",
+    "restarts", "started", "shared",
+}
+# Вложенные словари stats() → имя метки для их ключей
+_LABEL_FIELDS = {"queued": "lane", "rejected": "reason"}
+
+
+def stats_samples(prefix: str, stats: dict, labels: Optional[dict[str, str]] = None) -> list[Sample]:
+    """Числовые поля stats() → сэмплы parserhub_{prefix}_{поле}"""
+    labels = labels or {}
+    samples = []
+    for field, value in stats.items():
+        if isinstance(value, dict) and field in _LABEL_FIELDS:
+            for key, item in value.items():
+                samples.extend(_sample(prefix, field, item, {**labels, _LABEL_FIELDS[field]: str(key)}))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                if isinstance(item, dict):
+                    samples.extend(stats_samples(f"{prefix}_{field}", item, {**labels, "shard": str(index)}))
+        else:
+            samples.extend(_sample(prefix, field, value, labels))
+    return samples
+
+
+def _sample(prefix: str, field: str, value: Any, labels: dict) -> list[Sample]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return []
+    name = f"parserhub_{prefix}_{field}"
+    if field in _COUNTER_FIELDS:
+        name = name if name.endswith("_total") else f"{name}_total"
+        return [(name, "counter", f"{prefix}: {field} из stats()", labels, value)]
+    return [(name, "gauge", f"{prefix}: {field} из stats()", labels, value)]
+
+
+# Сервисы bot_data с методом stats() → префикс метрик
+_STATS_SOURCES = {
+    "http_pool": "http_pool",
+    "rate_limiter": "outbound",
+    "update_processor": "updates",
+    "blacklist_scheduler": "blacklist_scheduler",
+    "blacklist_flights": "blacklist_flights",
+    "webhook": "webhook",
+    "shard": "shard",
+}
+
+
+def application_collector(application) -> Callable[[], Iterable[Sample]]:
+    """Коллектор процесса бота: stats() сервисов из bot_data, персистентности,
+    размеры кэшей, рассылки и фоновые задачи"""
+
+    def collect() -> Iterable[Sample]:
+        bot_data = application.bot_data
+        samples: list[Sample] = []
+        for key, prefix in _STATS_SOURCES.items():
+            source = bot_data.get(key)
+            if source is not None and hasattr(source, "stats"):
+                samples.extend(stats_samples(prefix, source.stats()))
+        if application.persistence is not None and hasattr(application.persistence, "stats"):
+            samples.extend(stats_samples("persistence", application.persistence.stats()))
+
+        caches = {
+            "access": getattr(bot_data.get("db"), "access_cache", None),
+            "workers_status": getattr(bot_data.get("workers_api"), "status_cache", None),
+            "realty_status": getattr(bot_data.get("realty_api"), "status_cache", None),
+        }
+        for name, cache in caches.items():
+            if cache is not None:
+                samples.append(("parserhub_cache_entries", "gauge", "Записей в in-process кэше",
+                                {"cache": name}, len(cache)))
+
+        broadcasts = bot_data.get("broadcasts")
+        if broadcasts is not None:
+            running = broadcasts.running()
+            samples.append(("parserhub_broadcasts_running", "gauge", "Идущих рассылок в процессе", {}, len(running)))
+            for broadcast_id in running:
+                samples.append(("parserhub_broadcast_rate", "gauge", "Скорость рассылки, сообщений/сек",
+                                {"broadcast": str(broadcast_id)}, broadcasts.rate(broadcast_id)))
+
+        for key, task in bot_data.items():
+            if isinstance(task, asyncio.Task):
+                samples.append(("parserhub_background_task_up", "gauge", "Фоновая задача бота работает (1) или завершилась (0)",
+                                {"task": key}, 0 if task.done() else 1))
+        samples.append(("parserhub_asyncio_tasks", "gauge", "Задач asyncio в event loop", {},
+                        len(asyncio.all_tasks())))
+        return samples
+
+    return collect
+
+
+# ===== HTTP =====
+
+def metrics_route(registry: Registry = REGISTRY) -> Callable:
+    """Маршрут GET /metrics для WebhookIngress.add_route"""
+
+    async def handler() -> tuple[int, str, bytes]:
+        return 200, CONTENT_TYPE, registry.render().encode()
+
+    return handler
+
+
+async def serve_metrics(host: str, port: int, registry: Registry = REGISTRY) -> asyncio.AbstractServer:
+    """Отдельный HTTP-сервер GET /metrics и GET /health (режим polling и шарды).
+
+    Минимальный HTTP/1.1 без зависимостей: один запрос на соединение.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) >= 2 else ""
+            if parts[:1] == ["GET"] and path == "/metrics":
+                status, content_type, body = 200, CONTENT_TYPE, registry.render().encode()
+            elif parts[:1] == ["GET"] and path == "/health":
+                status, content_type, body = 200, "application/json", json.dumps({"status": "ok"}).encode()
+            else:
+                status, content_type, body = 404, "text/plain", b""
+            reason = {200: "OK", 404: "Not Found"}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Метрики: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,390 @@
+"""Версионные миграции схемы bot.db
+
+Каждая миграция применяется ровно один раз; номера применённых версий хранятся
+в таблице schema_version. Миграции идемпотентны (IF NOT EXISTS / проверка колонок),
+поэтому на существующих базах без schema_version они безопасно «догоняют» схему.
+
+Новую миграцию добавлять в конец MIGRATIONS со следующим номером версии.
+Уже выпущенные миграции не редактировать.
+"""
+from datetime import datetime
+from typing import Awaitable, Callable, NamedTuple
+
+import aiosqlite
+from loguru import logger
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+async def _column_exists(db: aiosqlite.Connection, table: str, column: str) -> bool:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return any(row["name"] == column for row in await cursor.fetchall())
+
+
+# ===== Миграции =====
+
+async def _v1_base_schema(db: aiosqlite.Connection):
+    # Таблица пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            full_name TEXT,
+            phone TEXT,
+            is_parser_authorized BOOLEAN DEFAULT 0,
+            is_blacklist_authorized BOOLEAN DEFAULT 0,
+            created_at TEXT NOT NULL,
+            last_active TEXT
+        )
+    """)
+
+    # Таблица настроек пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            default_mode TEXT DEFAULT 'worker',
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+    # Таблица активных задач
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS active_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            task_id TEXT NOT NULL,
+            service TEXT NOT NULL,
+            task_type TEXT,
+            status TEXT DEFAULT 'running',
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+    # Таблица администраторов
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS admins (
+            user_id INTEGER PRIMARY KEY,
+            added_by INTEGER,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+    # Таблица платежей (для статистики доходов)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            plan TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            currency TEXT NOT NULL DEFAULT 'RUB',
+            created_at TEXT NOT NULL
+        )
+    """)
+
+    # Таблица глобальных настроек (для чатов ПВЗ и ЧС, тарифов)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS global_config (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+
+    # Таблица подписок
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            user_id INTEGER PRIMARY KEY,
+            plan TEXT NOT NULL,
+            active_until TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+
+async def _v2_users_trial_until(db: aiosqlite.Connection):
+    if not await _column_exists(db, "users", "trial_until"):
+        await db.execute("ALTER TABLE users ADD COLUMN trial_until TEXT DEFAULT NULL")
+
+
+async def _v3_secondary_indexes(db: aiosqlite.Connection):
+    # get_user_tasks: WHERE user_id [AND service] ORDER BY created_at DESC
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_active_tasks_user_service "
+        "ON active_tasks (user_id, service, created_at)"
+    )
+    # update_task_status / delete_task
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_active_tasks_task_id ON active_tasks (task_id)"
+    )
+    # get_all_running_tasks / clear_running_tasks
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_active_tasks_status "
+        "ON active_tasks (status, created_at)"
+    )
+    # get_revenue_stats: диапазон по created_at, amount в индексе — без обращения к таблице
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments (created_at, amount)"
+    )
+    # get_all_active / delete_expired / get_all_trial_active
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_subscriptions_active_until "
+        "ON subscriptions (active_until)"
+    )
+    # get_user_by_username
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+    # get_all_trial_active
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_trial_until ON users (trial_until)")
+
+
+async def _v4_revenue_rollup(db: aiosqlite.Connection):
+    # Агрегаты платежей: period = 'day' (bucket YYYY-MM-DD), 'month' (YYYY-MM), 'all' (bucket 'all').
+    # Поддерживаются log_payment в той же транзакции, что и INSERT в payments
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS revenue_rollup (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            amount INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, bucket, plan, currency)
+        ) WITHOUT ROWID
+    """)
+
+    # Backfill из накопленной истории платежей
+    await db.execute("DELETE FROM revenue_rollup")
+    for period, bucket_expr in (
+        ("day", "substr(created_at, 1, 10)"),
+        ("month", "substr(created_at, 1, 7)"),
+        ("all", "'all'"),
+    ):
+        await db.execute(
+            f"""
+            INSERT INTO revenue_rollup (period, bucket, plan, currency, amount, count)
+            SELECT ?, {bucket_expr}, plan, currency, SUM(amount), COUNT(*)
+            FROM payments
+            GROUP BY 2, plan, currency
+            """,
+            (period,),
+        )
+
+
+async def _v5_blacklist_cache(db: aiosqlite.Connection):
+    # Кэш результатов проверки в ЧС: key — нормализованные никнейм+ФИО или item:<id>
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist_cache (
+            key TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL
+        )
+    """)
+    # BlacklistCache.delete_expired
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_blacklist_cache_expires_at ON blacklist_cache (expires_at)"
+    )
+
+
+async def _v6_blacklist_index(db: aiosqlite.Connection):
+    # Локальное зеркало записей ЧС из workers_service (дельта-синхронизация BlacklistIndex.sync).
+    # username хранится в нижнем регистре без «@»
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist_records (
+            id INTEGER PRIMARY KEY,
+            record_id TEXT NOT NULL UNIQUE,
+            chat TEXT,
+            message_link TEXT,
+            username TEXT,
+            user_id INTEGER,
+            phone TEXT,
+            full_name TEXT,
+            message_text TEXT,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_blacklist_records_username ON blacklist_records (username)"
+    )
+    # Полнотекстовый индекс по ФИО и тексту записи (rowid = blacklist_records.id).
+    # Текст кладётся уже свёрнутым (нижний регистр, ё → е)
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS blacklist_fts USING fts5(
+            full_name, message_text, tokenize = 'unicode61'
+        )
+    """)
+
+
+async def _v7_blacklist_fio_terms(db: aiosqlite.Connection):
+    # Основы слов ФИО записей (fio_matcher.name_stems): stem → blacklist_records.id
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist_fio_terms (
+            stem TEXT NOT NULL,
+            record_id INTEGER NOT NULL,
+            PRIMARY KEY (stem, record_id)
+        ) WITHOUT ROWID
+    """)
+    # Удаление постингов записи при обновлении/удалении
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_blacklist_fio_terms_record_id "
+        "ON blacklist_fio_terms (record_id)"
+    )
+    # Триграммный индекс словаря основ: trigram → stem (кандидаты для нечёткого поиска)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist_fio_trigrams (
+            trigram TEXT NOT NULL,
+            stem TEXT NOT NULL,
+            PRIMARY KEY (trigram, stem)
+        ) WITHOUT ROWID
+    """)
+
+    # Основы уже синхронизированных записей строит BlacklistIndex.sync: правила
+    # нормализации живут в fio_matcher и могут меняться, а миграция — нет
+
+
+async def _v8_broadcasts(db: aiosqlite.Connection):
+    # Рассылки админов: status = 'running' | 'done' | 'cancelled'; счётчики обновляются
+    # в той же транзакции, что и статусы получателей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_by INTEGER NOT NULL,
+            audience TEXT NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            report_chat_id INTEGER,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    """)
+    # Снимок получателей на момент запуска: status = 'pending' | 'sent' | 'failed' | 'blocked'.
+    # Возобновление после рестарта идёт по (broadcast_id, status, user_id)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            broadcast_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            PRIMARY KEY (broadcast_id, user_id)
+        ) WITHOUT ROWID
+    """)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status "
+        "ON broadcast_recipients (broadcast_id, status, user_id)"
+    )
+
+
+async def _v9_persistence(db: aiosqlite.Connection):
+    # Персистентность PTB: user_data / chat_data и состояния ConversationHandler
+    # построчно (pickle одной записи), чтобы сохранять только изменившееся
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS persistence_user_data (
+            user_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS persistence_chat_data (
+            chat_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    # key — ключ диалога PTB (chat_id, user_id, ...) в JSON
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS persistence_conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state BLOB NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+    """)
+
+
+async def _v10_blacklist_flights(db: aiosqlite.Connection):
+    # Идущие поиски в ЧС для дедупликации между процессами-шардами: владелец
+    # записи выполняет поиск и кладёт сюда результат, остальные его ждут
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS blacklist_flights (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            shard INTEGER,
+            started_at TEXT NOT NULL,
+            result TEXT,
+            finished_at TEXT
+        )
+    """)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "базовая схема", _v1_base_schema),
+    Migration(2, "users.trial_until", _v2_users_trial_until),
+    Migration(3, "вторичные индексы", _v3_secondary_indexes),
+    Migration(4, "агрегаты доходов revenue_rollup", _v4_revenue_rollup),
+    Migration(5, "кэш результатов ЧС blacklist_cache", _v5_blacklist_cache),
+    Migration(6, "локальный индекс записей ЧС blacklist_records + FTS5", _v6_blacklist_index),
+    Migration(7, "основы ФИО для нечёткого поиска по индексу ЧС", _v7_blacklist_fio_terms),
+    Migration(8, "рассылки broadcasts + broadcast_recipients", _v8_broadcasts),
+    Migration(9, "персистентность диалогов и user_data", _v9_persistence),
+    Migration(10, "идущие поиски в ЧС blacklist_flights (дедупликация между шардами)", _v10_blacklist_flights),
+]
+
+
+# ===== Раннер =====
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Максимальная применённая версия схемы (0 — миграций ещё не было)"""
+    async with db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version") as cursor:
+        row = await cursor.fetchone()
+        return row[0]
+
+
+async def run_migrations(
+    db: aiosqlite.Connection, migrations: list[Migration] = MIGRATIONS
+) -> list[int]:
+    """Применить недостающие миграции по порядку версий.
+
+    Вызывается внутри ConnectionPool.write(). sqlite3 сам не открывает транзакцию
+    перед DDL, поэтому открываем её явно — при ошибке откатываются и изменения
+    схемы, и записи в schema_version.
+
+    Returns:
+        Список применённых версий
+    """
+    if not db.in_transaction:
+        await db.execute("BEGIN")
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+
+    current = await get_schema_version(db)
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= current:
+            continue
+
+        await migration.apply(db)
+        await db.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+            (migration.version, migration.description, datetime.utcnow().isoformat()),
+        )
+        applied.append(migration.version)
+        logger.info(f"Миграция v{migration.version} применена: {migration.description}")
+
+    return applied
@@ -19,6 +19,31 @@ class User(BaseModel):
     trial_until: Optional[datetime] = None
 
 
+class AccessInfo(BaseModel):
+    """Права доступа пользователя: платная подписка, пробный период, админ"""
+    user_id: int
+    is_registered: bool = False
+    is_admin: bool = False
+    plan: Optional[str] = None
+    active_until: Optional[datetime] = None
+    trial_until: Optional[datetime] = None
+
+    @property
+    def has_subscription(self) -> bool:
+        """Активная платная подписка"""
+        return self.active_until is not None and self.active_until > datetime.utcnow()
+
+    @property
+    def has_trial(self) -> bool:
+        """Активный пробный период"""
+        return self.trial_until is not None and self.trial_until > datetime.utcnow()
+
+    @property
+    def has_access(self) -> bool:
+        """Активная платная подписка ИЛИ активный пробный период"""
+        return self.has_subscription or self.has_trial
+
+
 class UserSettings(BaseModel):
     """Настройки пользователя"""
     user_id: int
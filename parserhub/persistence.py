@@ -0,0 +1,276 @@
+"""Персистентность PTB в bot.db: состояния диалогов и user_data переживают рестарт бота"""
+import asyncio
+import json
+import pickle
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+from loguru import logger
+from telegram.ext import BasePersistence, PersistenceInput
+
+from parserhub.db_service import DatabaseService
+
+
+_TABLES = {
+    "user": ("persistence_user_data", "user_id"),
+    "chat": ("persistence_chat_data", "chat_id"),
+}
+
+
+class SQLitePersistence(BasePersistence[dict, dict, dict]):
+    """Хранит состояния ConversationHandler и user_data / chat_data построчно в bot.db.
+
+    PTB раз в update_interval передаёт данные пользователей, которых касались
+    обработчики, и изменившиеся состояния диалогов. Каждая запись сериализуется
+    отдельно (pickle) и сравнивается с последней сохранённой: неизменившиеся
+    пропускаются, остальные пишутся одной транзакцией на весь цикл — без
+    перезаписи всего файла, как у PicklePersistence.
+
+    bot_data не сохраняется: там живые сервисы (пул БД, HTTP-клиенты, задачи).
+    Данные, которые нельзя сериализовать, пропускаются с предупреждением.
+
+    shard=(номер, всего) — в шардированном запуске загружаются только записи
+    пользователей этого шарда (user_id % всего == номер); пишет шард тоже только их.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseService,
+        update_interval: float = 5.0,
+        shard: Optional[tuple[int, int]] = None,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = db
+        self.shard = shard
+        # Ожидающие записи: (вид, id) → pickle или None (удалить)
+        self._pending: dict[tuple[str, Any], Optional[bytes]] = {}
+        self._pending_conversations: dict[tuple[str, str], Optional[bytes]] = {}
+        # Хэши последних сохранённых записей — для пропуска неизменившихся
+        self._stored: dict[tuple, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.rows_written = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    # ===== Загрузка при старте =====
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return await self._load("user")
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return await self._load("chat")
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        await self._open()
+        conversations = {}
+        async with self.db.pool.read() as db:
+            async with db.execute(
+                "SELECT key, state FROM persistence_conversations WHERE name = ?", (name,)
+            ) as cursor:
+                rows = await self._fetch_tuples(cursor)
+        for key, state in rows:
+            key_tuple = tuple(json.loads(key))
+            # Ключ диалога — (chat_id, user_id): владелец последним
+            if self.shard and key_tuple and key_tuple[-1] % self.shard[1] != self.shard[0]:
+                continue
+            conversations[key_tuple] = pickle.loads(state)
+            self._stored[("conv", name, key)] = hash(state)
+        return conversations
+
+    # ===== Изменения (буферизуются до flush) =====
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage("user", user_id, data)
+        await self._flush_soon()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage("chat", chat_id, data)
+        await self._flush_soon()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending[("user", user_id)] = None
+        await self._flush_soon()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._pending[("chat", chat_id)] = None
+        await self._flush_soon()
+
+    async def update_conversation(
+        self, name: str, key: tuple, new_state: Optional[object]
+    ) -> None:
+        key_json = json.dumps(list(key))
+        if new_state is None:
+            blob = None
+        else:
+            blob = pickle.dumps(new_state, protocol=pickle.HIGHEST_PROTOCOL)
+            if self._stored.get(("conv", name, key_json)) == hash(blob):
+                return
+        self._pending_conversations[(name, key_json)] = blob
+        await self._flush_soon()
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Записать всё накопленное (PTB вызывает при остановке бота)"""
+        if self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+        await self._write()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending) + len(self._pending_conversations),
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+    # ===== Внутреннее =====
+
+    async def _open(self):
+        # Данные загружаются в Application.initialize — раньше post_init, где открывается БД
+        if not self.db.pool.is_open:
+            await self.db.open()
+            await self.db.init_db()
+
+    async def _load(self, kind: str) -> dict[int, dict]:
+        await self._open()
+        table, column = _TABLES[kind]
+        result = {}
+        query, params = f"SELECT {column}, data FROM {table}", ()
+        if self.shard:
+            # Остаток как в Python (неотрицательный и для id групп)
+            index, count = self.shard
+            query += f" WHERE (({column} % ?) + ?) % ? = ?"
+            params = (count, count, count, index)
+        async with self.db.pool.read() as db:
+            async with db.execute(query, params) as cursor:
+                rows = await self._fetch_tuples(cursor)
+        for row_id, data in rows:
+            try:
+                result[row_id] = pickle.loads(data)
+            except Exception as e:
+                logger.warning(f"Персистентность: не удалось прочитать {kind}_data {row_id}: {e}")
+                continue
+            self._stored[(kind, row_id)] = hash(data)
+        logger.info(f"Персистентность: загружено {kind}_data — {len(result)}")
+        return result
+
+    @staticmethod
+    async def _fetch_tuples(cursor) -> list[tuple]:
+        # На 100k строк aiosqlite.Row заметно дороже обычных кортежей; fetchall —
+        # один переход в поток aiosqlite вместо пачек по 64 строки
+        cursor.row_factory = None
+        return await cursor.fetchall()
+
+    def _stage(self, kind: str, row_id: int, data: dict):
+        if not data:
+            # Пустой словарь не храним: удаляем строку, если она была
+            if (kind, row_id) in self._stored:
+                self._pending[(kind, row_id)] = None
+            return
+        try:
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Персистентность: {kind}_data {row_id} не сериализуется, пропущено: {e}")
+            return
+        if self._stored.get((kind, row_id)) != hash(blob):
+            self._pending[(kind, row_id)] = blob
+
+    async def _flush_soon(self):
+        """Все update_* одного цикла PTB (asyncio.gather) ждут одну общую запись"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_after_batch())
+        await asyncio.shield(self._flush_task)
+
+    async def _flush_after_batch(self):
+        try:
+            # Задача запускается после остальных корутин того же gather — они успевают
+            # положить свои изменения в буфер
+            await asyncio.sleep(0)
+        finally:
+            # Изменения, пришедшие во время записи, уйдут следующей
+            self._flush_task = None
+        await self._write()
+
+    async def _write(self):
+        if not self._pending and not self._pending_conversations:
+            return
+        pending, self._pending = self._pending, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        now = datetime.utcnow().isoformat()
+        started = time.perf_counter()
+
+        try:
+            async with self.db.pool.write() as db:
+                for kind, (table, column) in _TABLES.items():
+                    upserts = [(row_id, blob, now) for (k, row_id), blob in pending.items() if k == kind and blob]
+                    deletes = [(row_id,) for (k, row_id), blob in pending.items() if k == kind and blob is None]
+                    if upserts:
+                        await db.executemany(
+                            f"INSERT INTO {table} ({column}, data, updated_at) VALUES (?, ?, ?) "
+                            f"ON CONFLICT({column}) DO UPDATE SET "
+                            f"data = excluded.data, updated_at = excluded.updated_at",
+                            upserts,
+                        )
+                    if deletes:
+                        await db.executemany(f"DELETE FROM {table} WHERE {column} = ?", deletes)
+
+                conv_upserts = [(name, key, blob, now) for (name, key), blob in conversations.items() if blob]
+                conv_deletes = [(name, key) for (name, key), blob in conversations.items() if blob is None]
+                if conv_upserts:
+                    await db.executemany(
+                        "INSERT INTO persistence_conversations (name, key, state, updated_at) "
+                        "VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(name, key) DO UPDATE SET "
+                        "state = excluded.state, updated_at = excluded.updated_at",
+                        conv_upserts,
+                    )
+                if conv_deletes:
+                    await db.executemany(
+                        "DELETE FROM persistence_conversations WHERE name = ? AND key = ?", conv_deletes
+                    )
+        except Exception:
+            # Вернуть в буфер (более свежие изменения, пришедшие во время записи, важнее)
+            self._pending = {**pending, **self._pending}
+            self._pending_conversations = {**conversations, **self._pending_conversations}
+            raise
+
+        for (kind, row_id), blob in pending.items():
+            if blob is None:
+                self._stored.pop((kind, row_id), None)
+            else:
+                self._stored[(kind, row_id)] = hash(blob)
+        for (name, key), blob in conversations.items():
+            if blob is None:
+                self._stored.pop(("conv", name, key), None)
+            else:
+                self._stored[("conv", name, key)] = hash(blob)
+
+        self.rows_written += len(pending) + len(conversations)
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
@@ -0,0 +1,213 @@
+"""Ограничение исходящих запросов к Bot API: общий и початовый лимиты, приоритеты, RetryAfter"""
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Any, Callable, Coroutine, Optional, Union
+
+from loguru import logger
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from parserhub.metrics import TELEGRAM_FLOOD_WAITS, TELEGRAM_REQUESTS
+
+
+class Priority(IntEnum):
+    """Полоса очереди (передаётся в rate_limit_args методов бота)"""
+    INTERACTIVE = 0  # ответы на действия пользователя — по умолчанию
+    BACKGROUND = 1   # результаты фоновых поисков, прогресс
+    BULK = 2         # массовые рассылки
+
+
+class TokenBucket:
+    """Ведро токенов в форме GCRA: reserve() сразу бронирует слот и возвращает,
+    сколько ждать до него — одновременные запросы получают последовательные слоты.
+    """
+
+    __slots__ = ("interval", "window", "_tat")
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1 / rate
+        self.window = (max(burst, 1) - 1) * self.interval
+        self._tat = 0.0  # theoretical arrival time следующего запроса
+
+    def delay(self, now: float) -> float:
+        return max(0.0, max(self._tat, now) - self.window - now)
+
+    def reserve(self, now: float) -> float:
+        delay = self.delay(now)
+        self._tat = max(self._tat, now) + self.interval
+        return delay
+
+    def idle(self, now: float) -> bool:
+        """Ведро полное — его можно выбросить и создать заново без потери лимита"""
+        return self._tat <= now
+
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Все запросы бота к Bot API проходят через два ограничения:
+
+    - початовое ведро (chat_id из запроса): личные чаты ~1 сообщение/сек,
+      группы ~20 сообщений/мин — ожидание в одном чате не задерживает другие;
+    - общее ведро (~30 запросов/сек) с приоритетными полосами: свободный слот
+      получает самый приоритетный ожидающий запрос (Priority в rate_limit_args).
+
+    RetryAfter от Telegram приостанавливает отправку целиком на указанное время,
+    запрос повторяется до max_retries раз. get_updates PTB не ограничивает.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        burst: int = 3,
+        max_retries: int = 3,
+    ):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rate, burst=max(int(global_rate), 1))
+        self._chats: dict[Union[int, str], TokenBucket] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []  # (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+
+        # Метрики
+        self._queued = {priority: 0 for priority in Priority}
+        self.sent = 0
+        self.flood_waits = 0
+        self._acquired = 0
+        self._delay_total = 0.0
+        self._delay_max = 0.0
+
+    async def initialize(self) -> None:
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+        stats = self.stats()
+        logger.info(
+            f"Лимитер исходящих остановлен: отправлено {stats['sent']}, "
+            f"flood wait {stats['flood_waits']}, макс. задержка {stats['delay_max']:.1f} с"
+        )
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        priority = Priority(rate_limit_args) if rate_limit_args is not None else Priority.INTERACTIVE
+        chat_id = data.get("chat_id")
+
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            self._queued[priority] += 1
+            try:
+                await self._acquire(chat_id, priority)
+            finally:
+                self._queued[priority] -= 1
+            self._record_delay(time.monotonic() - queued_at)
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.flood_waits += 1
+                TELEGRAM_FLOOD_WAITS.inc(endpoint)
+                retry_after = _seconds(e.retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(
+                    f"Flood wait {retry_after:.0f} с на {endpoint} (chat {chat_id}), "
+                    f"повтор {attempt + 1}/{self.max_retries}"
+                )
+                continue
+            self.sent += 1
+            TELEGRAM_REQUESTS.inc(endpoint, priority.name.lower())
+            return result
+
+    def stats(self) -> dict:
+        """Метрики: глубина очереди по полосам, отправлено, flood wait, задержка в очереди (сек)"""
+        acquired = self._acquired or 1
+        return {
+            "queued": {priority.name.lower(): n for priority, n in self._queued.items()},
+            "sent": self.sent,
+            "flood_waits": self.flood_waits,
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            "delay_avg": self._delay_total / acquired,
+            "delay_max": self._delay_max,
+        }
+
+    # ===== Внутреннее =====
+
+    async def _acquire(self, chat_id: Union[int, str, None], priority: Priority):
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+
+        if self._dispatcher is None:
+            await self.initialize()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 10_000:
+                now = time.monotonic()
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle(now)}
+            # Отрицательный id (или @username канала) — группа/канал
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, burst=self.burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch_loop(self):
+        """Выдаёт слоты общего ведра ожидающим запросам в порядке приоритета"""
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            wait = max(self._paused_until - now, self._global.delay(now))
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # запрос отменён, пока ждал
+                continue
+            self._global.reserve(now)
+            future.set_result(None)
+
+    def _record_delay(self, delay: float):
+        self._acquired += 1
+        self._delay_total += delay
+        self._delay_max = max(self._delay_max, delay)
+
+
+def _seconds(retry_after) -> float:
+    # PTB 21.x отдаёт int, более новые версии — timedelta
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
@@ -0,0 +1,166 @@
+"""Массовая проверка в ЧС: разбор загруженного списка кандидатов и итоговый отчёт"""
+import csv
+import io
+import re
+from typing import NamedTuple, Optional
+
+from parserhub.services.blacklist_cache import blacklist_cache_key
+from parserhub.validators import Validators
+
+
+_SEPARATORS = re.compile(r"[;,\t]")
+_TAGS = re.compile(r"<[^>]+>")
+
+_MATCH_LABELS = {
+    "username": "по никнейму",
+    "user_id": "по User ID",
+    "fio": "по ФИО",
+}
+
+
+class Candidate(NamedTuple):
+    username: Optional[str]
+    fio: Optional[str]
+
+    @property
+    def key(self) -> str:
+        return blacklist_cache_key(username=self.username, fio=self.fio)
+
+    def as_dict(self) -> dict:
+        return {"username": self.username, "fio": self.fio}
+
+
+class InvalidLine(NamedTuple):
+    line_no: int
+    text: str
+    error: str
+
+
+class ParsedList(NamedTuple):
+    candidates: list[Candidate]
+    invalid: list[InvalidLine]
+    duplicates: int
+
+
+def decode_upload(data: bytes) -> str:
+    """Текст загруженного файла: UTF-8 (в т.ч. с BOM от Excel), иначе cp1251"""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1251", errors="replace")
+
+
+def _plain(error: str) -> str:
+    return " ".join(_TAGS.sub("", error).split())
+
+
+def _parse_line(line: str) -> tuple[Optional[Candidate], Optional[str]]:
+    parts = [p.strip() for p in _SEPARATORS.split(line)]
+    if len(parts) > 2:
+        return None, "ожидается «никнейм;ФИО», «никнейм» или «ФИО»"
+
+    if len(parts) == 1:
+        value = parts[0]
+        # Одно поле: кириллица — ФИО, иначе никнейм
+        if not value.startswith("@"):
+            valid, fio, _ = Validators.validate_fio(value)
+            if valid:
+                return Candidate(None, fio), None
+        valid, username, error = Validators.validate_username(value)
+        return (Candidate(username, None), None) if valid else (None, _plain(error))
+
+    raw_username, raw_fio = parts
+    username = fio = None
+    if raw_username:
+        valid, username, error = Validators.validate_username(raw_username)
+        if not valid:
+            return None, _plain(error)
+    if raw_fio:
+        valid, fio, error = Validators.validate_fio(raw_fio)
+        if not valid:
+            return None, _plain(error)
+    if not username and not fio:
+        return None, "пустая строка"
+    return Candidate(username, fio), None
+
+
+def parse_candidates(text: str, limit: int) -> ParsedList:
+    """Разобрать список кандидатов: по одному на строку, «никнейм;ФИО», «никнейм» или «ФИО».
+
+    Разделитель — «;», «,» или табуляция. Пустые строки, строки-комментарии (#) и
+    строка-заголовок CSV пропускаются. Дубликаты (с точностью до регистра, «@» и «ё»)
+    отбрасываются. Строки сверх limit попадают в invalid.
+    """
+    candidates: list[Candidate] = []
+    invalid: list[InvalidLine] = []
+    seen: set[str] = set()
+    duplicates = 0
+
+    for line_no, raw in enumerate(text.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line_no == 1 and re.search(r"username|никнейм|фио", line, re.IGNORECASE):
+            continue
+
+        candidate, error = _parse_line(line)
+        if candidate is None:
+            invalid.append(InvalidLine(line_no, line, error))
+            continue
+        if candidate.key in seen:
+            duplicates += 1
+            continue
+        if len(candidates) >= limit:
+            invalid.append(InvalidLine(line_no, line, f"превышен лимит {limit} кандидатов"))
+            continue
+
+        seen.add(candidate.key)
+        candidates.append(candidate)
+
+    return ParsedList(candidates, invalid, duplicates)
+
+
+def _similar_label(result: dict) -> str:
+    """Похожие ФИО из локального индекса для строки «не найден»"""
+    similar = ", ".join(
+        f"{c.get('full_name') or '—'} {c['score']:.0%}" for c in result.get("candidates") or []
+    )
+    return f"похожие записи: {similar}" if similar else ""
+
+
+def build_report(
+    candidates: list[Candidate], results: list[dict], invalid: list[InvalidLine]
+) -> bytes:
+    """CSV-отчёт (UTF-8 с BOM, разделитель «;» — открывается в Excel без настройки)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow([
+        "Никнейм", "ФИО", "Результат", "Совпадение", "Username в ЧС", "Телефон", "User ID", "Текст записи",
+    ])
+
+    for candidate, result in zip(candidates, results):
+        if result.get("found"):
+            info = result.get("extracted_info") or {}
+            writer.writerow([
+                candidate.username or "",
+                candidate.fio or "",
+                "НАЙДЕН",
+                _MATCH_LABELS.get(result.get("match_type", ""), ""),
+                info.get("username", ""),
+                info.get("phone", ""),
+                info.get("user_id", ""),
+                result.get("message_text", "") or "",
+            ])
+        elif result.get("error"):
+            writer.writerow([
+                candidate.username or "", candidate.fio or "", f"ошибка: {result['error']}", "", "", "", "", "",
+            ])
+        else:
+            writer.writerow([
+                candidate.username or "", candidate.fio or "", "не найден", _similar_label(result), "", "", "", "",
+            ])
+
+    for line in invalid:
+        writer.writerow([line.text, "", f"строка {line.line_no} пропущена: {line.error}", "", "", "", "", ""])
+
+    return buffer.getvalue().encode("utf-8-sig")
@@ -0,0 +1,119 @@
+"""Персистентный кэш результатов проверки в чёрном списке"""
+import json
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from loguru import logger
+
+from parserhub.db_pool import ConnectionPool
+
+
+class CachedResult(NamedTuple):
+    result: dict
+    cached_at: datetime
+
+
+def _normalize_username(username: Optional[str]) -> str:
+    return (username or "").strip().lstrip("@").lower()
+
+
+def _normalize_fio(fio: Optional[str]) -> str:
+    return " ".join((fio or "").lower().replace("ё", "е").split())
+
+
+def blacklist_cache_key(
+    username: Optional[str] = None,
+    fio: Optional[str] = None,
+    item_id: Optional[int] = None,
+) -> str:
+    """Ключ кэша: никнейм + ФИО для ручной проверки, item_id — для проверки из уведомления.
+
+    «@Ivan» и «ivan», «Ёлкин  Пётр» и «елкин петр» дают один и тот же ключ.
+    """
+    if item_id is not None:
+        return f"item:{item_id}"
+    return f"u:{_normalize_username(username)}|f:{_normalize_fio(fio)}"
+
+
+def checked_username_key(result: dict) -> Optional[str]:
+    """Ключ ручной проверки по никнейму для результата проверки автора объявления.
+
+    В ответе проверки по item_id поля username / user_id верхнего уровня — это
+    проверенный автор (данные записи ЧС лежат в extracted_info). По item_id автор
+    заранее неизвестен, поэтому результат кладётся и под ключ его никнейма — чтобы
+    ручная проверка того же кандидата ответила из кэша. Без никнейма (только
+    user_id) ключа нет: ручная проверка по user_id не выполняется.
+    """
+    username = _normalize_username(result.get("username"))
+    return blacklist_cache_key(username=username) if username else None
+
+
+class BlacklistCache:
+    """Результаты поиска в ЧС в таблице blacklist_cache (переживают рестарт бота).
+
+    Кэшируются только успешные проверки. Весь кэш сбрасывается при изменении
+    списка чатов ЧС — результат зависит от того, какие чаты сканировались.
+    """
+
+    def __init__(self, pool: ConnectionPool, ttl: float = 6 * 60 * 60):
+        self.pool = pool
+        # ttl <= 0 — кэш выключен
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[CachedResult]:
+        """Неистёкший результат по ключу или None"""
+        if self.ttl <= 0:
+            return None
+
+        async with self.pool.read() as db:
+            async with db.execute(
+                "SELECT result, created_at FROM blacklist_cache WHERE key = ? AND expires_at > ?",
+                (key, datetime.utcnow().isoformat()),
+            ) as cursor:
+                row = await cursor.fetchone()
+
+        if not row:
+            return None
+        return CachedResult(json.loads(row["result"]), datetime.fromisoformat(row["created_at"]))
+
+    async def put(self, key: str, result: dict):
+        """Сохранить результат проверки (перезаписывает старый)"""
+        if self.ttl <= 0:
+            return
+
+        now = datetime.utcnow()
+        async with self.pool.write() as db:
+            await db.execute(
+                """
+                INSERT INTO blacklist_cache (key, result, created_at, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    result = excluded.result,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at
+                """,
+                (
+                    key,
+                    json.dumps(result, ensure_ascii=False),
+                    now.isoformat(),
+                    (now + timedelta(seconds=self.ttl)).isoformat(),
+                ),
+            )
+
+    async def clear(self) -> int:
+        """Сбросить весь кэш (изменился список чатов ЧС)"""
+        async with self.pool.write() as db:
+            cursor = await db.execute("DELETE FROM blacklist_cache")
+            removed = cursor.rowcount
+
+        if removed:
+            logger.info(f"Кэш результатов ЧС сброшен: {removed} записей")
+        return removed
+
+    async def delete_expired(self) -> int:
+        """Удалить истёкшие записи"""
+        async with self.pool.write() as db:
+            cursor = await db.execute(
+                "DELETE FROM blacklist_cache WHERE expires_at <= ?",
+                (datetime.utcnow().isoformat(),),
+            )
+            return cursor.rowcount
@@ -0,0 +1,441 @@
+"""Локальный индекс записей чёрного списка (зеркало workers_service в bot.db)"""
+from datetime import datetime
+from typing import Optional
+from loguru import logger
+
+from parserhub.api_client import WorkersAPI
+from parserhub.db_pool import ConnectionPool
+from parserhub.services.fio_matcher import min_shared_trigrams, name_stems, similarity, trigrams
+
+
+_CURSOR_KEY = "blacklist_index_cursor"
+# Версия правил fio_matcher, по которым построены основы ФИО в bot.db. При изменении
+# правил увеличить — sync пересоберёт основы всех записей
+_FIO_STEMS_KEY = "blacklist_fio_stems_version"
+_FIO_STEMS_VERSION = "1"
+# Основа-кандидат должна быть похожа на слово запроса хотя бы настолько
+_STEM_SIMILARITY = 0.5
+# С какой оценкой lookup предлагает похожие записи: падежные/родовые формы дают 1.0,
+# одна опечатка в ФИО из трёх слов — ~0.85
+_FUZZY_LOOKUP_SCORE = 0.8
+# Сколько записей-кандидатов читать по ведущему слову запроса: похожие основы
+# берутся по убыванию сходства, пока их постинги укладываются в бюджет
+_CANDIDATE_BUDGET = 1000
+
+
+def fold(text: Optional[str]) -> str:
+    """Нижний регистр и ё → е — так текст хранится в FTS и так же сворачивается запрос"""
+    return (text or "").lower().replace("ё", "е")
+
+
+def _normalize_username(username: Optional[str]) -> Optional[str]:
+    username = (username or "").strip().lstrip("@").lower()
+    return username or None
+
+
+class BlacklistIndex:
+    """Записи ЧС (username, user_id, телефон, ФИО → ссылка на сообщение) в SQLite + FTS5.
+
+    Наполняется дельтами из GET /blacklist/records/changes (sync). Совпадение в индексе
+    отвечается локально за миллисекунды; отсутствие совпадения ничего не доказывает —
+    такой запрос уходит на живое сканирование чатов.
+    """
+
+    def __init__(self, pool: ConnectionPool, synced_elsewhere: bool = False):
+        self.pool = pool
+        # Индекс отвечает на запросы только после хотя бы одной успешной синхронизации
+        self.ready = False
+        # Синхронизирует другой процесс (шард 0): готовность — по сохранённому курсору
+        self.synced_elsewhere = synced_elsewhere
+        self.synced_at: Optional[datetime] = None
+
+    # ===== Синхронизация =====
+
+    async def sync(self, workers_api: WorkersAPI, page_size: int = 1000) -> int:
+        """Догрузить изменения с сохранённого курсора
+
+        Каждая страница применяется одной транзакцией вместе с новым курсором —
+        прерванная синхронизация продолжается с последней применённой страницы.
+
+        Returns:
+            Число применённых изменений; 0, если сервис не отдаёт ленту изменений
+        """
+        applied = 0
+        cursor = await self._get_cursor()
+        await self._ensure_fio_terms()
+
+        while True:
+            page = await workers_api.get_blacklist_changes(cursor, limit=page_size)
+            if page is None:
+                return 0
+
+            records = page.get("records", [])
+            async with self.pool.write() as db:
+                if page.get("reset"):
+                    # Сервис пересобрал ленту (например, сменился список чатов) — начинаем с нуля
+                    await db.execute("DELETE FROM blacklist_records")
+                    await db.execute("DELETE FROM blacklist_fts")
+                    await db.execute("DELETE FROM blacklist_fio_terms")
+                    await db.execute("DELETE FROM blacklist_fio_trigrams")
+                for record in records:
+                    await self._apply(db, record)
+                cursor = page.get("cursor", cursor)
+                await db.execute(
+                    "INSERT INTO global_config (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (_CURSOR_KEY, cursor),
+                )
+            applied += len(records)
+
+            if not page.get("has_more"):
+                break
+
+        self.ready = True
+        self.synced_at = datetime.utcnow()
+        if applied:
+            logger.info(f"Индекс ЧС синхронизирован: {applied} изменений")
+        return applied
+
+    async def _ensure_fio_terms(self):
+        """Пересобрать основы ФИО, если они построены другой версией правил (или ещё не строились)"""
+        async with self.pool.read() as db:
+            async with db.execute(
+                "SELECT value FROM global_config WHERE key = ?", (_FIO_STEMS_KEY,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row and row[0] == _FIO_STEMS_VERSION:
+            return
+
+        async with self.pool.write() as db:
+            await db.execute("DELETE FROM blacklist_fio_terms")
+            await db.execute("DELETE FROM blacklist_fio_trigrams")
+            async with db.execute(
+                "SELECT id, full_name FROM blacklist_records WHERE full_name IS NOT NULL"
+            ) as cursor:
+                rows = await cursor.fetchall()
+            for rowid, full_name in rows:
+                await self._index_fio(db, rowid, full_name)
+            await db.execute(
+                "INSERT INTO global_config (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (_FIO_STEMS_KEY, _FIO_STEMS_VERSION),
+            )
+        if rows:
+            logger.info(f"Основы ФИО индекса ЧС пересобраны: {len(rows)} записей")
+
+    async def _get_cursor(self) -> Optional[str]:
+        async with self.pool.read() as db:
+            async with db.execute(
+                "SELECT value FROM global_config WHERE key = ?", (_CURSOR_KEY,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    async def _apply(db, record: dict):
+        if record.get("deleted"):
+            async with db.execute(
+                "DELETE FROM blacklist_records WHERE record_id = ? RETURNING id", (str(record["id"]),)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row:
+                await db.execute("DELETE FROM blacklist_fts WHERE rowid = ?", (row[0],))
+                await db.execute("DELETE FROM blacklist_fio_terms WHERE record_id = ?", (row[0],))
+            return
+
+        async with db.execute(
+            """
+            INSERT INTO blacklist_records
+                (record_id, chat, message_link, username, user_id, phone, full_name, message_text, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(record_id) DO UPDATE SET
+                chat = excluded.chat,
+                message_link = excluded.message_link,
+                username = excluded.username,
+                user_id = excluded.user_id,
+                phone = excluded.phone,
+                full_name = excluded.full_name,
+                message_text = excluded.message_text,
+                updated_at = excluded.updated_at
+            RETURNING id
+            """,
+            (
+                str(record["id"]),
+                record.get("chat"),
+                record.get("message_link"),
+                _normalize_username(record.get("username")),
+                record.get("user_id"),
+                record.get("phone"),
+                record.get("full_name"),
+                record.get("message_text"),
+                record.get("updated_at") or datetime.utcnow().isoformat(),
+            ),
+        ) as cursor:
+            rowid = (await cursor.fetchone())[0]
+
+        await db.execute("DELETE FROM blacklist_fts WHERE rowid = ?", (rowid,))
+        await db.execute(
+            "INSERT INTO blacklist_fts (rowid, full_name, message_text) VALUES (?, ?, ?)",
+            (rowid, fold(record.get("full_name")), fold(record.get("message_text"))),
+        )
+
+        await db.execute("DELETE FROM blacklist_fio_terms WHERE record_id = ?", (rowid,))
+        await BlacklistIndex._index_fio(db, rowid, record.get("full_name"))
+
+    @staticmethod
+    async def _index_fio(db, rowid: int, full_name: Optional[str]):
+        # Основы ФИО для нечёткого поиска. Словарь триграмм только пополняется:
+        # основа без постингов просто не даёт кандидатов
+        stems = name_stems(full_name)
+        await db.executemany(
+            "INSERT OR IGNORE INTO blacklist_fio_terms (stem, record_id) VALUES (?, ?)",
+            [(stem, rowid) for stem in stems],
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO blacklist_fio_trigrams (trigram, stem) VALUES (?, ?)",
+            [(gram, stem) for stem in stems for gram in trigrams(stem)],
+        )
+
+    # ===== Поиск =====
+
+    async def lookup(self, username: Optional[str] = None, fio: Optional[str] = None) -> Optional[dict]:
+        """Совпадение в локальном индексе: по никнейму, по всем словам ФИО,
+        затем похожие ФИО (другой падеж/род, опечатка)
+
+        Returns:
+            Точное совпадение — результат в формате проверки workers_service (found,
+            match_type, extracted_info, message_text, message_link, chat).
+            Только похожие ФИО — {"found": False, "score", "candidates"}: это не
+            находка, живой поиск всё равно нужен. Иначе None
+        """
+        if not self.ready and self.synced_elsewhere:
+            self.ready = await self._get_cursor() is not None
+        if not self.ready:
+            return None
+
+        steps = []
+        async with self.pool.read() as db:
+            username = _normalize_username(username)
+            if username:
+                steps.append("username")
+                async with db.execute(
+                    "SELECT * FROM blacklist_records WHERE username = ? ORDER BY updated_at DESC LIMIT 1",
+                    (username,),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row:
+                    return self._result(row, "username", steps)
+
+            tokens = fold(fio).split()
+            if tokens:
+                steps.append("fio")
+                query = " AND ".join(f'"{token}"' for token in tokens)
+                async with db.execute(
+                    """
+                    SELECT r.* FROM blacklist_fts f
+                    JOIN blacklist_records r ON r.id = f.rowid
+                    WHERE blacklist_fts MATCH ?
+                    ORDER BY f.rank
+                    LIMIT 1
+                    """,
+                    (query,),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row:
+                    return self._result(row, "fio", steps)
+
+                steps.append("fio_fuzzy")
+                # Сначала только точные основы (другой падеж/род) — это дёшево;
+                # триграммное расширение словаря нужно лишь для опечаток
+                ranked = (
+                    await self._search_fio(db, fio, 5, _FUZZY_LOOKUP_SCORE, typos=False)
+                    or await self._search_fio(db, fio, 5, _FUZZY_LOOKUP_SCORE)
+                )
+                if ranked:
+                    return {
+                        "found": False,
+                        "source": "index",
+                        "steps_done": steps,
+                        "score": ranked[0][1],
+                        "candidates": [self._candidate(r, s) for r, s in ranked],
+                    }
+
+        return None
+
+    async def search_fio(self, fio: str, limit: int = 10, min_score: float = 0.6) -> list[dict]:
+        """Нечёткий поиск по ФИО записей
+
+        Оценка записи — среднее по словам запроса лучшего триграммного сходства
+        с основами её ФИО (fio_matcher): «Иванову Ивану» совпадает с «Иванов Иван»
+        на 1.0, «Ивонов Иван Петрович» — на ~0.85.
+
+        Returns:
+            Кандидаты по убыванию оценки: record_id, full_name, message_link, score
+        """
+        async with self.pool.read() as db:
+            ranked = await self._search_fio(db, fio, limit, min_score)
+        return [self._candidate(row, score) for row, score in ranked]
+
+    @staticmethod
+    async def _search_fio(
+        db, fio: Optional[str], limit: int, min_score: float, typos: bool = True
+    ) -> list[tuple]:
+        query_stems = name_stems(fio)
+        if not query_stems:
+            return []
+
+        # 1. Ведущее слово запроса — самое редкое в индексе: основы без точных совпадений
+        #    (опечатка или редкая фамилия) идут первыми, частые имена и отчества — последними
+        async with db.execute(
+            f"""
+            SELECT stem, COUNT(*) FROM blacklist_fio_terms
+            WHERE stem IN ({", ".join("?" * len(query_stems))})
+            GROUP BY stem
+            """,
+            query_stems,
+        ) as cursor:
+            counts = dict(await cursor.fetchall())
+        if not typos and len(counts) < len(query_stems):
+            return []
+        order = sorted(query_stems, key=lambda stem: (counts.get(stem, 0), -len(stem)))
+
+        # 2. Похожие основы словаря для ведущего слова {stem: сходство}: SQL отсекает
+        #    по числу общих триграмм, точное сходство считается в Python
+        driver, expansion = None, {}
+        for query_stem in order:
+            if not typos:
+                driver, expansion = query_stem, {query_stem: 1.0}
+                break
+            grams = sorted(trigrams(query_stem))
+            async with db.execute(
+                f"""
+                SELECT stem FROM blacklist_fio_trigrams
+                WHERE trigram IN ({", ".join("?" * len(grams))})
+                GROUP BY stem
+                HAVING COUNT(*) >= ?
+                """,
+                (*grams, min_shared_trigrams(query_stem, _STEM_SIMILARITY)),
+            ) as cursor:
+                for (stem,) in await cursor.fetchall():
+                    score = similarity(query_stem, stem)
+                    if score >= _STEM_SIMILARITY:
+                        expansion[stem] = score
+            if expansion:
+                driver = query_stem
+                break
+        if not expansion:
+            return []
+
+        # 3. Кандидаты — записи с основой, похожей на ведущее слово, вместе со всеми их основами.
+        #    Частая основа (имя, отчество), похожая на редкую фамилию, не должна тянуть
+        #    за собой половину индекса — отсюда бюджет кандидатов
+        async with db.execute(
+            f"""
+            SELECT stem, COUNT(*) FROM blacklist_fio_terms
+            WHERE stem IN ({", ".join("?" * len(expansion))})
+            GROUP BY stem
+            """,
+            tuple(expansion),
+        ) as cursor:
+            postings = dict(await cursor.fetchall())
+        selected, total = [], 0
+        for stem in sorted(postings, key=lambda stem: -expansion[stem]):
+            if selected and total + postings[stem] > _CANDIDATE_BUDGET:
+                break
+            selected.append(stem)
+            total += postings[stem]
+        if not selected:
+            return []
+        if total > _CANDIDATE_BUDGET and set(counts) == set(query_stems):
+            # Все слова запроса частые и есть в индексе как есть («Иванов Иван») —
+            # читать десятки тысяч кандидатов незачем, хватит точного пересечения
+            return await BlacklistIndex._exact_fio(db, order, limit)
+
+        async with db.execute(
+            f"""
+            SELECT record_id, stem FROM blacklist_fio_terms
+            WHERE record_id IN (
+                SELECT record_id FROM blacklist_fio_terms WHERE stem IN ({", ".join("?" * len(selected))})
+            )
+            """,
+            selected,
+        ) as cursor:
+            terms: dict[int, list[str]] = {}
+            for record_id, stem in await cursor.fetchall():
+                terms.setdefault(record_id, []).append(stem)
+
+        # 4. Оценка: лучшее сходство на каждое слово запроса, среднее по словам.
+        #    Сходство считается один раз на пару (слово запроса, основа кандидатов)
+        vocabulary = {stem for stems in terms.values() for stem in stems}
+        tables = [
+            {stem: expansion.get(stem, 0.0) for stem in vocabulary} if query_stem == driver
+            else {stem: similarity(query_stem, stem) for stem in vocabulary}
+            for query_stem in query_stems
+        ]
+        threshold = min_score * len(query_stems) - 1e-9
+        scored = []
+        for record_id, stems in terms.items():
+            total = sum(max(map(table.__getitem__, stems)) for table in tables)
+            if total >= threshold:
+                scored.append((round(total / len(query_stems), 3), record_id))
+        scored.sort(reverse=True)
+        scored = scored[:limit]
+        if not scored:
+            return []
+
+        async with db.execute(
+            f"SELECT * FROM blacklist_records WHERE id IN ({', '.join('?' * len(scored))})",
+            tuple(record_id for _, record_id in scored),
+        ) as cursor:
+            rows = {row["id"]: row for row in await cursor.fetchall()}
+        return [(rows[record_id], score) for score, record_id in scored]
+
+    @staticmethod
+    async def _exact_fio(db, stems: list[str], limit: int) -> list[tuple]:
+        """Записи, содержащие все основы stems (первая — самая редкая: по ней идёт перебор)"""
+        joins = "".join(
+            f" JOIN blacklist_fio_terms t{i} ON t{i}.record_id = t0.record_id AND t{i}.stem = ?"
+            for i in range(1, len(stems))
+        )
+        async with db.execute(
+            f"""
+            SELECT r.* FROM blacklist_fio_terms t0{joins}
+            JOIN blacklist_records r ON r.id = t0.record_id
+            WHERE t0.stem = ?
+            LIMIT ?
+            """,
+            (*stems[1:], stems[0], limit),
+        ) as cursor:
+            return [(row, 1.0) for row in await cursor.fetchall()]
+
+    @staticmethod
+    def _candidate(row, score: float) -> dict:
+        return {
+            "record_id": row["record_id"],
+            "full_name": row["full_name"],
+            "message_link": row["message_link"],
+            "score": score,
+        }
+
+    @staticmethod
+    def _result(row, match_type: str, steps: list[str]) -> dict:
+        return {
+            "found": True,
+            "match_type": match_type,
+            "source": "index",
+            "steps_done": steps,
+            "chat": row["chat"],
+            "message_link": row["message_link"],
+            "message_text": row["message_text"],
+            "extracted_info": {
+                "username": f"@{row['username']}" if row["username"] else "—",
+                "user_id": row["user_id"] or "—",
+                "phone": row["phone"] or "—",
+                "full_name": row["full_name"],
+            },
+        }
+
+    async def count(self) -> int:
+        async with self.pool.read() as db:
+            async with db.execute("SELECT COUNT(*) FROM blacklist_records") as cursor:
+                return (await cursor.fetchone())[0]
@@ -0,0 +1,194 @@
+"""Очередь поисков в ЧС: общий лимит параллельных сканирований и честная очередность"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+
+
+class BlacklistJob:
+    __slots__ = ("id", "user_id", "factory", "queued_at", "started_at", "task")
+
+    def __init__(self, job_id: int, user_id: int, factory: Callable[[], Awaitable[None]]):
+        self.id = job_id
+        self.user_id = user_id
+        self.factory = factory
+        self.queued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+
+class BlacklistScheduler:
+    """Планировщик фоновых поисков в ЧС.
+
+    - одновременно выполняется не больше concurrency поисков;
+    - у пользователя не больше одного выполняющегося поиска (сессия ЧС у него одна),
+      остальные его запросы ждут в личной очереди глубиной user_queue;
+    - свободный слот получает следующий по кругу пользователь (round-robin), поэтому
+      пачка запросов одного пользователя не задерживает остальных.
+    """
+
+    def __init__(self, concurrency: int = 3, user_queue: int = 3):
+        self.concurrency = max(concurrency, 1)
+        self.user_queue = user_queue
+        self._ids = itertools.count(1)
+        self._queues: dict[int, deque[BlacklistJob]] = {}
+        self._order: deque[int] = deque()          # пользователи с очередью, порядок обхода
+        self._running: dict[int, BlacklistJob] = {}  # user_id → выполняющийся поиск
+
+        # Метрики
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._started = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    def submit(self, user_id: int, factory: Callable[[], Awaitable[None]]) -> Optional[BlacklistJob]:
+        """Поставить поиск в очередь (и сразу запустить, если есть свободный слот).
+
+        Returns:
+            BlacklistJob или None, если личная очередь пользователя заполнена
+        """
+        queue = self._queues.get(user_id)
+        if queue is not None and len(queue) >= self.user_queue:
+            self.rejected += 1
+            return None
+
+        job = BlacklistJob(next(self._ids), user_id, factory)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            self._order.append(user_id)
+        queue.append(job)
+        self._dispatch()
+        return job
+
+    def position(self, job: BlacklistJob) -> int:
+        """Сколько поисков запустится раньше этого (0 — уже выполняется)"""
+        if job.running:
+            return 0
+        queue = self._queues.get(job.user_id)
+        if not queue or job not in queue:
+            return 0
+
+        index = queue.index(job)
+        ahead = index
+        # При обходе по кругу до job успеют стартовать index (или index + 1, если
+        # пользователь раньше в порядке обхода) поисков каждого другого пользователя
+        before = True
+        for uid in self._order:
+            if uid == job.user_id:
+                before = False
+                continue
+            ahead += min(len(self._queues[uid]), index + 1 if before else index)
+        return ahead + 1
+
+    def pending(self, user_id: int) -> int:
+        """Число поисков пользователя в работе и в очереди"""
+        return len(self._queues.get(user_id, ())) + (1 if user_id in self._running else 0)
+
+    def cancel(self, user_id: int) -> int:
+        """Отменить все поиски пользователя — и ожидающие, и выполняющийся"""
+        cancelled = 0
+        queue = self._queues.pop(user_id, None)
+        if queue:
+            self._order.remove(user_id)
+            cancelled += len(queue)
+        job = self._running.get(user_id)
+        if job is not None and not job.task.done():
+            job.task.cancel()
+            cancelled += 1
+
+        self.cancelled += cancelled
+        return cancelled
+
+    def stats(self) -> dict:
+        """Метрики очереди: размер, время ожидания и выполнения (сек)"""
+        finished = self.completed or 1
+        started = self._started or 1
+        return {
+            "running": len(self._running),
+            "queued": sum(len(q) for q in self._queues.values()),
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+            "wait_avg": self._wait_total / started,
+            "wait_max": self._wait_max,
+            "run_avg": self._run_total / finished,
+            "run_max": self._run_max,
+        }
+
+    async def close(self):
+        """Отменить все поиски (вызывается в post_shutdown)"""
+        self._queues.clear()
+        self._order.clear()
+        tasks = [job.task for job in self._running.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _dispatch(self):
+        while len(self._running) < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            self._start(job)
+
+    def _next_job(self) -> Optional[BlacklistJob]:
+        # Первый по кругу пользователь без выполняющегося поиска; после запуска
+        # он уходит в конец порядка обхода
+        for _ in range(len(self._order)):
+            user_id = self._order.popleft()
+            if user_id in self._running:
+                self._order.append(user_id)
+                continue
+
+            queue = self._queues[user_id]
+            job = queue.popleft()
+            if queue:
+                self._order.append(user_id)
+            else:
+                del self._queues[user_id]
+            return job
+        return None
+
+    def _start(self, job: BlacklistJob):
+        job.started_at = time.monotonic()
+        self._started += 1
+        wait = job.started_at - job.queued_at
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+
+        self._running[job.user_id] = job
+        job.task = asyncio.create_task(job.factory())
+        job.task.add_done_callback(lambda _: self._on_done(job))
+
+    def _on_done(self, job: BlacklistJob):
+        self._running.pop(job.user_id, None)
+        run = time.monotonic() - job.started_at
+        if job.task.cancelled():
+            # Уже учтён в cancelled (или отменён при остановке) — в completed и время выполнения не идёт
+            logger.debug(f"Поиск в ЧС #{job.id} пользователя {job.user_id} отменён через {run:.1f} с")
+            self._dispatch()
+            return
+
+        self._run_total += run
+        self._run_max = max(self._run_max, run)
+        self.completed += 1
+
+        if job.task.exception() is not None:
+            logger.opt(exception=job.task.exception()).error(
+                f"Поиск в ЧС #{job.id} пользователя {job.user_id} завершился с ошибкой"
+            )
+        logger.debug(
+            f"Поиск в ЧС #{job.id} пользователя {job.user_id}: "
+            f"ожидание {job.started_at - job.queued_at:.1f} с, выполнение {run:.1f} с"
+        )
+        self._dispatch()
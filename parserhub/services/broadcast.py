@@ -0,0 +1,320 @@
+"""Рассылки админов: снимок получателей в БД, постраничная отправка, возобновление после рестарта"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+from loguru import logger
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, TelegramError
+
+from parserhub.db_pool import ConnectionPool
+from parserhub.rate_limiter import Priority
+
+
+AUDIENCES = {
+    "all": "Все пользователи",
+    "subs": "Платные подписчики",
+    "trials": "Пробный период",
+}
+
+# Выборка получателей: параметры — текущее время (ISO) столько раз, сколько «?» в запросе
+_AUDIENCE_SQL = {
+    "all": ("SELECT user_id FROM users", 0),
+    "subs": ("SELECT user_id FROM subscriptions WHERE active_until > ?", 1),
+    "trials": (
+        """
+        SELECT u.user_id FROM users u
+        WHERE u.trial_until > ?
+          AND NOT EXISTS (
+              SELECT 1 FROM subscriptions s
+              WHERE s.user_id = u.user_id AND s.active_until > ?
+          )
+        """,
+        2,
+    ),
+}
+
+# Кнопка остановки под сообщением о ходе рассылки (обработчик — handlers/admin.py)
+STOP_CALLBACK = "admin_bcast_stop_"  # + broadcast_id
+
+_COUNTERS = {"sent": "sent", "failed": "failed", "blocked": "blocked"}
+
+
+class BroadcastService:
+    """Состояние рассылок в bot.db (broadcasts, broadcast_recipients)"""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    async def count_audience(self, audience: str) -> int:
+        query, n_params = _AUDIENCE_SQL[audience]
+        now = datetime.utcnow().isoformat()
+        async with self.pool.read() as db:
+            async with db.execute(f"SELECT COUNT(*) FROM ({query})", (now,) * n_params) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def create(self, created_by: int, audience: str, text: str, report_chat_id: int) -> dict:
+        """Создать рассылку и снимок получателей одной транзакцией"""
+        query, n_params = _AUDIENCE_SQL[audience]
+        now = datetime.utcnow().isoformat()
+        async with self.pool.write() as db:
+            async with db.execute(
+                "INSERT INTO broadcasts (created_by, audience, text, report_chat_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?) RETURNING id",
+                (created_by, audience, text, report_chat_id, now),
+            ) as cursor:
+                broadcast_id = (await cursor.fetchone())[0]
+            cursor = await db.execute(
+                f"INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, user_id) "
+                f"SELECT ?, user_id FROM ({query})",
+                (broadcast_id, *(now,) * n_params),
+            )
+            total = cursor.rowcount
+            await db.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (total, broadcast_id))
+        logger.info(f"Рассылка #{broadcast_id} создана: {audience}, получателей {total}")
+        return await self.get(broadcast_id)
+
+    async def get(self, broadcast_id: int) -> Optional[dict]:
+        async with self.pool.read() as db:
+            async with db.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)) as cursor:
+                row = await cursor.fetchone()
+        return dict(row) if row else None
+
+    async def get_running(self) -> list[dict]:
+        async with self.pool.read() as db:
+            async with db.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id") as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def pending_page(self, broadcast_id: int, after_user_id: int, limit: int) -> list[int]:
+        """Следующая страница неотправленных получателей (keyset по user_id).
+
+        Пустая, если рассылку уже остановили — в том числе из другого процесса (шарда)
+        """
+        async with self.pool.read() as db:
+            async with db.execute(
+                """
+                SELECT user_id FROM broadcast_recipients
+                WHERE broadcast_id = ? AND status = 'pending' AND user_id > ?
+                  AND EXISTS (SELECT 1 FROM broadcasts WHERE id = ? AND status = 'running')
+                ORDER BY user_id
+                LIMIT ?
+                """,
+                (broadcast_id, after_user_id, broadcast_id, limit),
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def save_results(self, broadcast_id: int, results: list[tuple[int, str, Optional[str]]]):
+        """Записать статусы получателей [(user_id, status, error)] и счётчики рассылки"""
+        counts = {column: 0 for column in _COUNTERS.values()}
+        for _, status, _ in results:
+            counts[_COUNTERS[status]] += 1
+        async with self.pool.write() as db:
+            await db.executemany(
+                "UPDATE broadcast_recipients SET status = ?, error = ? "
+                "WHERE broadcast_id = ? AND user_id = ? AND status = 'pending'",
+                [(status, error, broadcast_id, user_id) for user_id, status, error in results],
+            )
+            await db.execute(
+                "UPDATE broadcasts SET sent = sent + ?, failed = failed + ?, blocked = blocked + ? "
+                "WHERE id = ?",
+                (counts["sent"], counts["failed"], counts["blocked"], broadcast_id),
+            )
+
+    async def finish(self, broadcast_id: int, status: str) -> bool:
+        """Перевести идущую рассылку в конечный статус; False — она уже не идёт"""
+        async with self.pool.write() as db:
+            cursor = await db.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                (status, datetime.utcnow().isoformat(), broadcast_id),
+            )
+            return cursor.rowcount > 0
+
+
+class BroadcastManager:
+    """Фоновые задачи рассылок.
+
+    Получатели читаются страницами по page_size, внутри страницы одновременно
+    отправляется не больше concurrency сообщений — через полосу Priority.BULK
+    лимитера исходящих, поэтому ответы пользователям идут раньше рассылки.
+    Статусы страницы записываются одной транзакцией; после рестарта рассылка
+    продолжается с неотправленных (повторно может уйти только прерванная страница).
+    """
+
+    def __init__(
+        self,
+        service: BroadcastService,
+        concurrency: int = 20,
+        page_size: int = 100,
+        progress_interval: float = 5.0,
+    ):
+        self.service = service
+        self.concurrency = max(concurrency, 1)
+        self.page_size = page_size
+        self.progress_interval = progress_interval
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._rates: dict[int, float] = {}  # broadcast_id → сообщений/сек в текущем запуске
+
+    def running(self) -> list[int]:
+        return list(self._tasks)
+
+    def rate(self, broadcast_id: int) -> float:
+        return self._rates.get(broadcast_id, 0.0)
+
+    def start(self, bot: Bot, broadcast: dict, resumed: bool = False) -> asyncio.Task:
+        broadcast_id = broadcast["id"]
+        task = asyncio.create_task(self._run(bot, broadcast, resumed))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._forget(broadcast_id, task))
+        return task
+
+    async def resume(self, bot: Bot) -> int:
+        """Продолжить рассылки, прерванные остановкой бота"""
+        broadcasts = await self.service.get_running()
+        for broadcast in broadcasts:
+            if broadcast["id"] not in self._tasks:
+                self.start(bot, broadcast, resumed=True)
+        if broadcasts:
+            logger.info(f"Возобновлено рассылок: {len(broadcasts)}")
+        return len(broadcasts)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Остановить рассылку насовсем (в отличие от close, она не возобновится).
+
+        Рассылку, идущую в другом процессе (шарде), останавливает статус в БД:
+        её задача не получит следующую страницу получателей.
+        """
+        stopped = await self.service.finish(broadcast_id, "cancelled")
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return stopped
+
+    async def close(self):
+        """Прервать задачи при остановке бота — статус 'running' сохраняется для resume"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _forget(self, broadcast_id: int, task: asyncio.Task):
+        if self._tasks.get(broadcast_id) is task:
+            del self._tasks[broadcast_id]
+            self._rates.pop(broadcast_id, None)
+
+    # ===== Отправка =====
+
+    async def _run(self, bot: Bot, broadcast: dict, resumed: bool):
+        broadcast_id = broadcast["id"]
+        chat_id = broadcast["report_chat_id"]
+        started = time.monotonic()
+        delivered = 0
+        progress_id = await self._report(
+            bot, chat_id, None,
+            f"{'▶️ Рассылка возобновлена' if resumed else '🚀 Рассылка запущена'} #{broadcast_id}",
+            broadcast_id,
+        )
+        last_progress = time.monotonic()
+
+        after = 0
+        try:
+            while True:
+                page = await self.service.pending_page(broadcast_id, after, self.page_size)
+                if not page:
+                    break
+                after = page[-1]
+
+                results: list[tuple] = []
+                try:
+                    await self._send_page(bot, broadcast["text"], page, results)
+                finally:
+                    # Прерванная страница: сохраняем то, что успело уйти
+                    if results:
+                        await asyncio.shield(self.service.save_results(broadcast_id, results))
+                delivered += len(results)
+                self._rates[broadcast_id] = delivered / max(time.monotonic() - started, 1e-6)
+
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    state = await self.service.get(broadcast_id)
+                    await self._report(
+                        bot, chat_id, progress_id, self._format(state, self.rate(broadcast_id)), broadcast_id
+                    )
+
+            await self.service.finish(broadcast_id, "done")
+            state = await self.service.get(broadcast_id)
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"Рассылка #{broadcast_id} {'завершена' if state['status'] == 'done' else 'остановлена'}: отправлено {state['sent']}, "
+                f"ошибок {state['failed']}, заблокировали {state['blocked']}, {elapsed:.0f} с"
+            )
+            await self._report(bot, chat_id, progress_id, self._format(state, self.rate(broadcast_id)))
+        except asyncio.CancelledError:
+            state = await asyncio.shield(self.service.get(broadcast_id))
+            if state and state["status"] == "cancelled":
+                await asyncio.shield(self._report(bot, chat_id, progress_id, self._format(state, 0.0)))
+            raise
+        except Exception:
+            logger.exception(f"Ошибка рассылки #{broadcast_id}")
+
+    async def _send_page(self, bot: Bot, text: str, page: list[int], results: list[tuple]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(user_id: int):
+            async with semaphore:
+                try:
+                    await bot.send_message(
+                        chat_id=user_id, text=text, parse_mode="HTML", rate_limit_args=Priority.BULK
+                    )
+                    results.append((user_id, "sent", None))
+                except Forbidden as e:
+                    # Пользователь заблокировал бота или удалил аккаунт
+                    results.append((user_id, "blocked", str(e)))
+                except TelegramError as e:
+                    results.append((user_id, "failed", str(e)))
+
+        await asyncio.gather(*(send(user_id) for user_id in page))
+
+    @staticmethod
+    def _format(state: dict, rate: float) -> str:
+        done = state["sent"] + state["failed"] + state["blocked"]
+        header = {
+            "running": "📣 <b>Рассылка #{id} идёт</b>",
+            "done": "🏁 <b>Рассылка #{id} завершена</b>",
+            "cancelled": "⏹ <b>Рассылка #{id} остановлена</b>",
+        }[state["status"]].format(id=state["id"])
+        lines = [
+            header,
+            "",
+            f"<b>Обработано:</b> {done} из {state['total']}",
+            f"<b>Доставлено:</b> {state['sent']}",
+            f"<b>Заблокировали бота:</b> {state['blocked']}",
+            f"<b>Ошибок:</b> {state['failed']}",
+        ]
+        if state["status"] == "running" and rate > 0:
+            eta = (state["total"] - done) / rate
+            lines.append(f"<b>Скорость:</b> {rate:.1f} сообщ./сек, осталось ~{eta / 60:.0f} мин")
+        return "\n".join(lines)
+
+    @staticmethod
+    async def _report(
+        bot: Bot, chat_id: Optional[int], message_id: Optional[int], text: str, broadcast_id: Optional[int] = None
+    ) -> Optional[int]:
+        """Отправить или обновить сообщение о ходе рассылки админу (с кнопкой остановки, пока идёт)"""
+        if not chat_id:
+            return None
+        markup = None
+        if broadcast_id is not None:
+            markup = InlineKeyboardMarkup(
+                [[InlineKeyboardButton("⏹ Остановить", callback_data=f"{STOP_CALLBACK}{broadcast_id}")]]
+            )
+        try:
+            if message_id is None:
+                message = await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML", reply_markup=markup)
+                return message.message_id
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text, parse_mode="HTML", reply_markup=markup
+            )
+        except TelegramError as e:
+            logger.debug(f"Не удалось обновить сообщение о ходе рассылки: {e}")
+        return message_id
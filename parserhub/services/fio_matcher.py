@@ -0,0 +1,77 @@
+"""Нечёткое сравнение ФИО: нормализация русских фамилий/имён и триграммное сходство
+
+Нормализация сводит к одной основе род и падеж («Иванова», «Иванову», «Ивановым» →
+«иванов»; «Достоевская» → «достоевск»; «Сергея» → «серге»), сворачивает ё → е и
+делит двойные фамилии по дефису. Опечатки ловит триграммное сходство основ
+(коэффициент Дайса по триграммам с паддингом, как в pg_trgm).
+"""
+import math
+import re
+from functools import lru_cache
+
+
+# Правила применяются по порядку, срабатывает первое подходящее.
+# Основа короче _MIN_STEM символов не отрезается — короткие фамилии (Ли, Цой) остаются как есть
+_RULES = [
+    # -ский / -цкий во всех родах и падежах
+    (re.compile(r"(ск|цк)(ий|ого|ому|им|ом|ая|ой|ую|ие|их|ими|ое)$"), r"\1"),
+    # отчества: -ович / -евич / -овна / -евна → основа имени отца
+    (re.compile(r"(ов|ев)(ич(а|у|ем|е|ами)?|н(а|ы|е|у|ой|ою))$"), r"\1"),
+    # -ов / -ев / -ин / -ын: женский род и падежи
+    (re.compile(r"(ов|ев|ин|ын)(а|у|ым|ой|ом|е|ы|ых|ыми)$"), r"\1"),
+    # Дмитрий / Дмитрия, Наталья / Наталии / Натальи / Натальей
+    (re.compile(r"(ией|ий|ия|ию|ием|ии|ье|ья|ьи|ью|ьей)$"), "и"),
+    # Николай / Николая / Николаем
+    (re.compile(r"(ай|ая|аю|аем|ае)$"), "а"),
+    # Сергей / Сергея / Сергеем
+    (re.compile(r"(ей|ея|ею|еем)$"), "е"),
+    # общие падежные и адъективные окончания
+    (re.compile(
+        r"(ами|ями|ого|его|ому|ему|ая|яя|ую|юю|ое|ые|ие|ых|их|ым|им|ой|ою|ом|ем|ам|ям|ах|ях"
+        r"|а|я|ы|и|е|у|ю|ь)$"
+    ), ""),
+]
+_MIN_STEM = 3
+_WORD = re.compile(r"[а-яё]+", re.IGNORECASE)
+
+
+def normalize_token(token: str) -> str:
+    """Основа слова ФИО: нижний регистр, ё → е, без родовых и падежных окончаний"""
+    token = token.lower().replace("ё", "е")
+    for pattern, replacement in _RULES:
+        if pattern.search(token):
+            stem = pattern.sub(replacement, token, count=1)
+            return stem if len(stem) >= _MIN_STEM else token
+    return token
+
+
+def name_stems(fio: str | None) -> list[str]:
+    """Основы всех слов ФИО; двойная фамилия («Петров-Водкин») даёт две основы"""
+    stems = []
+    for word in _WORD.findall(fio or ""):
+        stem = normalize_token(word)
+        if stem not in stems:
+            stems.append(stem)
+    return stems
+
+
+@lru_cache(maxsize=65536)
+def trigrams(stem: str) -> frozenset[str]:
+    padded = f"  {stem} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: str, b: str) -> float:
+    """Коэффициент Дайса по триграммам: 1.0 — совпадение, ~0.7 — одна опечатка в длинном слове"""
+    if a == b:
+        return 1.0
+    ta, tb = trigrams(a), trigrams(b)
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def min_shared_trigrams(stem: str, threshold: float) -> int:
+    """Сколько общих триграмм нужно основе-кандидату, чтобы сходство могло достичь threshold.
+
+    Из 2|A∩B| / (|A| + |B|) >= t следует |A∩B| >= t·|A| / 2 — отсечение на стороне SQL.
+    """
+    return max(1, math.ceil(threshold * len(trigrams(stem)) / 2))
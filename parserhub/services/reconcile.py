@@ -0,0 +1,61 @@
+"""Сверка active_tasks с микросервисами при старте бота"""
+import asyncio
+from loguru import logger
+
+from parserhub.api_client import RealtyAPI, WorkersAPI
+from parserhub.db_service import DatabaseService
+
+
+async def reconcile_tasks(
+    db: DatabaseService,
+    workers_api: WorkersAPI,
+    realty_api: RealtyAPI,
+    concurrency: int = 20,
+) -> int:
+    """При старте удаляем из active_tasks задачи, которых уже нет в сервисах (зомби)
+
+    Returns:
+        Количество удалённых задач
+    """
+    tasks = await db.get_all_running_tasks()
+    if not tasks:
+        logger.info("Reconcile: активных задач нет")
+        return 0
+
+    apis = {"workers": workers_api, "realty": realty_api}
+    by_service: dict[str, list] = {}
+    for task in tasks:
+        if task.service in apis:
+            by_service.setdefault(task.service, []).append(task)
+
+    # Сервисы опрашиваются параллельно; внутри — пакетный эндпоинт или GET с ограничением
+    service_names = list(by_service)
+    statuses = await asyncio.gather(
+        *(
+            apis[name].get_statuses([t.task_id for t in by_service[name]], concurrency=concurrency)
+            for name in service_names
+        ),
+        return_exceptions=True,
+    )
+
+    zombies = []
+    unchecked = 0
+    for name, result in zip(service_names, statuses):
+        if isinstance(result, Exception):
+            # Сервис недоступен — не удаляем, он может подняться
+            logger.warning(f"Reconcile: не удалось проверить задачи {name}: {result}")
+            unchecked += len(by_service[name])
+            continue
+        for task in by_service[name]:
+            if task.task_id not in result:
+                unchecked += 1
+            elif result[task.task_id] is None:
+                zombies.append(task)
+                logger.info(f"Reconcile: зомби-задача удалена {task.task_id} (user={task.user_id})")
+
+    await db.delete_tasks([t.task_id for t in zombies])
+    logger.info(
+        f"Reconcile завершён: проверено {len(tasks) - unchecked} из {len(tasks)}, "
+        f"удалено зомби: {len(zombies)}"
+    )
+    return len(zombies)
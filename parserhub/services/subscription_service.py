@@ -1,10 +1,13 @@
 """Сервис управления подписками"""
 import json
-import aiosqlite
 from datetime import datetime, timedelta
-from pathlib import Path
+from typing import Optional
 from loguru import logger
 
+from parserhub.cache import TTLCache
+from parserhub.db_pool import ConnectionPool
+from parserhub.models import AccessInfo
+
 
 class SubscriptionService:
 
@@ -14,28 +17,60 @@ class SubscriptionService:
         "month": {"days": 30, "price": 49900, "label": "30 дней"},
     }
 
-    def __init__(self, db_path: str):
-        self.db_path = Path(db_path)
-
-    async def init_table(self):
-        """Создать таблицу подписок если не существует"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    user_id INTEGER PRIMARY KEY,
-                    plan TEXT NOT NULL,
-                    active_until TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-            await db.commit()
-        logger.info("Таблица subscriptions инициализирована")
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        access_cache: TTLCache | None = None,
+        owner_id: int = 0,
+    ):
+        # Пул соединений общий с DatabaseService — один файл bot.db, одни соединения
+        self.pool = pool
+        # {user_id: AccessInfo} — сырые даты, истечение проверяется при чтении
+        self.access_cache = access_cache if access_cache is not None else TTLCache()
+        # Владелец бота (ADMIN_ID из .env) — админ без записи в таблице admins
+        self.owner_id = owner_id
+
+    def invalidate(self, user_id: int):
+        """Сбросить закэшированное состояние доступа пользователя"""
+        self.access_cache.invalidate(user_id)
+
+    async def resolve_access(self, user_id: int) -> AccessInfo:
+        """Подписка, пробный период и права админа одним запросом (с кэшем)"""
+        cached = self.access_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        async with self.pool.read() as db:
+            async with db.execute(
+                """
+                SELECT u.user_id IS NOT NULL AS is_registered,
+                       u.trial_until,
+                       s.plan,
+                       s.active_until,
+                       a.user_id IS NOT NULL AS is_admin
+                FROM (SELECT ? AS user_id) q
+                LEFT JOIN users u ON u.user_id = q.user_id
+                LEFT JOIN subscriptions s ON s.user_id = q.user_id
+                LEFT JOIN admins a ON a.user_id = q.user_id
+                """,
+                (user_id,),
+            ) as cursor:
+                row = await cursor.fetchone()
+
+        access = AccessInfo(
+            user_id=user_id,
+            is_registered=bool(row["is_registered"]),
+            is_admin=bool(row["is_admin"]) or user_id == self.owner_id,
+            plan=row["plan"],
+            active_until=row["active_until"],
+            trial_until=row["trial_until"],
+        )
+        self.access_cache.set(user_id, access)
+        return access
 
     async def get_plans(self) -> dict:
         """Получить актуальные тарифы из БД (с fallback на DEFAULT_PLANS)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT value FROM global_config WHERE key = ?", ("subscription_plans",)
             ) as cursor:
@@ -53,29 +88,20 @@ class SubscriptionService:
         if plan not in plans:
             raise ValueError(f"Unknown plan: {plan}")
         plans[plan]["price"] = price
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 "INSERT OR REPLACE INTO global_config (key, value) VALUES (?, ?)",
                 ("subscription_plans", json.dumps(plans, ensure_ascii=False)),
             )
-            await db.commit()
         logger.info(f"Обновлена цена тарифа {plan}: {price} коп.")
 
     async def has_active(self, user_id: int) -> bool:
         """Проверить есть ли активная платная подписка"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                "SELECT active_until FROM subscriptions WHERE user_id = ?",
-                (user_id,),
-            ) as cursor:
-                row = await cursor.fetchone()
-                if not row:
-                    return False
-                return datetime.fromisoformat(row[0]) > datetime.utcnow()
+        return (await self.resolve_access(user_id)).has_subscription
 
     async def get_trial_info(self, user_id: int) -> dict | None:
         """Получить информацию о пробном периоде из таблицы users"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT trial_until FROM users WHERE user_id = ?", (user_id,)
             ) as cursor:
@@ -90,15 +116,11 @@ class SubscriptionService:
 
     async def has_access(self, user_id: int) -> bool:
         """Активная платная подписка ИЛИ активный пробный период"""
-        if await self.has_active(user_id):
-            return True
-        trial = await self.get_trial_info(user_id)
-        return bool(trial and trial["is_active"])
+        return (await self.resolve_access(user_id)).has_access
 
     async def get_info(self, user_id: int) -> dict | None:
         """Получить информацию о подписке пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             async with db.execute(
                 "SELECT * FROM subscriptions WHERE user_id = ?",
                 (user_id,),
@@ -128,7 +150,7 @@ class SubscriptionService:
         else:
             active_until = now + timedelta(days=days)
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             await db.execute(
                 """
                 INSERT INTO subscriptions (user_id, plan, active_until, created_at, updated_at)
@@ -146,35 +168,18 @@ class SubscriptionService:
                     now.isoformat(),
                 ),
             )
-            await db.commit()
+        self.invalidate(user_id)
 
         logger.info(
             f"Subscription activated: user={user_id}, plan={plan}, "
             f"active_until={active_until.isoformat()}"
         )
 
-    async def get_all_active(self) -> list[dict]:
-        """Получить все активные подписки"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                """
-                SELECT s.*, u.username, u.full_name
-                FROM subscriptions s
-                LEFT JOIN users u ON s.user_id = u.user_id
-                WHERE s.active_until > ?
-                ORDER BY s.active_until DESC
-                """,
-                (datetime.utcnow().isoformat(),),
-            ) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
-
     async def revoke(self, user_id: int) -> bool:
         """Аннулировать подписку и пробный период пользователя.
         Возвращает True если у пользователя было что-то активное."""
         past = "2000-01-01T00:00:00"
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             cursor_sub = await db.execute(
                 "DELETE FROM subscriptions WHERE user_id = ?", (user_id,)
             )
@@ -183,36 +188,119 @@ class SubscriptionService:
                 "UPDATE users SET trial_until = ? WHERE user_id = ?", (past, user_id)
             )
             trial_reset = cursor_trial.rowcount > 0
-            await db.commit()
+        self.invalidate(user_id)
         logger.info(f"Subscription revoked for user={user_id}, had_sub={sub_deleted}, had_trial={trial_reset}")
         return sub_deleted or trial_reset
 
-    async def get_all_trial_active(self) -> list[dict]:
-        """Получить всех пользователей с активным пробным периодом (без платной подписки)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            now = datetime.utcnow().isoformat()
+    async def count_active(self) -> dict:
+        """Количество активных платных подписок и пробных периодов (без платной подписки)"""
+        # Счёт только по индексам idx_subscriptions_active_until и idx_users_trial_until (миграция v3)
+        now = datetime.utcnow().isoformat()
+        async with self.pool.read() as db:
             async with db.execute(
                 """
-                SELECT u.user_id, u.username, u.full_name, u.trial_until
-                FROM users u
-                WHERE u.trial_until > ?
-                  AND u.user_id NOT IN (
-                      SELECT user_id FROM subscriptions WHERE active_until > ?
-                  )
-                ORDER BY u.trial_until DESC
+                SELECT
+                    (SELECT COUNT(*) FROM subscriptions WHERE active_until > ?) AS subs,
+                    (SELECT COUNT(*) FROM users u
+                     WHERE u.trial_until > ?
+                       AND NOT EXISTS (
+                           SELECT 1 FROM subscriptions s
+                           WHERE s.user_id = u.user_id AND s.active_until > ?
+                       )) AS trials
                 """,
-                (now, now),
+                (now, now, now),
             ) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                row = await cursor.fetchone()
+                return {"subs": row["subs"], "trials": row["trials"]}
+
+    async def get_active_page(
+        self, cursor: Optional[tuple] = None, limit: int = 20
+    ) -> tuple[list[dict], Optional[tuple]]:
+        """Страница активных пользователей: сначала платные, затем пробные.
+
+        Keyset-пагинация: внутри раздела порядок (until DESC, user_id DESC),
+        курсор — (type, until, user_id) последней строки предыдущей страницы.
+        Разделы читаются по индексам idx_subscriptions_active_until и
+        idx_users_trial_until (миграция v3).
+
+        Returns:
+            (строки страницы с полем type = 'sub' | 'trial', курсор следующей страницы или None)
+        """
+        now = datetime.utcnow().isoformat()
+        section, until, last_id = cursor or ("sub", None, None)
+        rows: list[dict] = []
+
+        async with self.pool.read() as db:
+            if section == "sub":
+                rows += await self._fetch_section(
+                    db,
+                    """
+                    SELECT 'sub' AS type, s.user_id, s.plan, s.active_until AS until,
+                           u.username, u.full_name
+                    FROM subscriptions s
+                    LEFT JOIN users u ON s.user_id = u.user_id
+                    WHERE s.active_until > ? {keyset}
+                    ORDER BY s.active_until DESC, s.user_id DESC
+                    LIMIT ?
+                    """,
+                    "s.active_until", "s.user_id", (now,), until, last_id, limit + 1,
+                )
+                # Платные закончились на этой странице — добираем пробными с начала раздела
+                until, last_id = None, None
+
+            if len(rows) <= limit:
+                rows += await self._fetch_section(
+                    db,
+                    """
+                    SELECT 'trial' AS type, u.user_id, NULL AS plan, u.trial_until AS until,
+                           u.username, u.full_name
+                    FROM users u
+                    WHERE u.trial_until > ? {keyset}
+                      AND NOT EXISTS (
+                          SELECT 1 FROM subscriptions s
+                          WHERE s.user_id = u.user_id AND s.active_until > ?
+                      )
+                    ORDER BY u.trial_until DESC, u.user_id DESC
+                    LIMIT ?
+                    """,
+                    "u.trial_until", "u.user_id", (now,), until, last_id,
+                    limit + 1 - len(rows), tail_params=(now,),
+                )
+
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = (last["type"], last["until"], last["user_id"])
+        return page, next_cursor
+
+    @staticmethod
+    async def _fetch_section(
+        db,
+        query: str,
+        until_col: str,
+        id_col: str,
+        params: tuple,
+        until: Optional[str],
+        last_id: Optional[int],
+        limit: int,
+        tail_params: tuple = (),
+    ) -> list[dict]:
+        keyset = ""
+        if until is not None:
+            # Эквивалент (until, id) < (?, ?), но с диапазоном по индексу на until
+            keyset = f"AND {until_col} <= ? AND ({until_col} < ? OR {id_col} < ?)"
+            params = params + (until, until, last_id)
+        async with db.execute(
+            query.format(keyset=keyset), params + tail_params + (limit,)
+        ) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
 
     async def delete_expired(self) -> int:
         """Удалить истекшие подписки. Возвращает количество удалённых."""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             cursor = await db.execute(
                 "DELETE FROM subscriptions WHERE active_until < ?",
                 (datetime.utcnow().isoformat(),),
             )
-            await db.commit()
             return cursor.rowcount
@@ -0,0 +1,304 @@
+"""Шардированный запуск: приёмник webhook раздаёт обновления процессам-обработчикам по user_id % N
+
+Все обновления пользователя попадают в один и тот же процесс, поэтому его состояние —
+диалоги и user_data, антиспам, очередь поисков в ЧС, кэш прав доступа — остаётся
+локальным для процесса и не требует общей памяти, а порядок обработки внутри
+пользователя сохраняет PerUserUpdateProcessor шарда. Общие данные живут в bot.db
+(SQLite WAL допускает несколько процессов). Изменения, которые один пользователь
+вносит другому (админ выдал или отозвал доступ), доставляются шарду этого
+пользователя сообщением в его очередь.
+
+Не всё общее состояние привязано к пользователю: одинаковые проверки в ЧС разных
+пользователей попадают в разные шарды. Их сводит в один поиск SharedSingleFlight
+через таблицу blacklist_flights в bot.db.
+"""
+import asyncio
+import json
+import queue
+from typing import Any, Callable, Hashable, Optional
+
+from loguru import logger
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from parserhub.cache import TTLCache
+from parserhub.webhook import WebhookIngress, build_server
+
+
+# Сообщение в очередь шарда: обработать то, что пришло раньше, и завершиться
+STOP = None
+# Сколько ждать завершения процессов-обработчиков при остановке, сек
+SHUTDOWN_TIMEOUT = 30.0
+# Как часто приёмник проверяет, живы ли процессы-обработчики, сек
+WATCH_INTERVAL = 5.0
+
+
+def update_owner(data: dict) -> int:
+    """Владелец сырого обновления Telegram: id отправителя, иначе id чата, иначе 0.
+
+    Тот же ключ, что у PerUserUpdateProcessor (effective_user, затем чат).
+    """
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        for field in ("from", "user"):
+            sender = value.get(field)
+            if isinstance(sender, dict) and "id" in sender:
+                return sender["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return 0
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    return user_id % shards
+
+
+def _qsize(inbox) -> int:
+    try:
+        return inbox.qsize()
+    except NotImplementedError:  # macOS: sem_getvalue не реализован
+        return -1
+
+
+class ShardRouter(WebhookIngress):
+    """Приёмник webhook без обработчиков: сверяет secret token и кладёт тело обновления
+    в очередь шарда владельца (multiprocessing.Queue). Разбор в объекты PTB и сама
+    обработка — в процессах-обработчиках, приёмник занят только вводом-выводом.
+
+    Очередь шарда заполнена — 503: Telegram повторит доставку позже.
+    """
+
+    mode = "sharded"
+
+    def __init__(self, path: str, secret_token: str, inboxes: list):
+        super().__init__(path, secret_token)
+        self.inboxes = inboxes
+
+        # Метрики
+        self.routed = [0] * len(inboxes)
+        self.restarts = 0
+
+    async def _dispatch(self, data: dict, body: bytes) -> int:
+        shard = shard_of(update_owner(data), len(self.inboxes))
+        try:
+            self.inboxes[shard].put_nowait(body)
+        except queue.Full:
+            return 503
+        self.routed[shard] += 1
+        return 200
+
+    def _queue_stats(self) -> dict:
+        return {
+            "restarts": self.restarts,
+            "shards": [
+                {"routed": routed, "queue": _qsize(inbox)}
+                for routed, inbox in zip(self.routed, self.inboxes)
+            ],
+        }
+
+
+class ShardWorker:
+    """Сторона процесса-обработчика: очередь от приёмника и связь с соседними шардами.
+
+    По очередям шардов ходят сообщения трёх видов: тело обновления (bytes) от
+    приёмника, ("invalidate", имя кэша, ключ) от соседнего шарда и STOP.
+    """
+
+    def __init__(self, shard: int, inboxes: list, max_queue: int = 1000):
+        self.shard = shard
+        self.inboxes = inboxes
+        # Сколько разобранных обновлений держать в update_queue PTB; остальные ждут
+        # в очереди шарда, и при её заполнении приёмник отвечает Telegram 503
+        self.max_queue = max_queue
+        self._caches: dict[str, "ShardedTTLCache"] = {}
+
+        # Метрики
+        self.updates = 0
+        self.invalidations = 0
+        self.dropped = 0  # сообщения соседям, не поместившиеся в их очередь
+
+    @property
+    def shards(self) -> int:
+        return len(self.inboxes)
+
+    @property
+    def primary(self) -> bool:
+        """Шард 0 выполняет фоновые задачи, нужные в единственном экземпляре"""
+        return self.shard == 0
+
+    def owns(self, user_id: int) -> bool:
+        return shard_of(user_id, self.shards) == self.shard
+
+    def cache(self, name: str, maxsize: int = 10_000, ttl: float = 60.0) -> "ShardedTTLCache":
+        """Кэш по user_id, сброс которого доходит до шарда владельца ключа"""
+        cache = self._caches[name] = ShardedTTLCache(self, name, maxsize=maxsize, ttl=ttl)
+        return cache
+
+    def send_invalidate(self, name: str, key: int):
+        try:
+            self.inboxes[shard_of(key, self.shards)].put_nowait(("invalidate", name, key))
+        except queue.Full:
+            # Запись у владельца всё равно истечёт по TTL
+            self.dropped += 1
+            logger.warning(f"Шард {self.shard}: очередь шарда для {key} заполнена, сброс кэша {name} пропущен")
+
+    def stats(self) -> dict:
+        return {
+            "shard": self.shard,
+            "shards": self.shards,
+            "updates": self.updates,
+            "invalidations": self.invalidations,
+            "dropped": self.dropped,
+            "inbox": _qsize(self.inboxes[self.shard]),
+        }
+
+    async def pump(self, application: Application):
+        """Перекладывать обновления из очереди шарда в update_queue PTB до STOP"""
+        while True:
+            while application.update_queue.qsize() >= self.max_queue:
+                await asyncio.sleep(0.05)
+            for message in await asyncio.to_thread(self._take):
+                if message is STOP:
+                    return
+                if isinstance(message, bytes):
+                    await self._put_update(application, message)
+                else:
+                    self._apply(message)
+
+    def _take(self, batch: int = 100, timeout: float = 1.0) -> list:
+        """Блокирующее чтение (в потоке): первое сообщение с таймаутом, затем всё, что уже есть"""
+        inbox = self.inboxes[self.shard]
+        try:
+            messages = [inbox.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(messages) < batch and messages[-1] is not STOP:
+            try:
+                messages.append(inbox.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    async def _put_update(self, application: Application, body: bytes):
+        try:
+            update = Update.de_json(json.loads(body), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Шард {self.shard}: не удалось разобрать обновление: {e}")
+            return
+        await application.update_queue.put(update)
+        self.updates += 1
+
+    def _apply(self, message: tuple):
+        kind, name, key = message
+        if kind == "invalidate" and name in self._caches:
+            self._caches[name].drop(key)
+            self.invalidations += 1
+
+
+class ShardedTTLCache(TTLCache):
+    """TTLCache по user_id в шардированном запуске.
+
+    Запись о пользователе живёт только в его шарде. invalidate() для чужого
+    пользователя (админ отозвал доступ) пересылается шарду владельца — иначе тот
+    отдавал бы устаревшее значение до истечения TTL.
+    """
+
+    def __init__(self, worker: ShardWorker, name: str, maxsize: int = 10_000, ttl: float = 60.0):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.worker = worker
+        self.name = name
+
+    def invalidate(self, key: Hashable):
+        super().invalidate(key)
+        if isinstance(key, int) and not self.worker.owns(key):
+            self.worker.send_invalidate(self.name, key)
+
+    def drop(self, key: Hashable):
+        """Сбросить запись только в этом шарде"""
+        super().invalidate(key)
+
+
+async def run_shard(application: Application, worker: ShardWorker):
+    """Жизненный цикл процесса-обработчика — тот же порядок, что у run_webhook, но
+    обновления приходят из очереди шарда, а не по HTTP. Остановка — по STOP от приёмника.
+    """
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        logger.info(f"Шард {worker.shard}/{worker.shards} запущен")
+        try:
+            await worker.pump(application)
+        finally:
+            if application.running:
+                await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def run_router(
+    router: ShardRouter,
+    start_worker: Callable[[int], Any],
+    *,
+    token: str,
+    url: str,
+    host: str,
+    port: int,
+    max_connections: int = 40,
+    allowed_updates: Optional[list[str]] = None,
+):
+    """Процесс-приёмник: запускает шарды, ставит webhook и принимает обновления до SIGINT/SIGTERM.
+
+    start_worker(shard) запускает процесс-обработчик и возвращает multiprocessing.Process.
+    Упавший обработчик перезапускается; очередь шарда живёт в приёмнике, поэтому
+    обновления, ещё не забранные обработчиком, не теряются. При остановке каждый шард
+    получает STOP после уже принятых обновлений и успевает их обработать.
+    """
+    server = build_server(router, host=host, port=port, max_connections=max_connections)
+    workers = [start_worker(shard) for shard in range(len(router.inboxes))]
+    watcher = asyncio.create_task(_watch_workers(router, workers, start_worker))
+    try:
+        async with Bot(token) as bot:
+            await bot.set_webhook(
+                url=url,
+                secret_token=router.secret_token.decode(),
+                max_connections=max_connections,
+                allowed_updates=allowed_updates,
+            )
+        logger.info(f"Webhook установлен: {url} (слушаю {host}:{port}, шардов: {len(workers)})")
+        await server.serve()
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        await _stop_workers(router.inboxes, workers)
+
+
+async def _watch_workers(router: ShardRouter, workers: list, start_worker: Callable[[int], Any]):
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        for shard, process in enumerate(workers):
+            if not process.is_alive():
+                logger.error(f"Шард {shard} завершился (код {process.exitcode}), перезапуск")
+                workers[shard] = start_worker(shard)
+                router.restarts += 1
+
+
+async def _stop_workers(inboxes: list, workers: list):
+    for inbox in inboxes:
+        try:
+            await asyncio.to_thread(inbox.put, STOP, True, SHUTDOWN_TIMEOUT)
+        except queue.Full:
+            pass
+    for shard, process in enumerate(workers):
+        await asyncio.to_thread(process.join, SHUTDOWN_TIMEOUT)
+        if process.is_alive():
+            logger.warning(f"Шард {shard} не завершился за {SHUTDOWN_TIMEOUT:.0f} с, принудительная остановка")
+            process.terminate()
+            await asyncio.to_thread(process.join)
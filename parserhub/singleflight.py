@@ -0,0 +1,197 @@
+"""Single-flight: одновременные одинаковые запросы выполняются один раз"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from loguru import logger
+
+from parserhub.db_pool import ConnectionPool
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Пока запрос с ключом key выполняется, повторные вызовы do(key, ...) не запускают
+    новый, а ждут результат уже идущего — и получают тот же результат (или исключение).
+
+    Запрос выполняется отдельной задачей: отмена одного ожидающего не прерывает
+    остальных. Задача отменяется, только когда ушли все ожидающие.
+    Не потокобезопасен — рассчитан на использование из одного event loop.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self.started = 0   # запущено реальных запросов
+        self.shared = 0    # вызовов, присоединившихся к уже идущему запросу
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def in_flight_elsewhere(self, key: Hashable) -> bool:
+        """Выполняется ли запрос в другом процессе (у одного процесса других нет)"""
+        return False
+
+    def stats(self) -> dict:
+        return {"started": self.started, "shared": self.shared}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+_NOT_READY = object()
+
+
+class SharedSingleFlight(SingleFlight):
+    """SingleFlight для нескольких процессов-шардов с общей bot.db.
+
+    Внутри процесса — как SingleFlight. Между процессами запрос координирует строка
+    blacklist_flights: кто первым вставил строку с ключом, тот выполняет запрос и
+    записывает в неё результат (JSON); остальные процессы опрашивают строку и
+    возвращают этот результат. Если владелец завершился исключением, строка
+    удаляется — ожидающие запускают запрос сами. Строка упавшего процесса
+    перехватывается через claim_ttl.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        shard: Optional[int] = None,
+        claim_ttl: float = 1260.0,
+        poll_interval: float = 2.0,
+        keep_finished: float = 300.0,
+    ):
+        super().__init__()
+        self.pool = pool
+        self.shard = shard
+        # Сколько держать строку владельца, прежде чем считать его упавшим
+        self.claim_ttl = claim_ttl
+        self.poll_interval = poll_interval
+        # Сколько хранить результат завершённого запроса для ожидающих
+        self.keep_finished = keep_finished
+        self.remote = 0  # результатов, полученных от запроса в другом процессе
+
+    def stats(self) -> dict:
+        return {**super().stats(), "remote": self.remote}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await super().do(key, lambda: self._run_shared(str(key), fn))
+
+    async def in_flight_elsewhere(self, key: Hashable) -> bool:
+        if self.in_flight(key):
+            return False
+        async with self.pool.read() as db:
+            async with db.execute(
+                "SELECT 1 FROM blacklist_flights WHERE key = ? AND finished_at IS NULL AND started_at > ?",
+                (str(key), self._stale_before()),
+            ) as cursor:
+                return await cursor.fetchone() is not None
+
+    async def release_shard(self) -> int:
+        """Удалить строки, оставшиеся от прошлого процесса этого шарда (упал или перезапущен)"""
+        async with self.pool.write() as db:
+            cursor = await db.execute("DELETE FROM blacklist_flights WHERE shard = ?", (self.shard,))
+            return cursor.rowcount
+
+    async def _run_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            owner = await self._claim(key)
+            if owner is not None:
+                try:
+                    result = await fn()
+                except BaseException:
+                    await asyncio.shield(self._forget_claim(key, owner))
+                    raise
+                await self._publish(key, owner, result)
+                return result
+
+            result = await self._wait(key)
+            if result is not _NOT_READY:
+                self.remote += 1
+                return result
+
+    def _stale_before(self) -> str:
+        return (datetime.utcnow() - timedelta(seconds=self.claim_ttl)).isoformat()
+
+    async def _claim(self, key: str) -> Optional[str]:
+        """Стать владельцем запроса: свободный ключ, завершённый или брошенный запрос"""
+        owner = uuid.uuid4().hex
+        now = datetime.utcnow()
+        async with self.pool.write() as db:
+            await db.execute(
+                "DELETE FROM blacklist_flights WHERE finished_at < ?",
+                ((now - timedelta(seconds=self.keep_finished)).isoformat(),),
+            )
+            async with db.execute(
+                """
+                INSERT INTO blacklist_flights (key, owner, shard, started_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    owner = excluded.owner,
+                    shard = excluded.shard,
+                    started_at = excluded.started_at,
+                    result = NULL,
+                    finished_at = NULL
+                WHERE blacklist_flights.finished_at IS NOT NULL OR blacklist_flights.started_at < ?
+                RETURNING owner
+                """,
+                (key, owner, self.shard, now.isoformat(), self._stale_before()),
+            ) as cursor:
+                row = await cursor.fetchone()
+        return owner if row else None
+
+    async def _publish(self, key: str, owner: str, result: Any):
+        async with self.pool.write() as db:
+            await db.execute(
+                "UPDATE blacklist_flights SET result = ?, finished_at = ? WHERE key = ? AND owner = ?",
+                (json.dumps(result, ensure_ascii=False), datetime.utcnow().isoformat(), key, owner),
+            )
+
+    async def _forget_claim(self, key: str, owner: str):
+        try:
+            async with self.pool.write() as db:
+                await db.execute("DELETE FROM blacklist_flights WHERE key = ? AND owner = ?", (key, owner))
+        except Exception as e:
+            # Строку перехватят по claim_ttl
+            logger.warning(f"Не удалось снять запрос {key} из blacklist_flights: {e}")
+
+    async def _wait(self, key: str) -> Any:
+        """Ждать запрос другого процесса: его результат или _NOT_READY, если ключ освободился"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            async with self.pool.read() as db:
+                async with db.execute(
+                    "SELECT result, started_at, finished_at FROM blacklist_flights WHERE key = ?", (key,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            if row is None:
+                return _NOT_READY
+            if row[2] is not None:
+                return json.loads(row[0])
+            if row[1] < self._stale_before():
+                return _NOT_READY
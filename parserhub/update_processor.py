@@ -0,0 +1,94 @@
+"""Параллельная обработка обновлений с сохранением порядка в пределах одного пользователя"""
+import asyncio
+from typing import Any, Awaitable, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class _UserLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0  # обновлений этого пользователя в работе (выполняется + ждут)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Обновления разных пользователей обрабатываются параллельно (не больше
+    max_concurrent_updates одновременно), обновления одного пользователя — строго
+    по очереди, в порядке поступления. Поэтому состояния ConversationHandler
+    и user_data не видят гонок, а медленный обработчик (топики форума, старт
+    мониторинга) задерживает только своего пользователя.
+
+    Семафор базового класса берётся до do_process_update: если бы он ограничивал
+    выполнение, обновления, ждущие своего пользователя, занимали бы слоты и
+    задерживали остальных. Поэтому он ограничивает только число обновлений в работе
+    (max_pending_updates), а параллельность — собственный семафор после блокировки.
+    """
+
+    def __init__(self, max_concurrent_updates: int = 64, max_pending_updates: int = 10_000):
+        super().__init__(max(max_pending_updates, max_concurrent_updates, 2))
+        self.concurrency = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: dict[Hashable, _UserLock] = {}
+
+        # Метрики
+        self.running = 0
+        self.processed = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _user_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _UserLock()
+        entry.users += 1
+        try:
+            # asyncio.Lock будит ожидающих в порядке очереди — порядок обновлений сохраняется
+            async with entry.lock:
+                await self._run(coroutine)
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[key]
+
+    def stats(self) -> dict:
+        """Метрики: выполняется, ждут слота или своей очереди, пользователей в работе, обработано"""
+        in_work = sum(entry.users for entry in self._locks.values())
+        return {
+            "running": self.running,
+            "waiting": max(in_work - self.running, 0),
+            "users": len(self._locks),
+            "processed": self.processed,
+            "concurrency": self.concurrency,
+        }
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        async with self._slots:
+            self.running += 1
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+                self.processed += 1
+
+
+def _user_key(update: object) -> Optional[Hashable]:
+    """Ключ сериализации: пользователь, а для обновлений без пользователя — чат"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return ("chat", update.effective_chat.id)
+    return None
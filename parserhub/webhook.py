@@ -0,0 +1,212 @@
+"""Приём обновлений через webhook: ASGI-приложение и запуск бота на встроенном сервере (uvicorn)"""
+import hmac
+import json
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from telegram import Update
+from telegram.ext import Application
+
+
+# Обработчик дополнительного маршрута: () → (HTTP-статус, content-type, тело)
+RouteHandler = Callable[[], Awaitable[tuple[int, str, bytes]]]
+
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+# Обновление Telegram — единицы килобайт; всё крупнее считаем мусором
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookIngress:
+    """Общая часть приёма webhook: secret token, разбор тела, служебные маршруты и метрики.
+
+    Куда уходит разобранное обновление, решает подкласс в _dispatch:
+    WebhookApp — в очередь PTB этого процесса, ShardRouter — процессу-обработчику.
+    """
+
+    mode = "webhook"
+
+    def __init__(self, path: str, secret_token: str):
+        self.path = path
+        self.secret_token = secret_token.encode()
+        self._routes: dict[tuple[str, str], RouteHandler] = {("GET", "/health"): self._health}
+
+        # Метрики
+        self.received = 0
+        self.rejected = {"secret": 0, "queue_full": 0, "bad_request": 0}
+
+    def add_route(self, method: str, path: str, handler: RouteHandler):
+        self._routes[(method, path)] = handler
+
+    def stats(self) -> dict:
+        return {"received": self.received, "rejected": dict(self.rejected), **self._queue_stats()}
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope["type"] != "http":  # lifespan отключён в uvicorn.Config
+            return
+
+        method, path = scope["method"], scope["path"]
+        if path == self.path:
+            if method != "POST":
+                return await _respond(send, 405)
+            status = await self._webhook(scope, receive)
+            return await _respond(send, status)
+
+        handler = self._routes.get((method, path))
+        if handler is None:
+            return await _respond(send, 404)
+        status, content_type, body = await handler()
+        await _respond(send, status, body, content_type)
+
+    async def _webhook(self, scope: dict, receive: Callable) -> int:
+        headers = dict(scope["headers"])
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b""), self.secret_token):
+            self.rejected["secret"] += 1
+            logger.warning(f"Webhook: неверный secret token от {scope.get('client')}")
+            return 403
+
+        if self._overloaded():
+            self.rejected["queue_full"] += 1
+            return 503
+
+        body = await _read_body(receive)
+        if body is None:
+            self.rejected["bad_request"] += 1
+            return 413
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise TypeError("ожидался JSON-объект")
+            status = await self._dispatch(data, body)
+        except (ValueError, TypeError, KeyError) as e:
+            self.rejected["bad_request"] += 1
+            logger.warning(f"Webhook: не удалось разобрать обновление: {e}")
+            return 400
+
+        if status == 503:
+            self.rejected["queue_full"] += 1
+        elif status == 200:
+            self.received += 1
+        return status
+
+    def _overloaded(self) -> bool:
+        """Отказать (503) ещё до чтения тела запроса"""
+        return False
+
+    async def _dispatch(self, data: dict, body: bytes) -> int:
+        """Передать обновление дальше → HTTP-статус ответа Telegram"""
+        raise NotImplementedError
+
+    def _queue_stats(self) -> dict:
+        return {}
+
+    async def _health(self) -> tuple[int, str, bytes]:
+        body = {"status": "ok", "mode": self.mode, **self._queue_stats()}
+        return 200, "application/json", json.dumps(body).encode()
+
+
+class WebhookApp(WebhookIngress):
+    """ASGI-приложение на том же порту, что и бот:
+
+    - POST {path} — обновления от Telegram. Заголовок X-Telegram-Bot-Api-Secret-Token
+      сверяется с secret_token, обновление кладётся в update_queue приложения PTB.
+      Если в очереди уже max_queue необработанных обновлений — 503: Telegram
+      повторит доставку позже, а память процесса не растёт под нагрузкой.
+    - GET /health — проверка живости для Docker/балансировщика.
+    - add_route() — дополнительные служебные маршруты.
+    """
+
+    def __init__(self, application: Application, path: str, secret_token: str, max_queue: int = 1000):
+        super().__init__(path, secret_token)
+        self.application = application
+        self.max_queue = max_queue
+
+    def _overloaded(self) -> bool:
+        return self.application.update_queue.qsize() >= self.max_queue
+
+    async def _dispatch(self, data: dict, body: bytes) -> int:
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        return 200
+
+    def _queue_stats(self) -> dict:
+        return {"update_queue": self.application.update_queue.qsize()}
+
+
+async def run_webhook(
+    application: Application,
+    app: WebhookIngress,
+    *,
+    url: str,
+    host: str,
+    port: int,
+    max_connections: int = 40,
+    allowed_updates: Optional[list[str]] = None,
+):
+    """Жизненный цикл бота в режиме webhook — тот же порядок, что у Application.run_polling:
+    initialize → post_init → start → (сервер до SIGINT/SIGTERM) → stop → shutdown → post_shutdown.
+
+    Webhook при остановке не снимается: пока бот перезапускается, Telegram копит обновления.
+    """
+    server = build_server(app, host=host, port=port, max_connections=max_connections)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=url,
+            secret_token=app.secret_token.decode(),
+            max_connections=max_connections,
+            allowed_updates=allowed_updates,
+        )
+        logger.info(f"Webhook установлен: {url} (слушаю {host}:{port})")
+        await application.start()
+        try:
+            await server.serve()
+        finally:
+            if application.running:
+                await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def build_server(app: WebhookIngress, *, host: str, port: int, max_connections: int = 40):
+    """uvicorn.Server для приёма webhook (без запуска)"""
+    import uvicorn  # нужен только в режиме webhook
+
+    return uvicorn.Server(uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        lifespan="off",
+        access_log=False,
+        log_level="warning",
+        # Сверх max_connections Telegram — запас для /health и служебных маршрутов
+        limit_concurrency=max_connections + 20,
+    ))
+
+
+async def _read_body(receive: Callable) -> Optional[bytes]:
+    """Тело запроса целиком; None — если больше MAX_BODY_SIZE"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _respond(send: Callable, status: int, body: bytes = b"", content_type: str = "text/plain"):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,33 @@
+"""
+Общие фикстуры тестов
+
+  - db          — DatabaseService на временном bot.db со всеми миграциями
+  - index       — пустой BlacklistIndex поверх db
+  - fast_sleep  — опрос WorkersAPI без реальных пауз
+"""
+
+import pytest
+
+from parserhub.db_service import DatabaseService
+from parserhub.services.blacklist_index import BlacklistIndex
+
+
+@pytest.fixture
+async def db(tmp_path):
+    service = DatabaseService(str(tmp_path / "bot.db"), readers=1)
+    await service.open()
+    await service.init_db()
+    yield service
+    await service.close()
+
+
+@pytest.fixture
+def index(db):
+    return BlacklistIndex(db.pool)
+
+
+@pytest.fixture
+def fast_sleep(monkeypatch):
+    async def _sleep(delay):
+        return None
+    monkeypatch.setattr("parserhub.api_client.asyncio.sleep", _sleep)
@@ -0,0 +1,194 @@
+"""
+Тесты массовой проверки в ЧС
+
+Покрывает:
+  - parse_candidates              — форматы строк, валидация, дедупликация, лимит
+  - build_report                  — CSV-отчёт
+  - WorkersAPI.run_blacklist_batch — пакетное задание и fallback на проверки по одной
+  - _bulk_search_task             — кэш + один пакет на промахи, похожие записи индекса, отчёт файлом
+"""
+
+import csv
+import io
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from parserhub.api_client import WorkersAPI
+from parserhub.handlers.blacklist import _bulk_search_task
+from parserhub.http_pool import HttpPool
+from parserhub.services.blacklist_bulk import (
+    Candidate,
+    InvalidLine,
+    build_report,
+    decode_upload,
+    parse_candidates,
+)
+
+
+# ─────────────────────────────────────────────
+# 1. Разбор файла
+# ─────────────────────────────────────────────
+
+class TestParseCandidates:
+
+    def test_line_formats(self):
+        parsed = parse_candidates(
+            "username;ФИО\n"
+            "@ivanov_1;Иванов Иван\n"
+            "petrov_22\n"
+            "Сидоров Сергей Сергеевич\n"
+            "\n"
+            "# комментарий\n"
+            "kuznets;\n",
+            limit=10,
+        )
+        assert parsed.candidates == [
+            Candidate("@ivanov_1", "Иванов Иван"),
+            Candidate("@petrov_22", None),
+            Candidate(None, "Сидоров Сергей Сергеевич"),
+            Candidate("@kuznets", None),
+        ]
+        assert parsed.invalid == []
+
+    def test_invalid_lines_reported(self):
+        parsed = parse_candidates("@ok_user\n@x\n@ok_user2;Ivan\na;b;c\n", limit=10)
+        assert [c.username for c in parsed.candidates] == ["@ok_user"]
+        assert [line.line_no for line in parsed.invalid] == [2, 3, 4]
+        assert "<" not in parsed.invalid[1].error  # HTML из сообщений валидатора убран
+
+    def test_duplicates_dropped(self):
+        parsed = parse_candidates("@Ivanov_1\nivanov_1\nЁлкин Пётр\nелкин петр\n", limit=10)
+        assert len(parsed.candidates) == 2
+        assert parsed.duplicates == 2
+
+    def test_limit(self):
+        text = "\n".join(f"@user_{i:03d}" for i in range(5))
+        parsed = parse_candidates(text, limit=3)
+        assert len(parsed.candidates) == 3
+        assert len(parsed.invalid) == 2
+
+    def test_decode_cp1251(self):
+        assert decode_upload("Иванов".encode("cp1251")) == "Иванов"
+        assert decode_upload("﻿Иванов".encode("utf-8")) == "Иванов"
+
+
+class TestBuildReport:
+
+    def test_rows(self):
+        report = build_report(
+            [Candidate("@a_user", None), Candidate(None, "Иванов"), Candidate("@b_user", None)],
+            [
+                {"found": True, "match_type": "fio", "extracted_info": {"phone": "+7"}, "message_text": "кинул"},
+                {"found": False},
+                {"found": False, "error": "FloodWait"},
+            ],
+            [InvalidLine(7, "@x", "неверный формат")],
+        )
+        rows = list(csv.reader(io.StringIO(report.decode("utf-8-sig")), delimiter=";"))
+        assert rows[1][:4] == ["@a_user", "", "НАЙДЕН", "по ФИО"]
+        assert rows[2][2] == "не найден"
+        assert rows[3][2] == "ошибка: FloodWait"
+        assert "строка 7" in rows[4][2]
+
+
+# ─────────────────────────────────────────────
+# 2. WorkersAPI.run_blacklist_batch
+# ─────────────────────────────────────────────
+
+def _api(handler) -> WorkersAPI:
+    pool = HttpPool()
+    pool.client._transport = httpx.MockTransport(handler)
+    return WorkersAPI("http://w", http=pool)
+
+
+class TestRunBlacklistBatch:
+
+    @pytest.mark.asyncio
+    async def test_single_batch_job(self, fast_sleep):
+        seen = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append((request.method, request.url.path))
+            if request.url.path == "/blacklist/jobs/batch":
+                body = json.loads(request.content)
+                assert body["candidates"] == [{"username": "@a_user"}, {"fio": "Иванов"}]
+                return httpx.Response(202, json={"job_id": "b1"})
+            return httpx.Response(200, json={
+                "status": "done",
+                "result": {"results": [{"found": True}, {"found": False}]},
+            })
+
+        api = _api(handler)
+        results = await api.run_blacklist_batch(
+            [{"username": "@a_user", "fio": None}, {"username": None, "fio": "Иванов"}], "/s"
+        )
+        assert results == [{"found": True}, {"found": False}]
+        assert seen == [("POST", "/blacklist/jobs/batch"), ("GET", "/blacklist/jobs/b1")]
+        await api.http.close()
+
+    @pytest.mark.asyncio
+    async def test_fallback_one_by_one(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path.startswith("/blacklist/jobs"):
+                return httpx.Response(404)
+            if request.url.params.get("username") == "@bad_user":
+                return httpx.Response(500)
+            return httpx.Response(200, json={"found": False})
+
+        api = _api(handler)
+        results = await api.run_blacklist_batch(
+            [{"username": "@a_user"}, {"username": "@bad_user"}], "/s"
+        )
+        assert results[0] == {"found": False}
+        assert "error" in results[1]
+        await api.http.close()
+
+
+# ─────────────────────────────────────────────
+# 3. Фоновая задача
+# ─────────────────────────────────────────────
+
+class TestBulkSearchTask:
+
+    @pytest.mark.asyncio
+    async def test_cached_candidates_skip_batch(self):
+        parsed = parse_candidates("@a_user\n@b_user\n", limit=10)
+        cache = MagicMock()
+        cache.get = AsyncMock(side_effect=lambda key: (
+            MagicMock(result={"found": True}) if "a_user" in key else None
+        ))
+        cache.put = AsyncMock()
+        workers_api = MagicMock()
+        workers_api.run_blacklist_batch = AsyncMock(return_value=[{"found": False}])
+        bot = MagicMock()
+        bot.send_document = AsyncMock()
+
+        await _bulk_search_task(bot, 1, 1, parsed, workers_api, "/s", cache=cache)
+
+        sent = workers_api.run_blacklist_batch.call_args.args[0]
+        assert sent == [{"username": "@b_user", "fio": None}]
+        cache.put.assert_awaited_once()
+        kwargs = bot.send_document.call_args.kwargs
+        assert kwargs["filename"].endswith(".csv")
+        assert "Найдено в ЧС:</b> 1" in kwargs["caption"]
+
+    @pytest.mark.asyncio
+    async def test_similar_index_records_still_checked(self):
+        parsed = parse_candidates("Ивонов Иван Петрович\n", limit=10)
+        similar = [{"record_id": "1", "full_name": "Иванов Иван Петрович", "message_link": None, "score": 0.857}]
+        index = MagicMock()
+        index.lookup = AsyncMock(return_value={"found": False, "score": 0.857, "candidates": similar})
+        workers_api = MagicMock()
+        workers_api.run_blacklist_batch = AsyncMock(return_value=[{"found": False}])
+        bot = MagicMock()
+        bot.send_document = AsyncMock()
+
+        await _bulk_search_task(bot, 1, 1, parsed, workers_api, "/s", index=index)
+
+        workers_api.run_blacklist_batch.assert_awaited_once()
+        kwargs = bot.send_document.call_args.kwargs
+        assert "Найдено в ЧС:</b> 0" in kwargs["caption"]
+        assert "похожие записи: Иванов Иван Петрович 86%" in kwargs["document"].decode("utf-8-sig")
@@ -0,0 +1,195 @@
+"""
+Тесты персистентного кэша результатов проверки в ЧС
+
+Покрывает:
+  - blacklist_cache_key        — нормализация никнейма и ФИО, ключ по item_id
+  - checked_username_key       — ключ ручной проверки по никнейму проверенного автора
+  - BlacklistCache             — put/get, TTL, выключенный кэш, clear, delete_expired
+  - receive_fio                — попадание в кэш отвечает сразу, без фонового поиска
+  - _blacklist_search_task     — успешный результат сохраняется, ошибка — нет
+  - _notification_blacklist_task — результат доступен ручной проверке того же никнейма
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from telegram.ext import ConversationHandler
+
+from parserhub.db_service import DatabaseService
+from parserhub.handlers.blacklist import _blacklist_search_task, receive_fio
+from parserhub.handlers.workers import _notification_blacklist_task
+from parserhub.services.blacklist_cache import BlacklistCache, blacklist_cache_key, checked_username_key
+
+
+@pytest.fixture
+def cache(db):
+    return BlacklistCache(db.pool, ttl=60)
+
+
+NOT_FOUND = {"found": False, "steps_done": ["username"], "messages_checked": 10, "chats_checked": ["@a"]}
+
+
+# ─────────────────────────────────────────────
+# 1. Ключ кэша
+# ─────────────────────────────────────────────
+
+class TestCacheKey:
+
+    def test_username_normalized(self):
+        assert blacklist_cache_key(username="@Ivan") == blacklist_cache_key(username="ivan")
+
+    def test_fio_normalized(self):
+        assert (
+            blacklist_cache_key(fio="Ёлкин  Пётр")
+            == blacklist_cache_key(fio="елкин петр")
+        )
+
+    def test_username_and_fio_are_distinct(self):
+        assert blacklist_cache_key(username="ivan") != blacklist_cache_key(username="ivan", fio="Иванов")
+
+    def test_item_key(self):
+        assert blacklist_cache_key(item_id=7) == "item:7"
+
+    def test_checked_username_matches_manual_key(self):
+        assert checked_username_key({"username": "@Ivan", "user_id": 5}) == blacklist_cache_key(username="ivan")
+
+    def test_checked_without_username(self):
+        assert checked_username_key({"username": None, "user_id": 5}) is None
+
+
+# ─────────────────────────────────────────────
+# 2. BlacklistCache поверх bot.db
+# ─────────────────────────────────────────────
+
+class TestBlacklistCache:
+
+    @pytest.mark.asyncio
+    async def test_put_get(self, cache):
+        await cache.put("k", NOT_FOUND)
+        cached = await cache.get("k")
+        assert cached.result == NOT_FOUND
+        assert isinstance(cached.cached_at, datetime)
+
+    @pytest.mark.asyncio
+    async def test_missing(self, cache):
+        assert await cache.get("nope") is None
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_ignored_and_purged(self, cache):
+        await cache.put("k", NOT_FOUND)
+        later = datetime.utcnow() + timedelta(seconds=61)
+        with patch("parserhub.services.blacklist_cache.datetime") as mock_dt:
+            mock_dt.utcnow.return_value = later
+            mock_dt.fromisoformat = datetime.fromisoformat
+            assert await cache.get("k") is None
+            assert await cache.delete_expired() == 1
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, db):
+        cache = BlacklistCache(db.pool, ttl=0)
+        await cache.put("k", NOT_FOUND)
+        assert await cache.get("k") is None
+
+    @pytest.mark.asyncio
+    async def test_clear(self, cache):
+        await cache.put("a", NOT_FOUND)
+        await cache.put("b", NOT_FOUND)
+        assert await cache.clear() == 2
+        assert await cache.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_survives_reopen(self, tmp_path):
+        path = str(tmp_path / "bot.db")
+        first = DatabaseService(path, readers=1)
+        await first.open()
+        await first.init_db()
+        await BlacklistCache(first.pool, ttl=60).put("k", NOT_FOUND)
+        await first.close()
+
+        second = DatabaseService(path, readers=1)
+        await second.open()
+        await second.init_db()
+        assert (await BlacklistCache(second.pool, ttl=60).get("k")).result == NOT_FOUND
+        await second.close()
+
+
+# ─────────────────────────────────────────────
+# 3. Обработчики
+# ─────────────────────────────────────────────
+
+def make_update(text: str, user_id: int = 42) -> MagicMock:
+    update = MagicMock()
+    update.message.text = text
+    update.message.reply_text = AsyncMock()
+    update.effective_user.id = user_id
+    update.effective_chat.id = user_id
+    return update
+
+
+class TestHandlers:
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_answers_without_search(self, cache):
+        await cache.put(blacklist_cache_key(fio="Иванов Иван"), NOT_FOUND)
+
+        update = make_update("Иванов Иван")
+        context = MagicMock()
+        context.user_data = {"bl_username": ""}
+        scheduler = MagicMock()
+        context.bot_data = {
+            "workers_api": MagicMock(), "db": MagicMock(), "blacklist_cache": cache,
+            "blacklist_scheduler": scheduler,
+        }
+        context.bot.send_message = AsyncMock()
+
+        state = await receive_fio(update, context)
+
+        assert state == ConversationHandler.END
+        scheduler.submit.assert_not_called()
+        assert "НЕ найден" in context.bot.send_message.call_args.kwargs["text"]
+
+    @pytest.mark.asyncio
+    async def test_search_task_stores_result(self, cache):
+        workers_api = MagicMock()
+        workers_api.submit_blacklist_check = AsyncMock(return_value=None)
+        workers_api.check_blacklist = AsyncMock(return_value=NOT_FOUND)
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+
+        await _blacklist_search_task(
+            bot=bot, chat_id=1, user_id=1, username="@ivan", normalized_username="@ivan", fio=None,
+            workers_api=workers_api, db=MagicMock(), blacklist_session_path="/s", bot_data={},
+            cache=cache,
+        )
+
+        assert (await cache.get(blacklist_cache_key(username="ivan"))).result == NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_search_task_skips_errors(self, cache):
+        workers_api = MagicMock()
+        workers_api.submit_blacklist_check = AsyncMock(return_value=None)
+        workers_api.check_blacklist = AsyncMock(return_value={"found": False, "error": "FloodWait"})
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+
+        await _blacklist_search_task(
+            bot=bot, chat_id=1, user_id=1, username="@ivan", normalized_username="@ivan", fio=None,
+            workers_api=workers_api, db=MagicMock(), blacklist_session_path="/s", bot_data={},
+            cache=cache,
+        )
+
+        assert await cache.get(blacklist_cache_key(username="ivan")) is None
+
+    @pytest.mark.asyncio
+    async def test_notification_result_shared_with_manual_check(self, cache):
+        checked = {**NOT_FOUND, "username": "Ivan", "user_id": 5}
+        workers_api = MagicMock()
+        workers_api.run_blacklist_check_by_item = AsyncMock(return_value={"result": checked})
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+
+        await _notification_blacklist_task(bot, 1, 7, workers_api, bot_data={}, cache=cache)
+
+        assert (await cache.get(blacklist_cache_key(item_id=7))).result == {"result": checked}
+        assert (await cache.get(blacklist_cache_key(username="@ivan"))).result == checked
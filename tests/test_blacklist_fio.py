@@ -263,13 +263,16 @@ class TestReceiveUsername:
 class TestReceiveFio:
 
     def _make_bot_data(self) -> dict:
-        """bot_data с моком workers_api и db."""
+        """bot_data с моком workers_api, db и очереди поисков."""
         workers_api = MagicMock()
         workers_api.check_blacklist = AsyncMock(return_value={"found": False, "steps_done": []})
         db = MagicMock()
+        scheduler = MagicMock()
+        scheduler.position.return_value = 0
         return {
             "workers_api": workers_api,
             "db": db,
+            "blacklist_scheduler": scheduler,
         }
 
     # --- FIO-only режим (bl_username="") ---
@@ -283,12 +286,11 @@ class TestReceiveFio:
             bot_data=self._make_bot_data(),
         )
 
-        with patch("parserhub.handlers.blacklist.asyncio.create_task") as mock_task:
-            state = await receive_fio(update, context)
+        state = await receive_fio(update, context)
 
         assert state == ConversationHandler.END
         assert "bl_username" not in context.user_data
-        mock_task.assert_called_once()
+        context.bot_data["blacklist_scheduler"].submit.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_fio_only_skip_is_rejected(self):
@@ -342,8 +344,7 @@ class TestReceiveFio:
             bot_data=self._make_bot_data(),
         )
 
-        with patch("parserhub.handlers.blacklist.asyncio.create_task"):
-            await receive_fio(update, context)
+        await receive_fio(update, context)
 
         launch_text = update.message.reply_text.call_args.args[0]
         assert "ФИО" in launch_text
@@ -361,11 +362,10 @@ class TestReceiveFio:
             bot_data=self._make_bot_data(),
         )
 
-        with patch("parserhub.handlers.blacklist.asyncio.create_task") as mock_task:
-            state = await receive_fio(update, context)
+        state = await receive_fio(update, context)
 
         assert state == ConversationHandler.END
-        mock_task.assert_called_once()
+        context.bot_data["blacklist_scheduler"].submit.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_username_mode_skip_fio_launches_search(self):
@@ -376,11 +376,10 @@ class TestReceiveFio:
             bot_data=self._make_bot_data(),
         )
 
-        with patch("parserhub.handlers.blacklist.asyncio.create_task") as mock_task:
-            state = await receive_fio(update, context)
+        state = await receive_fio(update, context)
 
         assert state == ConversationHandler.END
-        mock_task.assert_called_once()
+        context.bot_data["blacklist_scheduler"].submit.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_username_mode_invalid_fio_stays_in_state(self):
@@ -426,22 +425,36 @@ class TestReceiveFio:
         assert "Ошибка" in error_text
 
     @pytest.mark.asyncio
-    async def test_already_searching_returns_end(self):
-        """Если поиск уже идёт → сообщение 'подождите', ConversationHandler.END."""
-        user_id = 99
-        update = make_update("Иванов", user_id=user_id)
+    async def test_user_queue_full_returns_end(self):
+        """Личная очередь поисков заполнена → сообщение 'дождитесь', ConversationHandler.END."""
+        update = make_update("Иванов", user_id=99)
         bot_data = self._make_bot_data()
-        bot_data["blacklist_searching"] = {user_id}  # уже ищет
+        bot_data["blacklist_scheduler"].submit.return_value = None  # очередь заполнена
+        bot_data["blacklist_scheduler"].user_queue = 3
         context = make_context(
             user_data={"bl_username": ""},
             bot_data=bot_data,
         )
 
-        with patch("parserhub.handlers.blacklist.asyncio.create_task") as mock_task:
-            state = await receive_fio(update, context)
+        state = await receive_fio(update, context)
 
         assert state == ConversationHandler.END
-        mock_task.assert_not_called()
+        assert "Очередь" in update.message.reply_text.call_args.args[0]
+
+    @pytest.mark.asyncio
+    async def test_queued_search_shows_position(self):
+        """Поиск ждёт свободного слота → в сообщении позиция в очереди."""
+        update = make_update("Иванов")
+        bot_data = self._make_bot_data()
+        bot_data["blacklist_scheduler"].position.return_value = 4
+        context = make_context(
+            user_data={"bl_username": ""},
+            bot_data=bot_data,
+        )
+
+        await receive_fio(update, context)
+
+        assert "позиция 4" in update.message.reply_text.call_args.args[0]
 
     # --- Sentinel гарантии: bl_username pop только при успехе ---
 
@@ -469,10 +482,14 @@ class TestApiClientCheckBlacklist:
 
     def _make_api_client(self, mock_response: dict):
         """Создаёт WorkersAPI с замоканным httpx клиентом."""
+        import httpx
         from parserhub.api_client import WorkersAPI
 
         client = WorkersAPI.__new__(WorkersAPI)
         client.base_url = "http://test"
+        # Пул без настоящего AsyncClient — запросы идут через client ниже
+        client.http = MagicMock()
+        client.http.timeout = MagicMock(return_value=httpx.Timeout(30.0))
 
         mock_resp = MagicMock()
         mock_resp.raise_for_status = MagicMock()
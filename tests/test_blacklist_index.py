@@ -0,0 +1,146 @@
+"""
+Тесты локального индекса записей ЧС
+
+Покрывает:
+  - BlacklistIndex.sync    — постраничная дельта-синхронизация, курсор, удаления, reset
+  - BlacklistIndex.lookup  — по никнейму, по всем словам ФИО (ё → е), до синхронизации
+  - receive_fio            — совпадение в индексе отвечается без постановки в очередь
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram.ext import ConversationHandler
+
+from parserhub.handlers.blacklist import receive_fio
+from parserhub.services.blacklist_index import BlacklistIndex
+
+
+def _record(rid, **fields) -> dict:
+    return {"id": rid, "chat": "@bl_chat", "message_link": f"https://t.me/bl_chat/{rid}", **fields}
+
+
+def _feed(*pages) -> MagicMock:
+    api = MagicMock()
+    api.get_blacklist_changes = AsyncMock(side_effect=list(pages))
+    return api
+
+
+# ─────────────────────────────────────────────
+# 1. Синхронизация
+# ─────────────────────────────────────────────
+
+class TestSync:
+
+    @pytest.mark.asyncio
+    async def test_pages_and_cursor(self, index):
+        api = _feed(
+            {"records": [_record(1, username="@Ivan_1")], "cursor": "c1", "has_more": True},
+            {"records": [_record(2, full_name="Петров Пётр")], "cursor": "c2", "has_more": False},
+        )
+        assert await index.sync(api) == 2
+        assert await index.count() == 2
+        assert index.ready
+
+        api.get_blacklist_changes.assert_any_await(None, limit=1000)
+        api.get_blacklist_changes.assert_any_await("c1", limit=1000)
+
+        # Следующая синхронизация продолжает с сохранённого курсора
+        api = _feed({"records": [], "cursor": "c2", "has_more": False})
+        await BlacklistIndex(index.pool).sync(api)
+        api.get_blacklist_changes.assert_awaited_once_with("c2", limit=1000)
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete(self, index):
+        await index.sync(_feed({"records": [_record(1, full_name="Иванов Иван")], "cursor": "c1"}))
+        await index.sync(_feed({"records": [_record(1, full_name="Сидоров Сидор")], "cursor": "c2"}))
+        assert await index.lookup(fio="Иванов") is None
+        assert await index.lookup(fio="Сидоров") is not None
+
+        await index.sync(_feed({"records": [{"id": 1, "deleted": True}], "cursor": "c3"}))
+        assert await index.count() == 0
+        assert await index.lookup(fio="Сидоров") is None
+
+    @pytest.mark.asyncio
+    async def test_reset(self, index):
+        await index.sync(_feed({"records": [_record(1, username="old_user")], "cursor": "c1"}))
+        await index.sync(_feed({"records": [_record(2, username="new_user")], "cursor": "r1", "reset": True}))
+        assert await index.lookup(username="old_user") is None
+        assert await index.lookup(username="new_user") is not None
+
+    @pytest.mark.asyncio
+    async def test_feed_not_supported(self, index):
+        assert await index.sync(_feed(None)) == 0
+        assert index.ready is False
+
+
+# ─────────────────────────────────────────────
+# 2. Поиск
+# ─────────────────────────────────────────────
+
+class TestLookup:
+
+    @pytest.fixture
+    async def filled(self, index):
+        await index.sync(_feed({
+            "records": [
+                _record(1, username="Ivan_1", user_id=111, phone="+79990000000", full_name="Иванов Иван"),
+                _record(2, full_name="Ёлкин Пётр Семёнович", message_text="Кинул на смену"),
+                _record(3, message_text="Не вышел: Петров-Водкин Кузьма"),
+            ],
+            "cursor": "c1",
+        }))
+        return index
+
+    @pytest.mark.asyncio
+    async def test_not_ready(self, index):
+        assert await index.lookup(username="ivan_1") is None
+
+    @pytest.mark.asyncio
+    async def test_by_username(self, filled):
+        result = await filled.lookup(username="@IVAN_1")
+        assert result["found"] and result["match_type"] == "username"
+        assert result["extracted_info"]["user_id"] == 111
+        assert result["message_link"] == "https://t.me/bl_chat/1"
+
+    @pytest.mark.asyncio
+    async def test_by_fio_tokens(self, filled):
+        assert (await filled.lookup(fio="Елкин Петр"))["match_type"] == "fio"
+        assert await filled.lookup(fio="Елкин Иван") is None
+
+    @pytest.mark.asyncio
+    async def test_fio_in_message_text(self, filled):
+        result = await filled.lookup(fio="Петров-Водкин")
+        assert result["message_link"] == "https://t.me/bl_chat/3"
+
+    @pytest.mark.asyncio
+    async def test_miss(self, filled):
+        assert await filled.lookup(username="nobody_here", fio="Сидоров") is None
+
+
+# ─────────────────────────────────────────────
+# 3. Обработчик
+# ─────────────────────────────────────────────
+
+class TestHandler:
+
+    @pytest.mark.asyncio
+    async def test_index_hit_answers_without_search(self, index):
+        await index.sync(_feed({"records": [_record(1, full_name="Иванов Иван")], "cursor": "c1"}))
+
+        update = MagicMock()
+        update.message.text = "Иванов Иван"
+        update.message.reply_text = AsyncMock()
+        update.effective_user.id = update.effective_chat.id = 42
+        context = MagicMock()
+        context.user_data = {"bl_username": ""}
+        scheduler = MagicMock()
+        context.bot_data = {
+            "workers_api": MagicMock(), "db": MagicMock(),
+            "blacklist_index": index, "blacklist_scheduler": scheduler,
+        }
+        context.bot.send_message = AsyncMock()
+
+        assert await receive_fio(update, context) == ConversationHandler.END
+        scheduler.submit.assert_not_called()
+        assert "найден в черном списке" in context.bot.send_message.call_args.kwargs["text"]
@@ -0,0 +1,264 @@
+"""
+Тесты job API проверки ЧС (submit → poll) в WorkersAPI
+
+Покрывает:
+  - run_blacklist_check         — задание выполняется, результат забирается опросом
+  - fallback                    — сервис без job API → синхронный /blacklist/check
+  - wait_blacklist_job          — failed-задание, превышение deadline, повтор сбоев опроса
+  - iter_blacklist_job          — NDJSON-поток событий, fallback на опрос (запоминается)
+  - _blacklist_search_task      — 401 из потока событий сбрасывает авторизацию
+  - _run_search_with_progress   — раннее совпадение, троттлинг редактирований
+"""
+
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from parserhub.api_client import BlacklistJobError, WorkersAPI
+from parserhub.handlers.blacklist import _ProgressMessage, _blacklist_search_task, _run_search_with_progress
+from parserhub.http_pool import HttpPool
+
+# Опрос без реальных пауз
+pytestmark = pytest.mark.usefixtures("fast_sleep")
+
+
+def _api(handler) -> WorkersAPI:
+    pool = HttpPool()
+    pool.client._transport = httpx.MockTransport(handler)
+    return WorkersAPI("http://w", http=pool)
+
+
+class TestBlacklistJobs:
+
+    @pytest.mark.asyncio
+    async def test_submit_and_poll(self):
+        polls = []
+
+        def handler(request):
+            if request.method == "POST" and request.url.path == "/blacklist/jobs":
+                assert request.url.params["fio"] == "Иванов"
+                assert "username" not in request.url.params
+                return httpx.Response(202, json={"job_id": "j1"})
+            if request.url.path == "/blacklist/jobs/j1":
+                polls.append(1)
+                if len(polls) < 3:
+                    return httpx.Response(200, json={"status": "running"})
+                return httpx.Response(200, json={"status": "done", "result": {"found": True}})
+            return httpx.Response(500)
+
+        api = _api(handler)
+        result = await api.run_blacklist_check(None, "/sessions/1_blacklist", fio="Иванов")
+        assert result == {"found": True}
+        assert len(polls) == 3
+
+    @pytest.mark.asyncio
+    async def test_fallback_to_sync_endpoint(self):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            if request.url.path.endswith("/jobs"):
+                return httpx.Response(404)
+            return httpx.Response(200, json={"result": {"found": False}})
+
+        api = _api(handler)
+        assert await api.run_blacklist_check_by_item(7) == {"result": {"found": False}}
+        assert await api.run_blacklist_check_by_item(8) == {"result": {"found": False}}
+        # Job API больше не пробуется после первого 404
+        assert paths == [
+            "/workers/7/check-blacklist/jobs",
+            "/workers/7/check-blacklist",
+            "/workers/8/check-blacklist",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_failed_job_raises(self):
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(202, json={"job_id": "j2"})
+            return httpx.Response(200, json={"status": "failed", "error": "AUTH_KEY_UNREGISTERED"})
+
+        with pytest.raises(BlacklistJobError, match="AUTH_KEY_UNREGISTERED"):
+            await _api(handler).run_blacklist_check("@user", "/sessions/1_blacklist")
+
+    @pytest.mark.asyncio
+    async def test_deadline(self):
+        api = _api(lambda request: httpx.Response(200, json={"status": "pending"}))
+        with pytest.raises(BlacklistJobError):
+            await api.wait_blacklist_job("j3", deadline=0)
+
+    @pytest.mark.asyncio
+    async def test_transient_poll_errors_retried(self):
+        replies = iter([
+            httpx.ConnectError("reset"),
+            httpx.Response(503),
+            httpx.Response(200, json={"status": "running"}),
+            httpx.Response(502),
+            httpx.Response(200, json={"status": "done", "result": {"found": False}}),
+        ])
+
+        def handler(request):
+            reply = next(replies)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+
+        assert await _api(handler).wait_blacklist_job("j4") == {"found": False}
+
+    @pytest.mark.asyncio
+    async def test_missing_job_not_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(1)
+            return httpx.Response(404)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await _api(handler).wait_blacklist_job("j5")
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_poll_errors_until_deadline(self):
+        api = _api(lambda request: httpx.Response(503))
+        with pytest.raises(BlacklistJobError, match="не удалось опросить"):
+            await api.wait_blacklist_job("j6", deadline=0)
+
+
+def _ndjson(*events) -> bytes:
+    return "\n".join(json.dumps(e) for e in events).encode() + b"\n"
+
+
+class _Streamed(httpx.AsyncByteStream):
+    """Тело, которое не читается заранее (как у настоящего потокового ответа)"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def __aiter__(self):
+        yield self.body
+
+
+def _unauthorized(request) -> httpx.Response:
+    return httpx.Response(
+        401, headers={"content-type": "application/json"}, stream=_Streamed(b'{"detail": "Unauthorized"}')
+    )
+
+
+class TestBlacklistJobEvents:
+
+    @pytest.mark.asyncio
+    async def test_stream_events(self):
+        events = [
+            {"type": "progress", "stage": "username", "chats_checked": 1, "chats_total": 3},
+            {"type": "done", "result": {"found": False}},
+            {"type": "progress", "stage": "fio"},  # после done не читается
+        ]
+        api = _api(lambda request: httpx.Response(200, content=_ndjson(*events)))
+        received = [e async for e in api.iter_blacklist_job("j1")]
+        assert [e["type"] for e in received] == ["progress", "done"]
+
+    @pytest.mark.asyncio
+    async def test_poll_fallback_events(self):
+        polls = []
+
+        def handler(request):
+            if request.url.path.endswith("/events"):
+                return httpx.Response(404)
+            polls.append(1)
+            if len(polls) == 1:
+                return httpx.Response(200, json={"status": "running", "progress": {"stage": "user_id"}})
+            return httpx.Response(200, json={"status": "done", "result": {"found": True}})
+
+        received = [e async for e in _api(handler).iter_blacklist_job("j1")]
+        assert received == [
+            {"type": "progress", "stage": "user_id"},
+            {"type": "done", "result": {"found": True}},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_missing_events_endpoint_remembered(self):
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            if request.url.path.endswith("/events"):
+                return httpx.Response(404)
+            return httpx.Response(200, json={"status": "done", "result": {"found": False}})
+
+        api = _api(handler)
+        assert [e["type"] async for e in api.iter_blacklist_job("j1")] == ["done"]
+        assert [e["type"] async for e in api.iter_blacklist_job("j2")] == ["done"]
+        # Поток больше не запрашивается после первого 404
+        assert paths == [
+            "/blacklist/jobs/j1/events",
+            "/blacklist/jobs/j1",
+            "/blacklist/jobs/j2",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_stream_error_body_readable(self):
+        api = _api(_unauthorized)
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            [e async for e in api.iter_blacklist_job("j1")]
+        assert exc_info.value.response.json() == {"detail": "Unauthorized"}
+
+    @pytest.mark.asyncio
+    async def test_stream_unauthorized_resets_auth(self):
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(202, json={"job_id": "j1"})
+            return _unauthorized(request)
+
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+        db = MagicMock()
+        db.update_auth_status = AsyncMock()
+
+        await _blacklist_search_task(bot, 1, 42, "@user", "user", None, _api(handler), db, "/s", {})
+
+        db.update_auth_status.assert_awaited_once_with(42, "blacklist", False)
+        assert "Авторизация оборвана" in bot.send_message.await_args.kwargs["text"]
+
+
+class TestSearchProgress:
+
+    def _bot(self):
+        bot = MagicMock()
+        bot.send_message = AsyncMock(return_value=MagicMock(message_id=10))
+        bot.edit_message_text = AsyncMock()
+        return bot
+
+    @pytest.mark.asyncio
+    async def test_early_hit_returned_before_done(self):
+        events = [
+            {"type": "progress", "stage": "username", "chats_checked": 1, "chats_total": 5},
+            {"type": "progress", "stage": "username", "chats_checked": 2, "chats_total": 5},
+            {"type": "hit", "result": {"found": True, "match_type": "username"}},
+            {"type": "progress", "stage": "fio", "chats_checked": 5, "chats_total": 5},
+        ]
+
+        def handler(request):
+            if request.method == "POST":
+                return httpx.Response(202, json={"job_id": "j1"})
+            return httpx.Response(200, content=_ndjson(*events))
+
+        bot = self._bot()
+        progress = _ProgressMessage(bot, chat_id=1, min_interval=60)
+        result = await _run_search_with_progress(_api(handler), progress, "@user", "/s", None)
+
+        assert result["found"] is True
+        # Первый прогресс отправлен, второй отброшен троттлингом
+        bot.send_message.assert_awaited_once()
+        bot.edit_message_text.assert_not_awaited()
+
+        await progress.finish("done")
+        bot.edit_message_text.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_finish_without_progress_sends_nothing(self):
+        bot = self._bot()
+        progress = _ProgressMessage(bot, chat_id=1)
+        await progress.finish("done")
+        bot.send_message.assert_not_awaited()
@@ -0,0 +1,159 @@
+"""
+Тесты очереди поисков в ЧС
+
+Покрывает:
+  - BlacklistScheduler.submit    — общий лимит, один поиск на пользователя, глубина очереди
+  - round-robin                  — пачка запросов одного пользователя не задерживает других
+  - position                     — позиция в очереди
+  - cancel                       — отмена ожидающих и выполняющегося поиска
+  - stats                        — время ожидания и выполнения
+"""
+
+import asyncio
+
+import pytest
+
+from parserhub.services.blacklist_scheduler import BlacklistScheduler
+
+
+class _Searches:
+    """Фиктивные поиски: каждый ждёт своего release, порядок запусков пишется в started."""
+
+    def __init__(self):
+        self.started: list[str] = []
+        self.events: dict[str, asyncio.Event] = {}
+
+    def factory(self, name: str):
+        self.events[name] = asyncio.Event()
+
+        async def search():
+            self.started.append(name)
+            await self.events[name].wait()
+
+        return search
+
+    async def release(self, name: str):
+        self.events[name].set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+
+async def _tick():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+class TestBlacklistScheduler:
+
+    @pytest.mark.asyncio
+    async def test_global_limit(self):
+        searches = _Searches()
+        scheduler = BlacklistScheduler(concurrency=2)
+        for uid in (1, 2, 3):
+            scheduler.submit(uid, searches.factory(f"u{uid}"))
+        await _tick()
+
+        assert searches.started == ["u1", "u2"]
+        assert scheduler.stats()["running"] == 2
+        assert scheduler.stats()["queued"] == 1
+
+        await searches.release("u1")
+        assert searches.started == ["u1", "u2", "u3"]
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_one_running_search_per_user(self):
+        searches = _Searches()
+        scheduler = BlacklistScheduler(concurrency=5)
+        first = scheduler.submit(1, searches.factory("a"))
+        second = scheduler.submit(1, searches.factory("b"))
+        await _tick()
+
+        assert searches.started == ["a"]
+        assert scheduler.position(first) == 0
+        assert scheduler.position(second) == 1
+
+        await searches.release("a")
+        assert searches.started == ["a", "b"]
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_user_queue_depth(self):
+        searches = _Searches()
+        scheduler = BlacklistScheduler(concurrency=1, user_queue=2)
+        assert scheduler.submit(1, searches.factory("a")) is not None   # выполняется
+        assert scheduler.submit(1, searches.factory("b")) is not None
+        assert scheduler.submit(1, searches.factory("c")) is not None
+        assert scheduler.submit(1, searches.factory("d")) is None
+        assert scheduler.stats()["rejected"] == 1
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_round_robin_between_users(self):
+        searches = _Searches()
+        scheduler = BlacklistScheduler(concurrency=1, user_queue=5)
+        blocker = scheduler.submit(9, searches.factory("blocker"))
+        for name in ("a1", "a2", "a3"):
+            scheduler.submit(1, searches.factory(name))
+        b1 = scheduler.submit(2, searches.factory("b1"))
+        await _tick()
+
+        assert scheduler.position(blocker) == 0
+        assert scheduler.position(b1) == 2  # после a1, а не после всех запросов пользователя 1
+
+        for name in ("blocker", "a1", "b1", "a2"):
+            await searches.release(name)
+        assert searches.started == ["blocker", "a1", "b1", "a2", "a3"]
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_cancel_queued_and_running(self):
+        searches = _Searches()
+        scheduler = BlacklistScheduler(concurrency=1)
+        running = scheduler.submit(1, searches.factory("a"))
+        scheduler.submit(1, searches.factory("b"))
+        scheduler.submit(2, searches.factory("c"))
+        await _tick()
+
+        assert scheduler.cancel(1) == 2
+        await _tick()
+
+        assert running.task.cancelled()
+        assert searches.started == ["a", "c"]
+        assert scheduler.pending(1) == 0
+        assert scheduler.stats()["cancelled"] == 2
+        assert scheduler.stats()["completed"] == 0
+        await searches.release("c")
+        stats = scheduler.stats()
+        assert stats["completed"] == 1 and stats["cancelled"] == 2
+        await scheduler.close()
+
+    @pytest.mark.asyncio
+    async def test_failed_search_frees_slot(self):
+        scheduler = BlacklistScheduler(concurrency=1)
+        done = asyncio.Event()
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        async def ok():
+            done.set()
+
+        scheduler.submit(1, broken)
+        scheduler.submit(2, ok)
+        await asyncio.wait_for(done.wait(), 1)
+
+    @pytest.mark.asyncio
+    async def test_stats_record_wait_and_run(self):
+        searches = _Searches()
+        scheduler = BlacklistScheduler(concurrency=1)
+        scheduler.submit(1, searches.factory("a"))
+        scheduler.submit(2, searches.factory("b"))
+        await _tick()
+        await searches.release("a")
+        await searches.release("b")
+
+        stats = scheduler.stats()
+        assert stats["completed"] == 2
+        assert stats["wait_max"] >= 0 and stats["run_max"] >= 0
+        assert stats["running"] == 0 and stats["queued"] == 0
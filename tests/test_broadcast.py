@@ -0,0 +1,131 @@
+"""
+Тесты рассылок админов
+
+Покрывает:
+  - BroadcastService.create      — снимок аудитории (все / подписчики / пробный период)
+  - BroadcastManager             — доставка, Forbidden → blocked, прочие ошибки → failed,
+                                   возобновление после прерывания, остановка
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram.error import BadRequest, Forbidden
+
+from parserhub.rate_limiter import Priority
+from parserhub.services.broadcast import BroadcastManager, BroadcastService
+
+
+@pytest.fixture
+async def service(db):
+    async with db.pool.write() as conn:
+        # 1–3: подписчики, 4–5: пробный период (у 3 — оба), 6–10: без доступа
+        await conn.executemany(
+            "INSERT INTO users (user_id, created_at, trial_until) VALUES (?, '2026-01-01', ?)",
+            [(i, "2999-01-01" if i in (3, 4, 5) else "2000-01-01") for i in range(1, 11)],
+        )
+        await conn.executemany(
+            "INSERT INTO subscriptions (user_id, plan, active_until, created_at, updated_at) "
+            "VALUES (?, 'month', '2999-01-01', '2026-01-01', '2026-01-01')",
+            [(i,) for i in (1, 2, 3)],
+        )
+    return BroadcastService(db.pool)
+
+
+def _bot(fail: dict = None, delay: float = 0.0) -> MagicMock:
+    """Мок бота: fail — user_id → исключение; отчёты админу (chat_id 999) не считаются"""
+    bot = MagicMock()
+    bot.delivered = []
+
+    async def send_message(chat_id, text, **kwargs):
+        if chat_id == 999:
+            return MagicMock(message_id=1)
+        assert kwargs["rate_limit_args"] == Priority.BULK
+        await asyncio.sleep(delay)
+        if fail and chat_id in fail:
+            raise fail[chat_id]
+        bot.delivered.append(chat_id)
+
+    bot.send_message = AsyncMock(side_effect=send_message)
+    bot.edit_message_text = AsyncMock()
+    return bot
+
+
+# ─────────────────────────────────────────────
+# 1. Снимок аудитории
+# ─────────────────────────────────────────────
+
+class TestAudience:
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("audience, expected", [("all", 10), ("subs", 3), ("trials", 2)])
+    async def test_snapshot(self, service, audience, expected):
+        assert await service.count_audience(audience) == expected
+        broadcast = await service.create(1, audience, "<b>Привет</b>", 999)
+        assert broadcast["total"] == expected
+        assert broadcast["status"] == "running"
+        assert len(await service.pending_page(broadcast["id"], 0, 100)) == expected
+
+
+# ─────────────────────────────────────────────
+# 2. Отправка
+# ─────────────────────────────────────────────
+
+class TestBroadcastManager:
+
+    @pytest.mark.asyncio
+    async def test_delivery_and_error_mapping(self, service):
+        broadcast = await service.create(1, "all", "текст", 999)
+        bot = _bot(fail={2: Forbidden("bot was blocked by the user"), 5: BadRequest("Chat not found")})
+        manager = BroadcastManager(service, concurrency=3, page_size=4)
+
+        await manager.start(bot, broadcast)
+
+        state = await service.get(broadcast["id"])
+        assert (state["status"], state["sent"], state["blocked"], state["failed"]) == ("done", 8, 1, 1)
+        assert sorted(bot.delivered) == [1, 3, 4, 6, 7, 8, 9, 10]
+        assert await service.pending_page(broadcast["id"], 0, 100) == []
+        assert manager.running() == []
+        # Итоговый отчёт админу
+        assert "завершена" in bot.edit_message_text.call_args.kwargs["text"]
+
+    @pytest.mark.asyncio
+    async def test_resume_after_interruption(self, service):
+        broadcast = await service.create(1, "all", "текст", 999)
+        manager = BroadcastManager(service, concurrency=1, page_size=2)
+        bot = _bot(delay=0.05)
+
+        task = manager.start(bot, broadcast)
+        await asyncio.sleep(0.17)
+        await manager.close()  # остановка бота
+        assert task.cancelled()
+
+        state = await service.get(broadcast["id"])
+        assert state["status"] == "running"
+        assert 0 < state["sent"] < 10
+        first_run = list(bot.delivered)
+
+        # Рестарт: продолжаем с неотправленных, никто не получает сообщение дважды
+        bot = _bot()
+        assert await manager.resume(bot) == 1
+        await asyncio.gather(*(manager._tasks[i] for i in manager.running()))
+        assert sorted(first_run + bot.delivered) == list(range(1, 11))
+        state = await service.get(broadcast["id"])
+        assert (state["status"], state["sent"]) == ("done", 10)
+
+    @pytest.mark.asyncio
+    async def test_cancel(self, service):
+        broadcast = await service.create(1, "all", "текст", 999)
+        manager = BroadcastManager(service, concurrency=1, page_size=2)
+        bot = _bot(delay=0.05)
+
+        manager.start(bot, broadcast)
+        await asyncio.sleep(0.12)
+        assert await manager.cancel(broadcast["id"])
+
+        state = await service.get(broadcast["id"])
+        assert state["status"] == "cancelled"
+        assert await service.get_running() == []
+        assert await manager.cancel(broadcast["id"]) is False
+        assert "остановлена" in bot.edit_message_text.call_args.kwargs["text"]
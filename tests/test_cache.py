@@ -0,0 +1,132 @@
+"""
+Тесты кэширования прав доступа
+
+Покрывает:
+  - TTLCache                               — TTL, LRU-вытеснение, invalidate
+  - SubscriptionService.resolve_access     — один запрос, кэш, инвалидация в add/remove_admin
+  - SubscriptionService.has_access         — кэш + инвалидация в activate/revoke
+"""
+
+import pytest
+from unittest.mock import patch
+
+from parserhub.cache import TTLCache
+from parserhub.services.subscription_service import SubscriptionService
+
+
+@pytest.fixture
+async def subs(db):
+    return SubscriptionService(db.pool, access_cache=db.access_cache)
+
+
+# ─────────────────────────────────────────────
+# 1. TTLCache
+# ─────────────────────────────────────────────
+
+class TestTTLCache:
+
+    def test_get_set(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert "a" in cache
+
+    def test_missing_returns_default(self):
+        cache = TTLCache()
+        assert cache.get("nope") is None
+        assert cache.get("nope", 5) == 5
+
+    def test_expired_entry_dropped(self):
+        cache = TTLCache(ttl=10)
+        with patch("parserhub.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with patch("parserhub.cache.time.monotonic", return_value=111.0):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")          # "a" стал самым свежим
+        cache.set("c", 3)       # вытесняется "b"
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+
+    def test_falsy_values_are_cached(self):
+        cache = TTLCache()
+        cache.set("a", False)
+        assert cache.get("a", "missing") is False
+
+    def test_invalidate(self):
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.invalidate("a")
+        cache.invalidate("never_set")
+        assert "a" not in cache
+
+
+# ─────────────────────────────────────────────
+# 2. Кэш админов и доступа поверх БД
+# ─────────────────────────────────────────────
+
+class TestAccessCaching:
+
+    @pytest.mark.asyncio
+    async def test_resolve_access_combines_state(self, db, subs):
+        await db.create_or_update_user(5, "eve", "Eve")
+        await db.add_admin(5, added_by=1)
+        await subs.activate(5, "week")
+
+        access = await subs.resolve_access(5)
+        assert access.is_registered and access.is_admin
+        assert access.plan == "week"
+        assert access.has_subscription and access.has_trial and access.has_access
+
+    @pytest.mark.asyncio
+    async def test_resolve_access_unknown_user(self, subs):
+        access = await subs.resolve_access(404)
+        assert access.is_registered is False
+        assert access.is_admin is False
+        assert access.has_access is False
+
+    @pytest.mark.asyncio
+    async def test_owner_is_admin_without_row(self, db):
+        service = SubscriptionService(db.pool, access_cache=db.access_cache, owner_id=42)
+        assert (await service.resolve_access(42)).is_admin is True
+
+    @pytest.mark.asyncio
+    async def test_resolve_access_served_from_cache(self, db, subs):
+        assert (await subs.resolve_access(5)).is_admin is False
+        with patch.object(db.pool, "read", side_effect=AssertionError("SQL на горячем пути")):
+            assert (await subs.resolve_access(5)).is_admin is False
+
+    @pytest.mark.asyncio
+    async def test_add_remove_admin_invalidate(self, db, subs):
+        assert (await subs.resolve_access(5)).is_admin is False
+        await db.add_admin(5, added_by=1)
+        assert (await subs.resolve_access(5)).is_admin is True
+        await db.remove_admin(5)
+        assert (await subs.resolve_access(5)).is_admin is False
+
+    @pytest.mark.asyncio
+    async def test_has_access_served_from_cache(self, db, subs):
+        await db.create_or_update_user(1, "alice", "Alice")
+        assert await subs.has_access(1) is True
+        with patch.object(db.pool, "read", side_effect=AssertionError("SQL на горячем пути")):
+            assert await subs.has_access(1) is True
+
+    @pytest.mark.asyncio
+    async def test_new_user_invalidates_cached_denial(self, db, subs):
+        assert await subs.has_access(2) is False
+        await db.create_or_update_user(2, "bob", "Bob")
+        assert await subs.has_access(2) is True
+
+    @pytest.mark.asyncio
+    async def test_activate_and_revoke_invalidate(self, db, subs):
+        assert await subs.has_active(3) is False
+        await subs.activate(3, "day")
+        assert await subs.has_active(3) is True
+        await subs.revoke(3)
+        assert await subs.has_access(3) is False
@@ -0,0 +1,297 @@
+"""
+Тесты слоя БД на реальном SQLite-файле во временной директории
+
+Покрывает:
+  - ConnectionPool          — WAL, commit/rollback транзакции писателя
+  - DatabaseService         — работа через общий пул
+  - SubscriptionService     — использует тот же пул, что и DatabaseService
+  - run_migrations          — версии схемы, идемпотентность, индексы
+  - register_user / flush   — UPSERT (новизна по факту вставки) и write-behind буфер профилей
+"""
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import aiosqlite
+import pytest
+
+from parserhub.db_service import DatabaseService
+from parserhub.migrations import MIGRATIONS, get_schema_version
+from parserhub.services.subscription_service import SubscriptionService
+
+
+# ─────────────────────────────────────────────
+# 1. ConnectionPool
+# ─────────────────────────────────────────────
+
+class TestConnectionPool:
+
+    @pytest.mark.asyncio
+    async def test_wal_enabled(self, db):
+        async with db.pool.read() as conn:
+            async with conn.execute("PRAGMA journal_mode") as cur:
+                row = await cur.fetchone()
+        assert row[0].lower() == "wal"
+
+    @pytest.mark.asyncio
+    async def test_write_rolls_back_on_error(self, db):
+        """Исключение внутри write() — транзакция откатывается целиком."""
+        with pytest.raises(RuntimeError):
+            async with db.pool.write() as conn:
+                await conn.execute(
+                    "INSERT INTO global_config (key, value) VALUES ('k', 'v')"
+                )
+                raise RuntimeError("boom")
+
+        async with db.pool.read() as conn:
+            async with conn.execute("SELECT COUNT(*) FROM global_config") as cur:
+                row = await cur.fetchone()
+        assert row[0] == 0
+
+    @pytest.mark.asyncio
+    async def test_readers_are_read_only(self, db):
+        async with db.pool.read() as conn:
+            with pytest.raises(Exception):
+                await conn.execute(
+                    "INSERT INTO global_config (key, value) VALUES ('k', 'v')"
+                )
+
+    @pytest.mark.asyncio
+    async def test_use_before_open_raises(self, tmp_path):
+        service = DatabaseService(str(tmp_path / "closed.db"))
+        with pytest.raises(RuntimeError):
+            await service.get_user(1)
+
+
+# ─────────────────────────────────────────────
+# 2. DatabaseService + SubscriptionService на общем пуле
+# ─────────────────────────────────────────────
+
+class TestSharedPool:
+
+    @pytest.mark.asyncio
+    async def test_create_user_visible_to_readers(self, db):
+        user = await db.create_or_update_user(1, "alice", "Alice")
+        assert user.username == "alice"
+        assert user.trial_until is not None
+
+        assert (await db.get_user_by_username("@alice")).user_id == 1
+
+    @pytest.mark.asyncio
+    async def test_subscription_service_shares_pool(self, db):
+        service = SubscriptionService(db.pool)
+        await db.create_or_update_user(7, "bob", "Bob")
+
+        await service.activate(7, "week")
+
+        assert await service.has_active(7) is True
+        assert await service.has_access(7) is True
+        assert service.pool is db.pool
+
+
+# ─────────────────────────────────────────────
+# 3. Миграции схемы
+# ─────────────────────────────────────────────
+
+class TestMigrations:
+
+    @pytest.mark.asyncio
+    async def test_fresh_db_at_latest_version(self, db):
+        async with db.pool.read() as conn:
+            assert await get_schema_version(conn) == MIGRATIONS[-1].version
+
+    @pytest.mark.asyncio
+    async def test_init_db_is_idempotent(self, db):
+        await db.init_db()
+        async with db.pool.read() as conn:
+            async with conn.execute("SELECT COUNT(*) FROM schema_version") as cur:
+                assert (await cur.fetchone())[0] == len(MIGRATIONS)
+
+    @pytest.mark.asyncio
+    async def test_legacy_db_without_schema_version(self, tmp_path):
+        """База до появления миграций: таблицы и trial_until уже есть."""
+        path = tmp_path / "legacy.db"
+        async with aiosqlite.connect(path) as conn:
+            await conn.execute(
+                "CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, "
+                "full_name TEXT, phone TEXT, is_parser_authorized BOOLEAN DEFAULT 0, "
+                "is_blacklist_authorized BOOLEAN DEFAULT 0, created_at TEXT NOT NULL, "
+                "last_active TEXT, trial_until TEXT DEFAULT NULL)"
+            )
+            await conn.execute(
+                "INSERT INTO users (user_id, username, created_at) VALUES (1, 'old', '2024-01-01')"
+            )
+            await conn.commit()
+
+        service = DatabaseService(str(path), readers=1)
+        await service.open()
+        try:
+            await service.init_db()
+            assert (await service.get_user(1)).username == "old"
+        finally:
+            await service.close()
+
+    @pytest.mark.asyncio
+    async def test_lookups_use_indexes(self, db):
+        queries = {
+            "SELECT * FROM active_tasks WHERE user_id = 1 AND service = 'workers' "
+            "ORDER BY created_at DESC": "idx_active_tasks_user_service",
+            "SELECT * FROM active_tasks WHERE task_id = 'x'": "idx_active_tasks_task_id",
+            "SELECT * FROM active_tasks WHERE status = 'running'": "idx_active_tasks_status",
+            "SELECT SUM(amount) FROM payments WHERE created_at >= '2025'": "idx_payments_created_at",
+            "SELECT * FROM subscriptions WHERE active_until < '2025'": "idx_subscriptions_active_until",
+            "SELECT * FROM users WHERE username = 'alice'": "idx_users_username",
+        }
+        async with db.pool.read() as conn:
+            for query, index in queries.items():
+                async with conn.execute(f"EXPLAIN QUERY PLAN {query}") as cur:
+                    plan = " ".join(row["detail"] for row in await cur.fetchall())
+                assert index in plan, f"{query}: {plan}"
+
+
+# ─────────────────────────────────────────────
+# 4. Регистрация и отложенная запись профилей
+# ─────────────────────────────────────────────
+
+class TestUserWriteBehind:
+
+    @pytest.mark.asyncio
+    async def test_upsert_keeps_trial_and_phone(self, db):
+        first = await db.create_or_update_user(1, "alice", "Alice", phone="+7900")
+        second = await db.create_or_update_user(1, "alice2", "Alice B")
+        assert second.username == "alice2"
+        assert second.phone == "+7900"
+        assert second.trial_until == first.trial_until
+        assert second.created_at == first.created_at
+        assert await db.get_settings(1) is not None
+
+    @pytest.mark.asyncio
+    async def test_repeat_upsert_in_same_instant_not_new(self, db):
+        """Новизна определяется по факту вставки, а не по совпадению created_at с текущим временем"""
+        frozen = datetime(2026, 1, 1, 12, 0, 0)
+        db.access_cache.invalidate = MagicMock()
+        with patch("parserhub.db_service.datetime") as mock_dt:
+            mock_dt.utcnow.return_value = frozen
+            await db.create_or_update_user(5, "eve", "Eve")
+            await db.create_or_update_user(5, "eve2", "Eve")
+        db.access_cache.invalidate.assert_called_once_with(5)
+        assert (await db.get_user(5)).username == "eve2"
+
+    @pytest.mark.asyncio
+    async def test_register_new_user(self, db):
+        assert await db.register_user(2, "bob", "Bob") is True
+        assert (await db.get_user(2)).trial_until is not None
+        assert await db.get_settings(2) is not None
+
+    @pytest.mark.asyncio
+    async def test_existing_user_update_is_buffered(self, db):
+        await db.register_user(3, "carol", "Carol")
+        assert await db.register_user(3, "carol_new", "Carol N") is False
+        assert await db.register_user(3, "carol_newest", "Carol N") is False
+
+        # До flush в БД старые данные
+        assert (await db.get_user(3)).username == "carol"
+
+        assert await db.flush_user_updates() == 1
+        assert (await db.get_user(3)).username == "carol_newest"
+        assert await db.flush_user_updates() == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_buffer(self, db):
+        await db.register_user(4, "dave", "Dave")
+        db.touch_user(4, "dave2", "Dave")
+        await db.close()
+        with pytest.raises(RuntimeError):
+            await db.flush_user_updates()
+        await db.open()
+        assert await db.flush_user_updates() == 1
+        assert (await db.get_user(4)).username == "dave2"
+
+
+# ─────────────────────────────────────────────
+# 5. Агрегаты доходов
+# ─────────────────────────────────────────────
+
+class TestRevenueRollup:
+
+    @pytest.mark.asyncio
+    async def test_log_payment_updates_stats(self, db):
+        await db.log_payment(1, "week", 50000)
+        await db.log_payment(2, "week", 50000)
+        await db.log_payment(3, "month", 150000)
+
+        stats = await db.get_revenue_stats()
+        assert stats["today_amount"] == stats["month_amount"] == stats["total_amount"] == 250000
+        assert stats["today_count"] == stats["month_count"] == stats["total_count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_empty_stats(self, db):
+        stats = await db.get_revenue_stats()
+        assert stats["total_amount"] == 0 and stats["today_count"] == 0
+
+    @pytest.mark.asyncio
+    async def test_breakdown_per_plan(self, db):
+        await db.log_payment(1, "week", 50000)
+        await db.log_payment(2, "week", 50000)
+        await db.log_payment(3, "day", 10000)
+
+        rows = await db.get_revenue_breakdown("day")
+        assert [(r["plan"], r["amount"], r["count"]) for r in rows] == [
+            ("week", 100000, 2),
+            ("day", 10000, 1),
+        ]
+        with pytest.raises(ValueError):
+            await db.get_revenue_breakdown("year")
+
+    @pytest.mark.asyncio
+    async def test_backfill_from_existing_payments(self, db):
+        async with db.pool.write() as conn:
+            await conn.executemany(
+                "INSERT INTO payments (user_id, plan, amount, currency, created_at) VALUES (?, ?, ?, 'RUB', ?)",
+                [(1, "week", 50000, "2024-01-10T10:00:00"), (2, "day", 10000, "2024-02-01T00:00:00")],
+            )
+            await conn.execute("DELETE FROM schema_version WHERE version >= 4")
+        await db.init_db()
+
+        months = await db.get_revenue_breakdown("month")
+        assert [(r["bucket"], r["amount"]) for r in months] == [("2024-02", 10000), ("2024-01", 50000)]
+        assert (await db.get_revenue_stats())["total_amount"] == 60000
+
+
+# ─────────────────────────────────────────────
+# 6. Keyset-пагинация активных пользователей
+# ─────────────────────────────────────────────
+
+class TestActivePage:
+
+    @pytest.mark.asyncio
+    async def test_pages_cover_all_users_once(self, db):
+        service = SubscriptionService(db.pool)
+        for uid in range(1, 26):
+            await db.create_or_update_user(uid, f"u{uid}", f"U {uid}")
+        for uid in range(1, 8):
+            await service.activate(uid, "week")
+
+        assert await service.count_active() == {"subs": 7, "trials": 18}
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            page, cursor = await service.get_active_page(cursor, limit=5)
+            seen += [(row["type"], row["user_id"]) for row in page]
+            pages += 1
+            if cursor is None:
+                break
+
+        assert pages == 5
+        assert [t for t, _ in seen] == ["sub"] * 7 + ["trial"] * 18
+        assert sorted(uid for _, uid in seen) == list(range(1, 26))
+
+    @pytest.mark.asyncio
+    async def test_exact_page_boundary_has_no_next(self, db):
+        service = SubscriptionService(db.pool)
+        for uid in range(1, 4):
+            await db.create_or_update_user(uid, f"u{uid}", f"U {uid}")
+
+        page, cursor = await service.get_active_page(limit=3)
+        assert len(page) == 3
+        assert cursor is None
@@ -0,0 +1,207 @@
+"""
+Тесты нечёткого поиска по ФИО
+
+Покрывает:
+  - normalize_token / name_stems — падежи и род, отчества, ё → е, двойные фамилии
+  - similarity                   — триграммное сходство основ
+  - BlacklistIndex.search_fio    — ранжирование кандидатов, опечатки, обновление и удаление записей
+  - BlacklistIndex.lookup        — похожие записи после промаха FTS (не находка)
+  - BlacklistIndex.sync          — пересборка основ записей, синхронизированных до v7 / старыми правилами
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import aiosqlite
+import pytest
+
+from parserhub.db_service import DatabaseService
+from parserhub.migrations import MIGRATIONS, run_migrations
+from parserhub.services import blacklist_index
+from parserhub.services.blacklist_bulk import Candidate, build_report
+from parserhub.services.blacklist_index import BlacklistIndex
+from parserhub.services.fio_matcher import name_stems, normalize_token, similarity
+
+
+# ─────────────────────────────────────────────
+# 1. Нормализация
+# ─────────────────────────────────────────────
+
+class TestNormalize:
+
+    @pytest.mark.parametrize("words", [
+        ("Иванов", "Иванова", "Иванову", "Ивановым", "Ивановой"),
+        ("Достоевский", "Достоевская", "Достоевского", "Достоевской"),
+        ("Сергей", "Сергея", "Сергею", "Сергеем"),
+        ("Наталья", "Натальи", "Натальей"),
+        ("Николай", "Николая", "Николаем"),
+        ("Семёнович", "Семенович", "Семёновна", "Семёновны"),
+        ("Пётр", "Петра", "Петру"),
+    ])
+    def test_forms_share_stem(self, words):
+        assert len({normalize_token(word) for word in words}) == 1
+
+    def test_short_names_kept(self):
+        assert normalize_token("Ли") == "ли"
+        assert normalize_token("Цой") == "цой"
+
+    def test_double_surname(self):
+        assert name_stems("Петров-Водкин Кузьма") == ["петров", "водкин", "кузьм"]
+        assert name_stems("  ") == []
+        assert name_stems(None) == []
+
+    def test_similarity(self):
+        assert similarity("иванов", "иванов") == 1.0
+        assert 0.5 < similarity("иванов", "иваноф") < 1.0
+        assert similarity("иванов", "петров") < 0.5
+
+
+# ─────────────────────────────────────────────
+# 2. Поиск по индексу
+# ─────────────────────────────────────────────
+
+def _feed(*records, cursor="c1") -> MagicMock:
+    api = MagicMock()
+    api.get_blacklist_changes = AsyncMock(return_value={
+        "records": [
+            {"id": rid, "full_name": name, "message_link": f"https://t.me/bl/{rid}"}
+            for rid, name in records
+        ],
+        "cursor": cursor,
+    })
+    return api
+
+
+@pytest.fixture
+async def index(index):
+    """Общий пустой индекс, заполненный записями с ФИО"""
+    await index.sync(_feed(
+        (1, "Иванов Иван Петрович"),
+        (2, "Иванова Мария Сергеевна"),
+        (3, "Петров-Водкин Кузьма"),
+        (4, "Достоевская Анна Григорьевна"),
+    ))
+    return index
+
+
+class TestSearchFio:
+
+    @pytest.mark.asyncio
+    async def test_inflected_query_ranked_first(self, index):
+        results = await index.search_fio("Иванову Ивану")
+        assert results[0]["record_id"] == "1"
+        assert results[0]["score"] == 1.0
+        assert all(a["score"] >= b["score"] for a, b in zip(results, results[1:]))
+
+    @pytest.mark.asyncio
+    async def test_typo(self, index):
+        results = await index.search_fio("Ивонов Иван Петрович")
+        assert results[0]["record_id"] == "1"
+        assert 0.8 < results[0]["score"] < 1.0
+
+    @pytest.mark.asyncio
+    async def test_double_surname_part(self, index):
+        results = await index.search_fio("Водкина")
+        assert [r["record_id"] for r in results] == ["3"]
+
+    @pytest.mark.asyncio
+    async def test_no_match(self, index):
+        assert await index.search_fio("Сидоров Сидор") == []
+        assert await index.search_fio("") == []
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete(self, index):
+        await index.sync(_feed((4, "Толстая Анна"), cursor="c2"))
+        assert await index.search_fio("Достоевская Анна", min_score=0.8) == []
+
+        api = MagicMock()
+        api.get_blacklist_changes = AsyncMock(
+            return_value={"records": [{"id": 3, "deleted": True}], "cursor": "c3"}
+        )
+        await index.sync(api)
+        assert await index.search_fio("Петров-Водкин") == []
+
+    @pytest.mark.asyncio
+    async def test_common_names_use_exact_intersection(self, index, monkeypatch):
+        monkeypatch.setattr(blacklist_index, "_CANDIDATE_BUDGET", 1)
+        results = await index.search_fio("Иванова Ивана")
+        assert [r["record_id"] for r in results] == ["1"]
+
+
+class TestLookupFuzzy:
+
+    @pytest.mark.asyncio
+    async def test_fuzzy_after_fts_miss_is_not_a_hit(self, index):
+        result = await index.lookup(fio="Достоевской Анне")
+        assert result["found"] is False
+        assert "match_type" not in result
+        assert result["score"] == 1.0
+        assert result["steps_done"] == ["fio", "fio_fuzzy"]
+        assert result["candidates"][0]["record_id"] == "4"
+
+    @pytest.mark.asyncio
+    async def test_unknown_username_gets_only_candidates(self, index):
+        result = await index.lookup(username="nobody_here", fio="Достоевской Анне")
+        assert result["found"] is False
+        assert result["steps_done"] == ["username", "fio", "fio_fuzzy"]
+
+    @pytest.mark.asyncio
+    async def test_low_score_no_candidates(self, index):
+        # Одна опечатка в ФИО из двух слов — ниже порога подсказки
+        assert await index.lookup(fio="Ивонов Иван") is None
+        assert (await index.search_fio("Ивонов Иван"))[0]["record_id"] == "1"
+
+    def test_report_lists_similar_records(self):
+        report = build_report(
+            [Candidate(None, "Ивонов Иван Петрович")],
+            [{"found": False, "candidates": [{"full_name": "Иванов Иван Петрович", "score": 0.857}]}],
+            [],
+        ).decode("utf-8-sig")
+        assert "не найден;похожие записи: Иванов Иван Петрович 86%" in report
+
+
+# ─────────────────────────────────────────────
+# 3. Пересборка основ
+# ─────────────────────────────────────────────
+
+class TestRebuildStems:
+
+    async def _stems(self, db) -> list[str]:
+        async with db.pool.read() as conn:
+            async with conn.execute("SELECT stem FROM blacklist_fio_terms ORDER BY stem") as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    @pytest.mark.asyncio
+    async def test_records_synced_before_v7(self, tmp_path):
+        async with aiosqlite.connect(tmp_path / "bot.db") as conn:
+            conn.row_factory = aiosqlite.Row
+            await run_migrations(conn, [m for m in MIGRATIONS if m.version <= 6])
+            await conn.execute(
+                "INSERT INTO blacklist_records (record_id, full_name, updated_at) "
+                "VALUES ('1', 'Иванова Мария', '2026-01-01')"
+            )
+            await conn.commit()
+
+        db = DatabaseService(str(tmp_path / "bot.db"), readers=1)
+        await db.open()
+        await db.init_db()
+        assert await self._stems(db) == []  # миграция только создаёт таблицы
+
+        index = BlacklistIndex(db.pool)
+        await index.sync(_feed(cursor="c1"))
+        assert await self._stems(db) == ["иванов", "мари"]
+        assert (await index.search_fio("Иванову Марию"))[0]["record_id"] == "1"
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_rules_version_change(self, db, monkeypatch):
+        index = BlacklistIndex(db.pool)
+        await index.sync(_feed((1, "Иванов Иван")))
+        async with db.pool.write() as conn:
+            await conn.execute("DELETE FROM blacklist_fio_terms")
+
+        await index.sync(_feed(cursor="c2"))
+        assert await self._stems(db) == []  # та же версия — не пересобирается
+
+        monkeypatch.setattr(blacklist_index, "_FIO_STEMS_VERSION", "2")
+        await index.sync(_feed(cursor="c3"))
+        assert await self._stems(db) == ["иван", "иванов"]
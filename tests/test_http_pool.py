@@ -0,0 +1,80 @@
+"""
+Тесты общего HTTP-пула для клиентов микросервисов
+
+Покрывает:
+  - HttpPool.timeout    — таймауты по типам запросов
+  - HttpPool.stats      — счётчик запросов, состояние пула
+  - WorkersAPI/RealtyAPI — общий пул, закрытие только владельцем
+"""
+
+import httpx
+import pytest
+
+from parserhub.api_client import RealtyAPI, WorkersAPI
+from parserhub.http_pool import HttpPool
+
+
+def _mock_pool(handler) -> HttpPool:
+    pool = HttpPool(timeouts={"status": 3.0})
+    pool.client._transport = httpx.MockTransport(handler)
+    return pool
+
+
+# ─────────────────────────────────────────────
+# 1. HttpPool
+# ─────────────────────────────────────────────
+
+class TestHttpPool:
+
+    def test_timeouts_by_kind(self):
+        pool = HttpPool(timeouts={"status": 3.0})
+        assert pool.timeout("status").read == 3.0
+        assert pool.timeout("status").connect == 3.0
+        assert pool.timeout("blacklist").read == 1200.0
+        assert pool.timeout("blacklist").connect == 5.0
+        assert pool.timeout("unknown").read == pool.timeouts["default"]
+
+    def test_http2_without_h2_falls_back(self, monkeypatch):
+        monkeypatch.setattr("parserhub.http_pool.importlib.util.find_spec", lambda name: None)
+        assert HttpPool(http2=True).http2 is False
+
+    @pytest.mark.asyncio
+    async def test_stats_counts_requests(self):
+        pool = _mock_pool(lambda request: httpx.Response(200, json={"status": "running"}))
+        api = WorkersAPI("http://workers", http=pool)
+
+        await api.get_status("t1")
+        await api.get_status("t2")
+
+        stats = pool.stats()
+        assert stats["requests_total"] == 2
+        assert stats["connections"] == stats["idle"] + stats["active"]
+        await pool.close()
+
+
+# ─────────────────────────────────────────────
+# 2. API-клиенты на общем пуле
+# ─────────────────────────────────────────────
+
+class TestSharedClients:
+
+    @pytest.mark.asyncio
+    async def test_clients_share_pool_and_do_not_close_it(self):
+        pool = _mock_pool(lambda request: httpx.Response(200, json={}))
+        workers = WorkersAPI("http://workers", http=pool)
+        realty = RealtyAPI("http://realty", http=pool)
+        assert workers.client is realty.client is pool.client
+
+        await workers.close()
+        await realty.close()
+        assert not pool.client.is_closed
+
+        await pool.close()
+        assert pool.client.is_closed
+
+    @pytest.mark.asyncio
+    async def test_standalone_client_owns_pool(self):
+        api = RealtyAPI("http://realty/")
+        assert api.base_url == "http://realty"
+        await api.close()
+        assert api.client.is_closed
@@ -0,0 +1,201 @@
+"""
+Тесты метрик Prometheus
+
+Покрывает:
+  - Counter / Histogram / Registry — текстовый формат, накопительные корзины, коллекторы
+  - stats_samples                  — stats() сервисов → counter/gauge с метками
+  - instrument_handlers            — обработчики (и вложенные в ConversationHandler)
+  - instrument_methods             — время и ошибки методов DatabaseService
+  - HttpPool                       — время и класс ответа по сервису и шаблону эндпоинта
+  - serve_metrics                  — отдельный HTTP-сервер /metrics
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+
+from parserhub.api_client import WorkersAPI
+from parserhub.db_service import DatabaseService
+from parserhub.http_pool import HttpPool
+from parserhub.metrics import (
+    DB_ERRORS, DB_SECONDS, HANDLER_CALLS, HANDLER_SECONDS, HTTP_REQUESTS, HTTP_SECONDS,
+    Registry, http_endpoint, instrument_handlers, instrument_methods, serve_metrics, stats_samples,
+)
+
+
+# ─────────────────────────────────────────────
+# Реестр и формат
+# ─────────────────────────────────────────────
+
+class TestRegistry:
+
+    def test_text_format(self):
+        registry = Registry()
+        calls = registry.counter("x_calls_total", "Вызовы", ("handler",))
+        latency = registry.histogram("x_seconds", "Время", ("handler",), buckets=(0.1, 1.0))
+        calls.inc('say "hi"')
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, "a")
+
+        lines = registry.render().splitlines()
+        assert "# TYPE x_calls_total counter" in lines
+        assert 'x_calls_total{handler="say \\"hi\\""} 1' in lines
+        assert 'x_seconds_bucket{handler="a",le="0.1"} 1' in lines
+        assert 'x_seconds_bucket{handler="a",le="1"} 2' in lines
+        assert 'x_seconds_bucket{handler="a",le="+Inf"} 3' in lines
+        assert 'x_seconds_count{handler="a"} 3' in lines
+        assert 'x_seconds_sum{handler="a"} 5.55' in lines
+
+    def test_duplicate_name_rejected(self):
+        registry = Registry()
+        registry.counter("dup_total", "")
+        with pytest.raises(ValueError):
+            registry.counter("dup_total", "")
+
+    def test_stats_samples(self):
+        stats = {
+            "received": 5,
+            "rejected": {"secret": 1, "queue_full": 2},
+            "update_queue": 3,
+            "shards": [{"routed": 4}, {"routed": 6}],
+            "http2": False,
+        }
+        samples = {(name, kind, tuple(labels.items()), value) for name, kind, _, labels, value in
+                   stats_samples("webhook", stats)}
+        assert samples == {
+            ("parserhub_webhook_received_total", "counter", (), 5),
+            ("parserhub_webhook_rejected_total", "counter", (("reason", "secret"),), 1),
+            ("parserhub_webhook_rejected_total", "counter", (("reason", "queue_full"),), 2),
+            ("parserhub_webhook_update_queue", "gauge", (), 3),
+            ("parserhub_webhook_shards_routed_total", "counter", (("shard", "0"),), 4),
+            ("parserhub_webhook_shards_routed_total", "counter", (("shard", "1"),), 6),
+        }
+
+    def test_collector_samples_grouped_and_errors_skipped(self):
+        registry = Registry()
+        registry.add_collector(lambda: stats_samples("webhook", {"shards": [{"routed": 1, "queue": 0},
+                                                                            {"routed": 2, "queue": 5}]}))
+        registry.add_collector(lambda: 1 / 0)
+        lines = registry.render().splitlines()
+        routed = [i for i, line in enumerate(lines) if line.startswith("parserhub_webhook_shards_routed_total")]
+        assert routed == [routed[0], routed[0] + 1]
+        assert sum(line.startswith("# TYPE parserhub_webhook_shards_queue") for line in lines) == 1
+
+    def test_http_endpoint(self):
+        assert http_endpoint("/workers/status/4f1c-9a") == "/workers/status/{id}"
+        assert http_endpoint("/workers/123/check-blacklist/jobs") == "/workers/{id}/check-blacklist/jobs"
+        assert http_endpoint("/blacklist/chats/add") == "/blacklist/chats/add"
+
+
+# ─────────────────────────────────────────────
+# Инструментирование
+# ─────────────────────────────────────────────
+
+async def metered_start(update, context):
+    return "started"
+
+
+async def metered_fail(update, context):
+    raise RuntimeError("boom")
+
+
+class TestInstrumentation:
+
+    @pytest.mark.asyncio
+    async def test_handlers_and_conversations(self):
+        application = Application.builder().token("123:TEST").updater(None).build()
+        conversation = ConversationHandler(
+            entry_points=[CommandHandler("go", metered_start)],
+            states={1: [MessageHandler(filters.TEXT, metered_fail)]},
+            fallbacks=[],
+        )
+        application.add_handler(conversation)
+        application.add_handler(CommandHandler("start", metered_start), group=1)
+
+        assert instrument_handlers(application) == 3
+        assert instrument_handlers(application) == 0  # повторно не оборачивает
+
+        calls = HANDLER_CALLS.value("metered_start", "ok")
+        assert await conversation.entry_points[0].callback(None, None) == "started"
+        assert HANDLER_CALLS.value("metered_start", "ok") == calls + 1
+        assert HANDLER_SECONDS.count("metered_start") >= 1
+
+        errors = HANDLER_CALLS.value("metered_fail", "error")
+        with pytest.raises(RuntimeError):
+            await conversation.states[1][0].callback(None, None)
+        assert HANDLER_CALLS.value("metered_fail", "error") == errors + 1
+
+    @pytest.mark.asyncio
+    async def test_db_methods(self, tmp_path):
+        db = DatabaseService(str(tmp_path / "bot.db"), readers=1)
+        assert instrument_methods(db) > 10
+        await db.open()
+        await db.init_db()
+
+        count = DB_SECONDS.count("DatabaseService", "get_user")
+        assert await db.get_user(1) is None
+        assert DB_SECONDS.count("DatabaseService", "get_user") == count + 1
+
+        await db.close()
+        errors = DB_ERRORS.value("DatabaseService", "get_user")
+        with pytest.raises(RuntimeError):
+            await db.get_user(1)  # пул закрыт
+        assert DB_ERRORS.value("DatabaseService", "get_user") == errors + 1
+
+    @pytest.mark.asyncio
+    async def test_http_requests_by_endpoint(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if "down" in request.url.path:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(503 if request.url.path.endswith("9") else 200, json={})
+
+        pool = HttpPool()
+        pool.client._transport = httpx.MockTransport(handler)
+        WorkersAPI("http://workers:8002", http=pool)
+        labels = ("workers", "GET", "/workers/status/{id}")
+        ok, failed = HTTP_REQUESTS.value(*labels, "2xx"), HTTP_REQUESTS.value(*labels, "5xx")
+        observed = HTTP_SECONDS.count(*labels)
+
+        await pool.client.get("http://workers:8002/workers/status/t1")
+        await pool.client.get("http://workers:8002/workers/status/t9")
+        with pytest.raises(httpx.ConnectError):
+            await pool.client.get("http://workers:8002/down")
+
+        assert HTTP_REQUESTS.value(*labels, "2xx") == ok + 1
+        assert HTTP_REQUESTS.value(*labels, "5xx") == failed + 1
+        assert HTTP_REQUESTS.value("workers", "GET", "/down", "error") >= 1
+        assert HTTP_SECONDS.count(*labels) == observed + 2
+        await pool.close()
+
+
+# ─────────────────────────────────────────────
+# HTTP-сервер
+# ─────────────────────────────────────────────
+
+class TestServeMetrics:
+
+    @pytest.mark.asyncio
+    async def test_metrics_and_404(self):
+        registry = Registry()
+        registry.counter("served_total", "").inc()
+        server = await serve_metrics("127.0.0.1", 0, registry)
+        port = server.sockets[0].getsockname()[1]
+
+        async def get(path: str) -> bytes:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+
+        response = await get("/metrics")
+        assert response.startswith(b"HTTP/1.1 200 OK")
+        assert b"text/plain; version=0.0.4" in response
+        assert response.endswith(b"served_total 1\n")
+        assert (await get("/nope")).startswith(b"HTTP/1.1 404")
+
+        server.close()
+        await server.wait_closed()
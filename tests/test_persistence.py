@@ -0,0 +1,104 @@
+"""
+Тесты персистентности PTB в bot.db
+
+Покрывает:
+  - SQLitePersistence — user_data и состояния диалогов переживают «рестарт»,
+                        пропуск неизменившихся записей, удаление, пакетная запись
+                        одной транзакцией, несериализуемые данные
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from parserhub.db_service import DatabaseService
+from parserhub.persistence import SQLitePersistence
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "bot.db")
+
+
+def _restart(db_path: str) -> tuple[DatabaseService, SQLitePersistence]:
+    """Новый процесс бота: БД ещё не открыта — её откроет загрузка персистентности"""
+    db = DatabaseService(db_path, readers=1)
+    return db, SQLitePersistence(db)
+
+
+class TestSQLitePersistence:
+
+    @pytest.mark.asyncio
+    async def test_survives_restart(self, db_path):
+        db, persistence = _restart(db_path)
+        assert await persistence.get_user_data() == {}
+        assert await persistence.get_conversations("workers_monitoring") == {}
+
+        await asyncio.gather(
+            persistence.update_user_data(1, {"workers_city": "Москва", "workers_min_price": 1500}),
+            persistence.update_user_data(2, {"bl_username": "ivan"}),
+            persistence.update_conversation("workers_monitoring", (1, 1), 3),
+            persistence.update_conversation("admin_grant", (2, 2), 1),
+        )
+        assert persistence.stats()["flushes"] == 1  # один цикл PTB — одна транзакция
+        await persistence.flush()
+        await db.close()
+
+        db, persistence = _restart(db_path)
+        assert await persistence.get_user_data() == {
+            1: {"workers_city": "Москва", "workers_min_price": 1500},
+            2: {"bl_username": "ivan"},
+        }
+        assert await persistence.get_conversations("workers_monitoring") == {(1, 1): 3}
+        assert await persistence.get_conversations("admin_grant") == {(2, 2): 1}
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_unchanged_not_rewritten(self, db_path):
+        db, persistence = _restart(db_path)
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"a": 1})
+        await persistence.update_conversation("c", (1, 1), 2)
+        assert persistence.rows_written == 2
+
+        # PTB передаёт всех, кого касались обработчики, — даже без изменений
+        await persistence.update_user_data(1, {"a": 1})
+        await persistence.update_conversation("c", (1, 1), 2)
+        assert persistence.rows_written == 2
+
+        await persistence.update_user_data(1, {"a": 2})
+        assert persistence.rows_written == 3
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_end_and_drop(self, db_path):
+        db, persistence = _restart(db_path)
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"a": 1})
+        await persistence.update_user_data(2, {"b": 1})
+        await persistence.update_conversation("c", (1, 1), 2)
+
+        await asyncio.gather(
+            persistence.update_conversation("c", (1, 1), None),  # диалог завершён
+            persistence.update_user_data(1, {}),                  # всё вынули через pop
+            persistence.drop_user_data(2),
+        )
+        await db.close()
+
+        db, persistence = _restart(db_path)
+        assert await persistence.get_user_data() == {}
+        assert await persistence.get_conversations("c") == {}
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_unpicklable_skipped(self, db_path):
+        db, persistence = _restart(db_path)
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"lock": threading.Lock()})
+        await persistence.update_user_data(2, {"ok": True})
+        await db.close()
+
+        db, persistence = _restart(db_path)
+        assert await persistence.get_user_data() == {2: {"ok": True}}
+        await db.close()
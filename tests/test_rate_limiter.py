@@ -0,0 +1,130 @@
+"""
+Тесты лимитера исходящих запросов к Bot API
+
+Покрывает:
+  - TokenBucket                       — пачка без ожидания, затем равномерный темп
+  - OutboundRateLimiter.process_request — початовый темп, приоритетные полосы,
+                                          повтор после RetryAfter, метрики
+"""
+
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from parserhub.rate_limiter import OutboundRateLimiter, Priority, TokenBucket
+
+
+# ─────────────────────────────────────────────
+# 1. TokenBucket
+# ─────────────────────────────────────────────
+
+class TestTokenBucket:
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2.0, burst=3)
+        assert [bucket.reserve(100.0) for _ in range(5)] == [0.0, 0.0, 0.0, 0.5, 1.0]
+
+    def test_refills_over_time(self):
+        bucket = TokenBucket(rate=1.0, burst=1)
+        assert bucket.reserve(100.0) == 0.0
+        assert bucket.reserve(100.0) == 1.0
+        assert bucket.reserve(105.0) == 0.0
+        assert bucket.idle(110.0)
+
+
+# ─────────────────────────────────────────────
+# 2. OutboundRateLimiter
+# ─────────────────────────────────────────────
+
+@pytest.fixture
+async def limiter():
+    limiter = OutboundRateLimiter(global_rate=1000.0, chat_rate=20.0, group_rate=10.0, burst=1)
+    await limiter.initialize()
+    yield limiter
+    await limiter.shutdown()
+
+
+def _send(limiter, chat_id, log, priority=None, callback=None):
+    async def default(*args, **kwargs):
+        log.append(chat_id)
+        return True
+    return limiter.process_request(
+        callback=callback or default, args=(), kwargs={}, endpoint="sendMessage",
+        data={"chat_id": chat_id}, rate_limit_args=priority,
+    )
+
+
+class TestOutboundRateLimiter:
+
+    @pytest.mark.asyncio
+    async def test_per_chat_pacing_does_not_block_other_chats(self, limiter):
+        log = []
+        started = time.monotonic()
+        sends = [_send(limiter, 1, log) for _ in range(3)] + [_send(limiter, 2, log)]
+        await asyncio.gather(*sends)
+
+        # 3 сообщения в чат 1 при 20/сек — не быстрее 0.1 с; чат 2 ушёл сразу
+        assert time.monotonic() - started >= 0.09
+        assert log.index(2) < 2
+        assert limiter.stats()["sent"] == 4
+
+    @pytest.mark.asyncio
+    async def test_interactive_lane_goes_first(self):
+        limiter = OutboundRateLimiter(global_rate=20.0, chat_rate=1000.0, burst=1)
+        log = []
+        try:
+            # Первые 20 рассылочных уходят пачкой общего ведра, остальные ждут слота
+            bulk = [_send(limiter, 100 + i, log, Priority.BULK) for i in range(25)]
+            tasks = [asyncio.create_task(send) for send in bulk]
+            await asyncio.sleep(0.01)
+            await _send(limiter, 1, log)
+            assert log.index(1) == 20
+            await asyncio.gather(*tasks)
+        finally:
+            await limiter.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_retry_after(self, limiter):
+        calls = 0
+
+        async def flaky(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RetryAfter(0)
+            return {"ok": True}
+
+        assert await _send(limiter, 1, [], callback=flaky) == {"ok": True}
+        assert calls == 2
+        assert limiter.stats()["flood_waits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_after_exhausted(self):
+        limiter = OutboundRateLimiter(max_retries=1)
+
+        async def always_flood(*args, **kwargs):
+            raise RetryAfter(0)
+
+        try:
+            with pytest.raises(RetryAfter):
+                await _send(limiter, 1, [], callback=always_flood)
+        finally:
+            await limiter.shutdown()
+        assert limiter.flood_waits == 2
+
+    @pytest.mark.asyncio
+    async def test_stats_queue_depth(self):
+        limiter = OutboundRateLimiter(chat_rate=1.0, burst=1)
+        log = []
+        try:
+            await _send(limiter, 1, log)
+            waiting = asyncio.create_task(_send(limiter, 1, log, Priority.BACKGROUND))
+            await asyncio.sleep(0.01)
+            assert limiter.stats()["queued"]["background"] == 1
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            assert limiter.stats()["queued"]["background"] == 0
+        finally:
+            await limiter.shutdown()
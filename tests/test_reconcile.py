@@ -0,0 +1,204 @@
+"""
+Тесты сверки задач с микросервисами при старте
+
+Покрывает:
+  - get_statuses     — пакетный эндпоинт, fallback на GET по задаче, ошибки сервиса
+  - _live_statuses   — список задач не ждёт недоступный сервис дольше таймаута
+  - show_my_tasks    — статус из БД для задач без живого статуса
+  - status_cache     — повторные запросы статуса в пределах TTL, сброс при остановке
+  - reconcile_tasks  — удаление только задач с 404, недоступный сервис и пропущенные
+                       в пакетном ответе задачи не трогаем
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from parserhub.api_client import RealtyAPI, WorkersAPI
+from parserhub.handlers import workers
+from parserhub.http_pool import HttpPool
+from parserhub.models import ActiveTask
+from parserhub.services.reconcile import reconcile_tasks
+
+
+def _pool(handler) -> HttpPool:
+    pool = HttpPool()
+    pool.client._transport = httpx.MockTransport(handler)
+    return pool
+
+
+async def _add(db, task_id: str, service: str):
+    await db.add_task(ActiveTask(
+        user_id=1, task_id=task_id, service=service, task_type="monitor", created_at=datetime.utcnow(),
+    ))
+
+
+# ─────────────────────────────────────────────
+# 1. get_statuses
+# ─────────────────────────────────────────────
+
+class TestGetStatuses:
+
+    @pytest.mark.asyncio
+    async def test_batch_endpoint(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(200, json={"tasks": {"a": {"status": "running"}, "b": None}})
+
+        api = WorkersAPI("http://w", http=_pool(handler))
+        assert await api.get_statuses(["a", "b", "a"]) == {"a": {"status": "running"}, "b": None}
+        assert calls == ["/workers/status/batch"]
+
+    @pytest.mark.asyncio
+    async def test_fallback_to_single_requests(self):
+        calls = []
+
+        def handler(request):
+            calls.append((request.method, request.url.path))
+            if request.url.path.endswith("/batch"):
+                return httpx.Response(405)
+            if request.url.path.endswith("/gone"):
+                return httpx.Response(404)
+            if request.url.path.endswith("/broken"):
+                return httpx.Response(500)
+            return httpx.Response(200, json={"status": "running"})
+
+        api = RealtyAPI("http://r", http=_pool(handler))
+        result = await api.get_statuses(["ok", "gone", "broken"], concurrency=2)
+        assert result == {"ok": {"status": "running"}, "gone": None}
+
+        # Повторно пакетный эндпоинт не запрашивается
+        calls.clear()
+        await api.get_statuses(["other"])
+        assert calls == [("GET", "/parse/status/other")]
+
+    @pytest.mark.asyncio
+    async def test_batch_error_no_single_requests(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(503)
+
+        api = WorkersAPI("http://w", http=_pool(handler))
+        assert await api.get_statuses(["a", "b"]) == {}
+        assert calls == ["/workers/status/batch"]
+        # Пакетный эндпоинт не помечен неподдерживаемым — в следующий раз снова он
+        calls.clear()
+        await api.get_statuses(["a"])
+        assert calls == ["/workers/status/batch"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("body", [b"<html>502</html>", b"[]", b'{"tasks": []}', b'{"status": "ok"}'])
+    async def test_malformed_batch_response(self, body):
+        api = WorkersAPI("http://w", http=_pool(lambda request: httpx.Response(200, content=body)))
+        assert await api.get_statuses(["a", "b"]) == {}
+        assert "a" not in api.status_cache
+
+    @pytest.mark.asyncio
+    async def test_live_statuses_timeout(self, monkeypatch):
+        monkeypatch.setattr(workers, "_LIVE_STATUS_TIMEOUT", 0.05)
+
+        class SlowAPI:
+            async def get_statuses(self, task_ids):
+                await asyncio.sleep(10)
+
+        tasks = [ActiveTask(user_id=1, task_id="a", service="workers", task_type="monitor",
+                            created_at=datetime.utcnow())]
+        assert await asyncio.wait_for(workers._live_statuses(SlowAPI(), tasks), timeout=1) == {}
+
+    @pytest.mark.asyncio
+    async def test_task_list_falls_back_to_db_status(self):
+        def handler(request):
+            # "a" без поля status, "b" пропущена, "c" — задачи нет в сервисе
+            return httpx.Response(200, json={"tasks": {"a": {"paused": True}, "c": None}})
+
+        tasks = [
+            ActiveTask(user_id=1, task_id=task_id, service="workers", task_type="monitor",
+                       status="paused", created_at=datetime.utcnow())
+            for task_id in ("a", "b", "c")
+        ]
+        db = MagicMock()
+        db.get_user_tasks = AsyncMock(return_value=tasks)
+        update = MagicMock(callback_query=None)
+        update.effective_user.id = 1
+        update.message.reply_text = AsyncMock()
+        context = MagicMock(bot_data={"db": db, "workers_api": WorkersAPI("http://w", http=_pool(handler))})
+
+        await workers.show_my_tasks(update, context)
+
+        markup = update.message.reply_text.await_args.kwargs["reply_markup"]
+        labels = [row[0].text for row in markup.inline_keyboard[:3]]
+        assert labels == ["⏸ a...", "⏸ b...", "❌ c..."]
+
+    @pytest.mark.asyncio
+    async def test_statuses_cached(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            if request.url.path.endswith("/batch"):
+                return httpx.Response(200, json={"tasks": {"a": {"status": "running"}, "b": None}})
+            return httpx.Response(200, json={"status": "stopped"})
+
+        api = WorkersAPI("http://w", http=_pool(handler))
+        await api.get_statuses(["a", "b"])
+        assert await api.get_statuses(["a", "b"]) == {"a": {"status": "running"}, "b": None}
+        assert await api.get_status("a") == {"status": "running"}
+        assert calls == ["/workers/status/batch"]
+
+        # Остановка сбрасывает кэш задачи
+        await api.stop_monitoring("a")
+        assert (await api.get_status("a"))["status"] == "stopped"
+
+
+# ─────────────────────────────────────────────
+# 2. reconcile_tasks
+# ─────────────────────────────────────────────
+
+class TestReconcile:
+
+    @pytest.mark.asyncio
+    async def test_removes_only_zombies(self, db):
+        await _add(db, "w-alive", "workers")
+        await _add(db, "w-zombie", "workers")
+        await _add(db, "r-alive", "realty")
+
+        def workers(request):
+            return httpx.Response(200, json={"tasks": {"w-alive": {"status": "running"}, "w-zombie": None}})
+
+        def realty_down(request):
+            raise httpx.ConnectError("down")
+
+        removed = await reconcile_tasks(
+            db,
+            WorkersAPI("http://w", http=_pool(workers)),
+            RealtyAPI("http://r", http=_pool(realty_down)),
+        )
+
+        assert removed == 1
+        remaining = {t.task_id for t in await db.get_all_running_tasks()}
+        assert remaining == {"w-alive", "r-alive"}
+
+    @pytest.mark.asyncio
+    async def test_task_missing_from_batch_survives(self, db):
+        await _add(db, "w-alive", "workers")
+        await _add(db, "w-omitted", "workers")
+        await _add(db, "w-zombie", "workers")
+
+        def workers(request):
+            # w-omitted в ответе нет — это не «задачи нет», а «статус неизвестен»
+            return httpx.Response(200, json={"tasks": {"w-alive": {"status": "running"}, "w-zombie": None}})
+
+        api = WorkersAPI("http://w", http=_pool(workers))
+        removed = await reconcile_tasks(db, api, RealtyAPI("http://r", http=_pool(workers)))
+
+        assert removed == 1
+        remaining = {t.task_id for t in await db.get_all_running_tasks()}
+        assert remaining == {"w-alive", "w-omitted"}
+        assert "w-omitted" not in api.status_cache
@@ -0,0 +1,198 @@
+"""
+Тесты шардированного запуска
+
+Покрывает:
+  - update_owner / ShardRouter — владелец обновления, все обновления пользователя
+                                 в одну очередь по порядку, 503 при заполнении
+  - ShardWorker.pump           — обновления из очереди шарда в update_queue PTB, STOP
+  - ShardedTTLCache            — сброс записи чужого пользователя доходит до его шарда
+  - SQLitePersistence(shard=…) — шард загружает только своих пользователей
+  - BroadcastManager.cancel    — остановка рассылки, идущей в другом процессе
+"""
+
+import asyncio
+import json
+import queue
+
+import pytest
+from telegram import Update
+from telegram.ext import Application
+
+from parserhub.db_service import DatabaseService
+from parserhub.persistence import SQLitePersistence
+from parserhub.services.broadcast import BroadcastManager, BroadcastService
+from parserhub.sharding import STOP, ShardRouter, ShardWorker, update_owner
+
+
+def _message(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Иван"},
+            "text": "/start",
+        },
+    }
+
+
+async def _post(router: ShardRouter, data: dict) -> int:
+    body = json.dumps(data).encode()
+    headers = [(b"x-telegram-bot-api-secret-token", b"s3cret")]
+    scope = {"type": "http", "method": "POST", "path": "/telegram", "headers": headers, "client": None}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await router(scope, receive, send)
+    return sent[0]["status"]
+
+
+def _drain(inbox: queue.Queue) -> list:
+    items = []
+    while not inbox.empty():
+        items.append(inbox.get_nowait())
+    return items
+
+
+# ─────────────────────────────────────────────
+# Приёмник
+# ─────────────────────────────────────────────
+
+class TestShardRouter:
+
+    def test_update_owner(self):
+        assert update_owner(_message(1, 42)) == 42
+        callback = {"update_id": 2, "callback_query": {"id": "1", "from": {"id": 7}, "chat_instance": "c"}}
+        assert update_owner(callback) == 7
+        assert update_owner({"update_id": 3, "poll_answer": {"poll_id": "p", "user": {"id": 9}}}) == 9
+        channel = {"update_id": 4, "channel_post": {"message_id": 1, "chat": {"id": -100}}}
+        assert update_owner(channel) == -100
+        assert update_owner({"update_id": 5}) == 0
+
+    @pytest.mark.asyncio
+    async def test_user_always_same_shard_in_order(self):
+        inboxes = [queue.Queue() for _ in range(3)]
+        router = ShardRouter("/telegram", "s3cret", inboxes)
+
+        for update_id, user_id in enumerate([1, 2, 4, 1, 3, 4, 1], 1):
+            assert await _post(router, _message(update_id, user_id)) == 200
+
+        shards = [[json.loads(body) for body in _drain(inbox)] for inbox in inboxes]
+        # 1 и 4 → шард 1, 2 → шард 2, 3 → шард 0; внутри шарда — порядок поступления
+        assert [u["update_id"] for u in shards[1]] == [1, 3, 4, 6, 7]
+        assert [u["update_id"] for u in shards[2]] == [2]
+        assert [u["update_id"] for u in shards[0]] == [5]
+        assert router.stats()["received"] == 7
+
+    @pytest.mark.asyncio
+    async def test_full_shard_returns_503(self):
+        inboxes = [queue.Queue(maxsize=1), queue.Queue(maxsize=1)]
+        router = ShardRouter("/telegram", "s3cret", inboxes)
+
+        assert await _post(router, _message(1, 2)) == 200
+        assert await _post(router, _message(2, 4)) == 503  # шард 0 заполнен
+        assert await _post(router, _message(3, 1)) == 200  # шард 1 свободен
+        stats = router.stats()
+        assert stats["rejected"]["queue_full"] == 1
+        assert [shard["routed"] for shard in stats["shards"]] == [1, 1]
+
+
+# ─────────────────────────────────────────────
+# Процесс-обработчик
+# ─────────────────────────────────────────────
+
+class TestShardWorker:
+
+    @pytest.mark.asyncio
+    async def test_pump_until_stop(self):
+        application = Application.builder().token("123:TEST").updater(None).build()
+        inboxes = [queue.Queue(), queue.Queue()]
+        worker = ShardWorker(1, inboxes)
+        for update_id in (1, 2):
+            inboxes[1].put(json.dumps(_message(update_id, 3)).encode())
+        inboxes[1].put(STOP)
+
+        await asyncio.wait_for(worker.pump(application), timeout=5)
+        updates = [application.update_queue.get_nowait() for _ in range(2)]
+        assert all(isinstance(update, Update) for update in updates)
+        assert [update.update_id for update in updates] == [1, 2]
+        assert worker.stats()["updates"] == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidate_reaches_owner_shard(self):
+        application = Application.builder().token("123:TEST").updater(None).build()
+        inboxes = [queue.Queue(), queue.Queue()]
+        admin_shard, user_shard = ShardWorker(0, inboxes), ShardWorker(1, inboxes)
+        admin_cache = admin_shard.cache("access")
+        user_cache = user_shard.cache("access")
+        user_cache.set(5, "trial")
+
+        # Админ в шарде 0 отозвал доступ пользователю 5 (шард 1)
+        admin_cache.invalidate(5)
+        assert inboxes[1].qsize() == 1
+        assert 5 in user_cache
+
+        inboxes[1].put(STOP)
+        await asyncio.wait_for(user_shard.pump(application), timeout=5)
+        assert 5 not in user_cache
+        assert user_shard.stats()["invalidations"] == 1
+
+        # Свой пользователь — только локальный сброс
+        admin_cache.invalidate(4)
+        assert inboxes[0].empty()
+
+
+# ─────────────────────────────────────────────
+# Общие данные в bot.db
+# ─────────────────────────────────────────────
+
+class TestSharedState:
+
+    @pytest.mark.asyncio
+    async def test_persistence_loads_own_users(self, tmp_path):
+        db = DatabaseService(str(tmp_path / "bot.db"), readers=1)
+        persistence = SQLitePersistence(db)
+        await persistence.get_user_data()
+        await asyncio.gather(*(persistence.update_user_data(i, {"i": i}) for i in range(1, 7)))
+        await asyncio.gather(*(persistence.update_conversation("c", (i, i), 1) for i in range(1, 7)))
+
+        shard = SQLitePersistence(db, shard=(1, 3))
+        assert sorted(await shard.get_user_data()) == [1, 4]
+        assert sorted(await shard.get_conversations("c")) == [(1, 1), (4, 4)]
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_broadcast_cancelled_from_other_process(self, tmp_path):
+        db = DatabaseService(str(tmp_path / "bot.db"), readers=1)
+        await db.open()
+        await db.init_db()
+        async with db.pool.write() as conn:
+            await conn.executemany(
+                "INSERT INTO users (user_id, created_at) VALUES (?, '2026-01-01')", [(i,) for i in range(1, 21)]
+            )
+        service = BroadcastService(db.pool)
+        broadcast = await service.create(1, "all", "текст", None)
+
+        sent = []
+
+        class Bot:
+            async def send_message(self, chat_id, **kwargs):
+                await asyncio.sleep(0.01)
+                sent.append(chat_id)
+
+        # Рассылку ведёт шард 0, кнопку «Остановить» нажали в шарде админа
+        runner, other = BroadcastManager(service, page_size=2), BroadcastManager(service)
+        task = runner.start(Bot(), broadcast)
+        await asyncio.sleep(0.03)
+        assert await other.cancel(broadcast["id"])
+        await asyncio.wait_for(task, timeout=5)
+
+        assert (await service.get(broadcast["id"]))["status"] == "cancelled"
+        assert len(sent) < 20
+        await db.close()
@@ -0,0 +1,259 @@
+"""
+Тесты single-flight дедупликации проверок в ЧС
+
+Покрывает:
+  - SingleFlight.do     — один запуск на ключ, общий результат и исключение, отмена ожидающих
+  - _shared_search      — присоединение к идущему поиску, повтор своей сессией при ошибке
+  - SharedSingleFlight  — один поиск на ключ между процессами-шардами через bot.db
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from parserhub.db_service import DatabaseService
+from parserhub.handlers.blacklist import _shared_search
+from parserhub.singleflight import SharedSingleFlight, SingleFlight
+
+
+# ─────────────────────────────────────────────
+# 1. SingleFlight
+# ─────────────────────────────────────────────
+
+class TestSingleFlight:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_run(self):
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def scan():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"found": False}
+
+        waiters = [asyncio.create_task(flights.do("k", scan)) for _ in range(10)]
+        await asyncio.sleep(0)
+        assert flights.in_flight("k")
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert calls == 1
+        assert all(r == {"found": False} for r in results)
+        assert flights.started == 1 and flights.shared == 9
+        assert not flights.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_separately(self):
+        flights = SingleFlight()
+        scan = AsyncMock(return_value={})
+        await asyncio.gather(flights.do("a", scan), flights.do("b", scan))
+        assert scan.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_exception_fans_out(self):
+        flights = SingleFlight()
+
+        async def scan():
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flights.do("k", scan), flights.do("k", scan), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert not flights.in_flight("k")
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def scan():
+            await release.wait()
+            return "ok"
+
+        first = asyncio.create_task(flights.do("k", scan))
+        second = asyncio.create_task(flights.do("k", scan))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == "ok"
+        assert first.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_last_waiter_cancels_run(self):
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def scan():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.create_task(flights.do("k", scan))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert not flights.in_flight("k")
+
+
+# ─────────────────────────────────────────────
+# 2. _shared_search
+# ─────────────────────────────────────────────
+
+class TestSharedSearch:
+
+    def _bot(self):
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+        return bot
+
+    @pytest.mark.asyncio
+    async def test_joined_caller_notified_and_gets_result(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def leader_scan():
+            await release.wait()
+            return {"found": True}
+
+        own_scan = AsyncMock(return_value={"found": False})
+        bot = self._bot()
+
+        leader = asyncio.create_task(_shared_search(bot, 1, flights, "k", leader_scan))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(_shared_search(bot, 2, flights, "k", own_scan))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await leader == {"found": True}
+        assert await follower == {"found": True}
+        own_scan.assert_not_awaited()
+        assert bot.send_message.call_args.kwargs["chat_id"] == 2
+
+    @pytest.mark.asyncio
+    async def test_joined_caller_retries_on_leader_error(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def leader_scan():
+            await release.wait()
+            return {"found": False, "error": "AUTH_KEY_UNREGISTERED"}
+
+        own_scan = AsyncMock(return_value={"found": False})
+
+        leader = asyncio.create_task(_shared_search(self._bot(), 1, flights, "k", leader_scan))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(_shared_search(self._bot(), 2, flights, "k", own_scan))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert (await leader)["error"] == "AUTH_KEY_UNREGISTERED"
+        assert await follower == {"found": False}
+        own_scan.assert_awaited_once()
+
+
+# ─────────────────────────────────────────────
+# 3. Между шардами
+# ─────────────────────────────────────────────
+
+@pytest.fixture
+async def shards(tmp_path):
+    """Два «процесса» над одной bot.db — у каждого свой пул соединений"""
+    services = [DatabaseService(str(tmp_path / "bot.db"), readers=1) for _ in range(2)]
+    for service in services:
+        await service.open()
+        await service.init_db()
+    yield [SharedSingleFlight(service.pool, shard=i, poll_interval=0.01) for i, service in enumerate(services)]
+    for service in services:
+        await service.close()
+
+
+class TestSharedSingleFlight:
+
+    @pytest.mark.asyncio
+    async def test_one_scan_across_shards(self, shards):
+        first, second = shards
+        release = asyncio.Event()
+        own_scan = AsyncMock(return_value={"found": False})
+
+        async def scan():
+            await release.wait()
+            return {"found": True, "match_type": "username"}
+
+        leader = asyncio.create_task(first.do("k", scan))
+        await asyncio.sleep(0.05)
+        assert await second.in_flight_elsewhere("k")
+        follower = asyncio.create_task(second.do("k", own_scan))
+        await asyncio.sleep(0.05)
+        release.set()
+
+        assert await leader == await follower == {"found": True, "match_type": "username"}
+        own_scan.assert_not_awaited()
+        assert second.stats() == {"started": 1, "shared": 0, "remote": 1}
+        assert not await second.in_flight_elsewhere("k")
+
+    @pytest.mark.asyncio
+    async def test_owner_error_waiter_runs_itself(self, shards):
+        first, second = shards
+        release = asyncio.Event()
+
+        async def failing_scan():
+            await release.wait()
+            raise RuntimeError("сессия аннулирована")
+
+        leader = asyncio.create_task(first.do("k", failing_scan))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(second.do("k", AsyncMock(return_value={"found": False})))
+        await asyncio.sleep(0.05)
+        release.set()
+
+        with pytest.raises(RuntimeError):
+            await leader
+        assert await follower == {"found": False}
+
+    @pytest.mark.asyncio
+    async def test_dead_shard_claim_released(self, shards):
+        first, second = shards
+        # Шард 0 упал посреди поиска — его строка осталась
+        async with first.pool.write() as db:
+            await db.execute(
+                "INSERT INTO blacklist_flights (key, owner, shard, started_at) VALUES ('k', 'dead', 0, ?)",
+                (datetime.utcnow().isoformat(),),
+            )
+        assert await second.in_flight_elsewhere("k")
+
+        # Перезапущенный шард 0 снимает свои строки — шард 1 ищет сам
+        assert await first.release_shard() == 1
+        assert await second.do("k", AsyncMock(return_value={"found": False})) == {"found": False}
+        assert second.remote == 0
+
+    @pytest.mark.asyncio
+    async def test_shared_search_reports_join(self, shards):
+        first, second = shards
+        release = asyncio.Event()
+
+        async def scan():
+            await release.wait()
+            return {"found": False}
+
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+        leader = asyncio.create_task(_shared_search(bot, 1, first, "k", scan))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(_shared_search(bot, 2, second, "k", scan))
+        await asyncio.sleep(0.05)
+        release.set()
+
+        assert await leader == await follower == {"found": False}
+        assert bot.send_message.call_args.kwargs["chat_id"] == 2
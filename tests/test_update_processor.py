@@ -0,0 +1,114 @@
+"""
+Тесты параллельной обработки обновлений
+
+Покрывает:
+  - PerUserUpdateProcessor — порядок внутри пользователя, параллельность между
+                             пользователями, общий лимит, очистка блокировок
+"""
+
+import asyncio
+
+import pytest
+from telegram import CallbackQuery, Chat, Message, Update, User
+
+from parserhub.update_processor import PerUserUpdateProcessor
+
+
+def _update(update_id: int, user_id: int) -> Update:
+    user = User(user_id, "user", False)
+    message = Message(update_id, None, Chat(user_id, Chat.PRIVATE), from_user=user, text="x")
+    return Update(update_id, message=message)
+
+
+def _callback(update_id: int, user_id: int) -> Update:
+    query = CallbackQuery(str(update_id), User(user_id, "user", False), "chat", data="x")
+    return Update(update_id, callback_query=query)
+
+
+class TestPerUserUpdateProcessor:
+
+    @pytest.mark.asyncio
+    async def test_same_user_in_order(self):
+        processor = PerUserUpdateProcessor(max_concurrent_updates=8)
+        log = []
+
+        async def handle(update_id, delay):
+            log.append(("start", update_id))
+            await asyncio.sleep(delay)
+            log.append(("end", update_id))
+
+        # Первое обновление медленное — второе (callback того же пользователя) ждёт его
+        updates = [(_update(1, 7), 0.05), (_callback(2, 7), 0.0), (_update(3, 7), 0.0)]
+        await asyncio.gather(*(
+            processor.process_update(update, handle(update.update_id, delay)) for update, delay in updates
+        ))
+        assert log == [("start", 1), ("end", 1), ("start", 2), ("end", 2), ("start", 3), ("end", 3)]
+        assert processor.stats()["users"] == 0
+
+    @pytest.mark.asyncio
+    async def test_slow_user_does_not_block_others(self):
+        processor = PerUserUpdateProcessor(max_concurrent_updates=8)
+        done = []
+
+        async def handle(user_id, delay):
+            await asyncio.sleep(delay)
+            done.append(user_id)
+
+        await asyncio.gather(
+            processor.process_update(_update(1, 1), handle(1, 0.1)),
+            *(processor.process_update(_update(i, i), handle(i, 0.0)) for i in range(2, 6)),
+        )
+        assert done[-1] == 1
+        assert processor.stats()["processed"] == 5
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self):
+        processor = PerUserUpdateProcessor(max_concurrent_updates=3)
+        peak = 0
+
+        async def handle():
+            nonlocal peak
+            peak = max(peak, processor.running)
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(processor.process_update(_update(i, i), handle()) for i in range(20)))
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_waiting_for_own_user_does_not_take_slot(self):
+        processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+        release = asyncio.Event()
+        done = []
+
+        async def blocked():
+            await release.wait()
+            done.append("u1-1")
+
+        async def fast(name):
+            done.append(name)
+
+        # Медленное обновление пользователя 1 занимает один слот из двух; его следующие
+        # обновления ждут блокировку пользователя, а не слот — второй слот свободен для других
+        slow = asyncio.create_task(processor.process_update(_update(1, 1), blocked()))
+        queued = [asyncio.create_task(processor.process_update(_update(i, 1), fast(f"u1-{i}"))) for i in (2, 3, 4)]
+        await asyncio.sleep(0)
+        assert processor.stats() == {
+            "running": 1, "waiting": 3, "users": 1, "processed": 0, "concurrency": 2,
+        }
+        await processor.process_update(_update(5, 2), fast("u2"))
+        assert done == ["u2"]
+
+        release.set()
+        await asyncio.gather(slow, *queued)
+        assert done == ["u2", "u1-1", "u1-2", "u1-3", "u1-4"]
+
+    @pytest.mark.asyncio
+    async def test_non_update_objects(self):
+        processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+        done = []
+
+        async def handle():
+            done.append(True)
+
+        await processor.process_update("custom", handle())
+        assert done == [True]
@@ -0,0 +1,98 @@
+"""
+Тесты приёма обновлений через webhook
+
+Покрывает:
+  - WebhookApp — проверка secret token, очередь обновлений, 503 при переполнении,
+                 некорректное тело, /health и дополнительные маршруты
+"""
+
+import json
+
+import pytest
+from telegram import Update
+from telegram.ext import Application
+
+from parserhub.webhook import WebhookApp
+
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Иван"},
+        "text": "/start",
+    },
+}
+
+
+@pytest.fixture
+def app():
+    application = Application.builder().token("123:TEST").updater(None).build()
+    return WebhookApp(application, path="/telegram", secret_token="s3cret", max_queue=2)
+
+
+async def _call(app, method, path, body=b"", secret="s3cret"):
+    """Один HTTP-запрос к ASGI-приложению → (статус, тело)"""
+    headers = [(b"content-type", b"application/json")]
+    if secret is not None:
+        headers.append((b"x-telegram-bot-api-secret-token", secret.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers, "client": ("127.0.0.1", 1)}
+    chunks = [{"type": "http.request", "body": body[:10], "more_body": True},
+              {"type": "http.request", "body": body[10:], "more_body": False}]
+    sent = []
+
+    async def receive():
+        return chunks.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], sent[1]["body"]
+
+
+class TestWebhookApp:
+
+    @pytest.mark.asyncio
+    async def test_update_enqueued(self, app):
+        status, _ = await _call(app, "POST", "/telegram", json.dumps(UPDATE).encode())
+        assert status == 200
+        update = app.application.update_queue.get_nowait()
+        assert isinstance(update, Update)
+        assert update.effective_user.id == 42
+        assert app.stats()["received"] == 1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("secret", [None, "wrong"])
+    async def test_bad_secret(self, app, secret):
+        status, _ = await _call(app, "POST", "/telegram", json.dumps(UPDATE).encode(), secret=secret)
+        assert status == 403
+        assert app.application.update_queue.empty()
+        assert app.stats()["rejected"]["secret"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_full_returns_503(self, app):
+        body = json.dumps(UPDATE).encode()
+        assert [(await _call(app, "POST", "/telegram", body))[0] for _ in range(3)] == [200, 200, 503]
+        assert app.application.update_queue.qsize() == 2
+        assert app.stats()["rejected"]["queue_full"] == 1
+
+    @pytest.mark.asyncio
+    async def test_bad_body(self, app):
+        assert (await _call(app, "POST", "/telegram", b"not json"))[0] == 400
+        assert (await _call(app, "GET", "/telegram"))[0] == 405
+
+    @pytest.mark.asyncio
+    async def test_health_and_routes(self, app):
+        status, body = await _call(app, "GET", "/health", secret=None)
+        assert status == 200
+        assert json.loads(body) == {"status": "ok", "mode": "webhook", "update_queue": 0}
+
+        async def extra():
+            return 200, "text/plain", b"ok"
+
+        app.add_route("GET", "/extra", extra)
+        assert await _call(app, "GET", "/extra") == (200, b"ok")
+        assert (await _call(app, "GET", "/missing"))[0] == 404